@@ -0,0 +1,21 @@
+'''
+Offline benchmarks for psp_functions.
+
+synthetic_cdf: writes synthetic EPI-Hi LET1, LET2 and HET cdfs (and one second rate files)
+with the variable names and shapes of the real files, for any number of days.
+
+http_standin: serves a synthetic database over http on localhost, so the download functions
+(retrieve_data, multipanel_v001, loop_plot) can run without the PSP server.
+
+import_time: times the start up (import) of download only, compute only and plotting workers
+in fresh interpreters.
+
+run_benchmarks: times the imports and the main functions of psp_functions over the synthetic data for different
+numbers of days and rates and writes the results to a json file, e.g.
+
+    python -m benchmarks.run_benchmarks --days 1 3 --rates rates60 rates3600 --output bench.json
+
+Compare two result files (e.g. of two versions of the software) with
+
+    python -m benchmarks.run_benchmarks --compare old.json new.json
+'''
@@ -0,0 +1,48 @@
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    '''
+    Static file handler that does not log every request to stderr.
+    '''
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_folder(path_to_folder, port = 0):
+    '''
+    This function serves a folder over http on localhost in a background thread.
+    The folder should contain the data_public/... layout written by synthetic_cdf.generate_dataset,
+    the directory listings then look like the ones of the PSP database.
+
+    Input variables:
+    1. path_to_folder: root folder of the synthetic database
+
+    2. port: port to listen on, 0 picks a free port
+
+    Returns the server (call server.shutdown() to stop it) and the url to use as psp_functions.DATA_URL.
+    '''
+    handler = functools.partial(QuietHandler, directory = os.path.abspath(path_to_folder))
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    url = 'http://127.0.0.1:'+str(server.server_address[1])+'/data_public/'
+    return server, url
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    folder = sys.argv[1] if len(sys.argv) > 1 else '.'
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    server, url = serve_folder(folder, port)
+    print('Serving '+folder+' as '+url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
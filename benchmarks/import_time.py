@@ -0,0 +1,53 @@
+import os
+import statistics
+import subprocess
+import sys
+
+
+PACKAGE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what each kind of worker imports and touches, timed in a fresh interpreter
+# ('everything' imports all the dependencies eagerly, like psp_functions did before the lazy imports)
+SCENARIOS = {
+    'import psp_functions': 'import psp_functions as psp',
+    'download worker': 'import psp_functions as psp; psp.requests.get',
+    'compute worker': 'import psp_functions as psp; psp.pd.DataFrame; psp.cdflib.CDF',
+    'plot worker': 'import psp_functions as psp; psp.pd.DataFrame; psp.cdflib.CDF; psp.plt.subplots; psp.Time.now',
+    'everything': 'import pandas, matplotlib.pyplot, matplotlib.dates, cdflib, astropy.time, astropy.units, '
+                  'plotly.graph_objects, dateutil.parser, requests, statistics; import psp_functions',
+}
+
+
+def time_scenario(code, repeat = 5):
+    '''
+    This function runs code in repeat fresh python interpreters and returns the time each run took.
+    '''
+    program = ('import sys, time\n'
+               'sys.path.insert(0, %r)\n'
+               'start = time.perf_counter()\n'
+               '%s\n'
+               'print(time.perf_counter() - start)\n') % (PACKAGE_FOLDER, code)
+    runs = []
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', program], capture_output = True, text = True, check = True).stdout
+        runs.append(float(output.strip().splitlines()[-1]))
+    return runs
+
+
+def import_times(repeat = 5):
+    '''
+    This function times the start up of the different kinds of workers.
+
+    Returns a list of entries in the format of run_benchmarks.
+    '''
+    results = []
+    for name, code in SCENARIOS.items():
+        runs = time_scenario(code, repeat)
+        results.append({'function': name, 'rate': '', 'days': 0, 'records': 0, 'repeat': len(runs),
+                        'min_s': min(runs), 'median_s': statistics.median(runs), 'runs': runs})
+    return results
+
+
+if __name__ == '__main__':
+    for r in import_times():
+        print('%-24s %8.3f s' % (r['function'], r['min_s']))
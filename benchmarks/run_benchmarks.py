@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+import matplotlib
+matplotlib.use('Agg')
+
+import cdflib
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import psp_functions as psp
+
+from benchmarks.http_standin import serve_folder
+from benchmarks.import_time import import_times
+from benchmarks.synthetic_cdf import RATE_SECONDS, file_name, generate_dataset
+
+
+def time_call(function, repeat = 1, setup = None):
+    '''
+    This function times a call repeat times and returns the run times in seconds.
+    setup (if given) is called before every run and its result is passed to the function.
+    '''
+    runs = []
+    for i in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            function(argument)
+        else:
+            function()
+        runs.append(time.perf_counter() - start)
+        plt.close('all')
+    return runs
+
+
+def result(name, rate, days, records, runs):
+    '''
+    This function returns one entry of the results file.
+    '''
+    return {'function': name, 'rate': rate, 'days': days, 'records': records,
+            'repeat': len(runs), 'min_s': min(runs), 'median_s': statistics.median(runs), 'runs': runs}
+
+
+def single_file_benchmarks(level2, date, rate, repeat):
+    '''
+    This function times the functions that work on one opened cdf (one day of data).
+    '''
+    let1 = cdflib.CDF(os.path.join(level2, file_name(date, 'let1', rate)))
+    let2 = cdflib.CDF(os.path.join(level2, file_name(date, 'let2', rate)))
+    het = cdflib.CDF(os.path.join(level2, file_name(date, 'het', rate)))
+
+    cadence = RATE_SECONDS[rate]
+    wanted = max(3600, 4*cadence)
+    records = len(let1.varget('Epoch'))
+    results = []
+
+    runs = time_call(lambda: psp.average_data(let1, 'A_H_Flux', wanted, cadence, 'H'), repeat)
+    results.append(result('average_data', rate, 1, records, runs))
+
+    runs = time_call(lambda: psp.pa_dataframe(let1, 'H', direction = 'A'), repeat)
+    results.append(result('pa_dataframe', rate, 1, records, runs))
+
+    pa_data = psp.pa_dataframe(het, 'H', direction = 'A')
+    runs = time_call(lambda: psp.average_data_dataframe(pa_data, wanted, cadence), repeat)
+    results.append(result('average_data_dataframe', rate, 1, records, runs))
+
+    runs = time_call(lambda: psp.spec_plot_pa(let1 = let1, let2 = let2), repeat)
+    results.append(result('spec_plot_pa', rate, 1, records, runs))
+
+    epoch = pa_data['epoch']
+    energies = het.varget('H_ENERGY')
+    intensity = pd.DataFrame(het.varget('A_H_Rate'))
+
+    def spec():
+        fig, ax = plt.subplots(figsize = [35, 4])
+        psp.spec_plot(fig, ax, epoch, energies, intensity)
+
+    runs = time_call(spec, repeat)
+    results.append(result('spec_plot', rate, 1, records, runs))
+    return results
+
+
+def download_benchmarks(date, days, rate, repeat, workdir):
+    '''
+    This function times the functions that download (from the stand-in server), open and plot several days.
+    Every run starts from an empty download folder.
+    '''
+    records = days*86400//RATE_SECONDS[rate]
+    results = []
+
+    def fresh_folder():
+        return tempfile.mkdtemp(dir = workdir)
+
+    runs = time_call(lambda folder: psp.multipanel_v001(folder, date, days, data_resolution = rate), repeat, setup = fresh_folder)
+    results.append(result('multipanel_v001', rate, days, records, runs))
+
+    end_date = (datetime.strptime(date, '%Y%m%d') + timedelta(days = days-1)).strftime('%Y%m%d')
+    if rate == 'rates60':
+        # loop_plot always uses the automatic resolution of multipanel_v001 (60s for one day plots)
+        runs = time_call(lambda folder: psp.loop_plot(folder, date, end_date, 1), repeat, setup = fresh_folder)
+        results.append(result('loop_plot', 'auto', days, records, runs))
+    return results
+
+
+def metadata():
+    '''
+    This function returns the information needed to compare results between versions and machines.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(psp.__file__)),
+                                capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'date': datetime.now().isoformat(timespec = 'seconds'), 'commit': commit,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'numpy': np.__version__, 'pandas': pd.__version__, 'matplotlib': matplotlib.__version__,
+            'cdflib': cdflib.__version__}
+
+
+def run(days_list, rates, output, repeat = 1, start_date = '20190404', workdir = ''):
+    '''
+    This function generates the synthetic database, serves it on localhost and runs all the benchmarks.
+
+    Input variables:
+    1. days_list: list of numbers of days for the multi-day benchmarks e.g. [1, 3, 10]
+
+    2. rates: list of the rates to benchmark e.g. ['rates10', 'rates60', 'rates3600']
+
+    3. output: path of the json file the results are written to
+
+    4. repeat: number of runs of every benchmark
+
+    5. start_date: first date of the synthetic data
+
+    6. workdir: folder for the synthetic data and the downloads, a temporary folder if empty
+    '''
+    warnings.filterwarnings('ignore')
+    cleanup = workdir == ''
+    if cleanup:
+        workdir = tempfile.mkdtemp(prefix = 'psp_bench_')
+
+    print('Generating synthetic data in '+workdir)
+    generate_dataset(workdir, start_date, max(days_list), rates = rates)
+    level2 = os.path.join(workdir, 'data_public', 'EPIHi', 'level2')
+
+    server, url = serve_folder(workdir)
+    original_url = psp.DATA_URL
+    psp.DATA_URL = url
+
+    print('Import time benchmarks')
+    results = import_times(repeat = max(repeat, 3))
+    try:
+        for rate in rates:
+            print('Single file benchmarks for '+rate)
+            results += single_file_benchmarks(level2, start_date, rate, repeat)
+            for days in days_list:
+                print('Download and plot benchmarks for '+rate+', '+str(days)+' days')
+                results += download_benchmarks(start_date, days, rate, repeat, workdir)
+    finally:
+        psp.DATA_URL = original_url
+        server.shutdown()
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors = True)
+
+    report = {'metadata': metadata(), 'results': results}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent = 1)
+
+    for r in results:
+        print('%-24s %-10s %3d days %10.3f s' % (r['function'], r['rate'], r['days'], r['min_s']))
+    print('Results written to '+output)
+    return report
+
+
+def compare(old_output, new_output, threshold = 1.2):
+    '''
+    This function compares two results files and prints the ratio of the fastest runs (new/old).
+    Benchmarks slower than threshold times the old run time are flagged as regressions.
+
+    Returns the list of regressions.
+    '''
+    with open(old_output) as f:
+        old = {(r['function'], r['rate'], r['days']): r for r in json.load(f)['results']}
+    with open(new_output) as f:
+        new = json.load(f)['results']
+
+    regressions = []
+    for r in new:
+        key = (r['function'], r['rate'], r['days'])
+        if key not in old:
+            continue
+        ratio = r['min_s']/old[key]['min_s']
+        flag = ''
+        if ratio > threshold:
+            flag = 'REGRESSION'
+            regressions.append(key)
+        print('%-24s %-10s %3d days %10.3f s -> %10.3f s  x%.2f %s' % (key[0], key[1], key[2], old[key]['min_s'], r['min_s'], ratio, flag))
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Offline benchmarks of psp_functions on synthetic EPI-Hi data.')
+    parser.add_argument('--days', type = int, nargs = '+', default = [1, 3])
+    parser.add_argument('--rates', nargs = '+', default = ['rates10', 'rates60', 'rates3600'])
+    parser.add_argument('--repeat', type = int, default = 1)
+    parser.add_argument('--output', default = 'bench_output.json')
+    parser.add_argument('--workdir', default = '')
+    parser.add_argument('--compare', nargs = 2, metavar = ('OLD', 'NEW'))
+    parser.add_argument('--threshold', type = float, default = 1.2)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(args.compare[0], args.compare[1], args.threshold)
+        return 1 if regressions else 0
+
+    run(args.days, args.rates, args.output, args.repeat, workdir = args.workdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
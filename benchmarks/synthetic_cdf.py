@@ -0,0 +1,346 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+from cdflib import cdfwrite
+
+
+# J2000 reference of the TT2000 Epoch, the same reference psp_functions uses to decode it
+J2000 = datetime(2000, 1, 1, 12)
+
+# cadence in seconds of every EPI-Hi product the generator can write
+RATE_SECONDS = {'rates': 1, 'rates10': 10, 'rates60': 60, 'rates300': 300, 'rates3600': 3600}
+
+# energy channel edges in MeV (channel 3 of LET H is 1.2-1.4 MeV and channel 3 of HET H is 11.3-13.5 MeV,
+# the channels multipanel_v001 plots in its single-energy panels)
+CHANNEL_EDGES = {
+    'let': {
+        'H': [0.7, 0.8, 1.0, 1.2, 1.4, 1.6, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0, 6.0, 8.0, 10.0, 12.0],
+        'He': [0.7, 0.8, 1.0, 1.2, 1.4, 1.6, 2.0, 2.5, 3.0, 3.5, 4.0, 5.0, 6.0],
+        'Electrons': [0.5, 0.7, 1.0, 1.4, 2.0],
+    },
+    'het': {
+        'H': [6.7, 8.0, 9.5, 11.3, 13.5, 16.0, 19.0, 22.6, 27.0, 32.0, 38.0, 45.0, 54.0, 64.0, 76.0, 90.0],
+        'He': [6.7, 8.0, 9.5, 11.3, 13.5, 16.0, 19.0, 22.6, 27.0, 32.0, 38.0, 45.0, 54.0],
+        'Electrons': [0.7, 1.0, 1.4, 2.0, 2.8, 4.0, 5.7, 8.0],
+    },
+}
+
+# look directions of each product and the name of their pitch angle variables
+DIRECTIONS = {'let1': ['A', 'B'], 'let2': ['C'], 'het': ['A', 'B']}
+PA_NAME = {'let1': 'LET1', 'let2': 'LET2', 'het': 'HET'}
+
+
+def file_name(date, data, rate, version = 'v07'):
+    '''
+    This function returns the name the PSP database gives to an EPI-Hi file.
+
+    Input variables:
+    1. date: the date as a string in the form 'YYYYMMDD'
+
+    2. data: 'let1', 'let2' or 'het' (ignored for the one second rate)
+
+    3. rate: 'rates', 'rates10', 'rates60', 'rates300' or 'rates3600'
+
+    4. version: the version string of the file e.g. 'v07'
+    '''
+    if rate == 'rates':
+        return 'psp_isois-epihi_l2-second-rates_'+date+'_'+version+'.cdf'
+    return 'psp_isois-epihi_l2-'+data+'-'+rate+'_'+date+'_'+version+'.cdf'
+
+
+def energy_table(edges):
+    '''
+    This function returns the channel centres, the deltas and the labels for a list of channel edges.
+    '''
+    edges = np.asarray(edges, dtype = np.float32)
+    low = edges[:-1]
+    high = edges[1:]
+    centre = np.sqrt(low*high)
+    labels = ['%.1f - %.1f MeV' % (lo, hi) for lo, hi in zip(low, high)]
+    return centre, centre-low, high-centre, labels
+
+
+def epoch_tt2000(date, cadence, n_records):
+    '''
+    This function returns the TT2000 Epoch (ns since J2000) of the centres of n_records bins of the given cadence.
+    '''
+    start = datetime.strptime(date, '%Y%m%d') - J2000
+    start_ns = (start.days*86400 + start.seconds)*10**9
+    centres = (np.arange(n_records, dtype = np.int64)*cadence + cadence/2.)*10**9
+    return start_ns + centres.astype(np.int64)
+
+
+def synthetic_intensity(rng, seconds_of_mission, centre, scale):
+    '''
+    This function creates a time x channel intensity matrix: a power law background with Poisson like noise
+    and a solar energetic particle event (fast rise, exponential decay) injected every few days.
+    '''
+    spectrum = scale*(centre/centre[0])**-2.5
+    background = np.outer(np.ones(seconds_of_mission.size), spectrum)
+
+    # an event every 5 days starting at 06:00 of the day, faster particles arrive first
+    phase = np.mod(seconds_of_mission - 6*3600., 5*86400.)
+    delay = 1800.*(centre[0]/centre)**0.5
+    t = phase[:, None] - delay[None, :]
+    event = np.where(t > 0, 300.*np.exp(-t/(6*3600.))*(1-np.exp(-t/1800.)), 0.)
+
+    intensity = background*(1+event)
+    noise = rng.gamma(shape = 20., scale = 1/20., size = intensity.shape)
+    intensity = (intensity*noise).astype(np.float32)
+
+    # some empty channels/records, like the real count rates
+    intensity[rng.random(intensity.shape) < 0.01] = 0.
+    return intensity
+
+
+def pitch_angle(rng, seconds_of_mission, offset):
+    '''
+    This function creates a slowly rotating pitch angle time series between 0 and 180 degrees.
+    '''
+    pa = 90. + 60.*np.sin(2*np.pi*seconds_of_mission/86400. + offset) + rng.normal(0, 3, seconds_of_mission.size)
+    return np.clip(pa, 0, 180).astype(np.float32)
+
+
+def write_epihi_file(path_to_folder, date, data, rate, version = 'v07', compress = 0, seed = 0):
+    '''
+    This function writes one synthetic EPI-Hi daily cdf with the variable names and shapes of the real files.
+
+    Input variables:
+    1. path_to_folder: folder the file will be written to
+
+    2. date: the date as a string in the form 'YYYYMMDD'
+
+    3. data: 'let1', 'let2' or 'het' (ignored for the one second rate, which contains all the detectors)
+
+    4. rate: 'rates', 'rates10', 'rates60', 'rates300' or 'rates3600'
+
+    5. version: the version string of the file e.g. 'v07'
+
+    6. compress: gzip level of the variables, 0 for uncompressed variables
+
+    7. seed: seed of the random generator, the same inputs always create the same file
+
+    Returns the path to the file.
+    '''
+    cadence = RATE_SECONDS[rate]
+    n_records = 86400//cadence
+    epoch = epoch_tt2000(date, cadence, n_records)
+    seconds_of_mission = (epoch - epoch_tt2000('20180812', 1, 1)[0])/1e9
+    rng = np.random.default_rng([seed, int(date), cadence, sum(map(ord, data))])
+
+    name = file_name(date, data, rate, version)
+    fullpath = os.path.join(path_to_folder, name)
+    if os.path.exists(fullpath):
+        os.remove(fullpath)
+
+    f = cdfwrite.CDF(fullpath, cdf_spec = {'Compressed': False})
+
+    def write(variable, values, data_type, rec_vary = True, num_elements = 1):
+        values = np.asarray(values)
+        dims = list(values.shape[1:]) if rec_vary else list(values.shape)
+        if data_type == cdfwrite.CDF.CDF_CHAR:
+            # one label per record, so that cdflib returns a flat array of strings like for the real files
+            rec_vary = True
+            dims = []
+            values = list(values)
+        spec = {'Variable': variable, 'Data_Type': data_type, 'Num_Elements': num_elements,
+                'Rec_Vary': rec_vary, 'Dim_Sizes': dims, 'Compress': compress}
+        f.write_var(spec, var_data = values)
+
+    write('Epoch', epoch, cdfwrite.CDF.CDF_TIME_TT2000)
+
+    if rate == 'rates':
+        # the one second file holds the count rates of every detector and direction
+        for detector in ['let1', 'let2', 'het']:
+            family = 'het' if detector == 'het' else 'let'
+            for particle in ['H', 'Electrons']:
+                centre, minus, plus, labels = energy_table(CHANNEL_EDGES[family][particle])
+                for direction in DIRECTIONS[detector]:
+                    write(PA_NAME[detector]+'_'+direction+'_'+particle+'_Rate',
+                          synthetic_intensity(rng, seconds_of_mission, centre, 50.), cdfwrite.CDF.CDF_FLOAT)
+                write(PA_NAME[detector]+'_'+particle+'_ENERGY_LABL', labels, cdfwrite.CDF.CDF_CHAR, False,
+                      max(len(l) for l in labels))
+        f.close()
+        return fullpath
+
+    family = 'het' if data == 'het' else 'let'
+
+    for particle in ['H', 'He', 'Electrons']:
+        centre, minus, plus, labels = energy_table(CHANNEL_EDGES[family][particle])
+        write(particle+'_ENERGY', centre, cdfwrite.CDF.CDF_FLOAT, False)
+        write(particle+'_ENERGY_DELTAMINUS', minus, cdfwrite.CDF.CDF_FLOAT, False)
+        write(particle+'_ENERGY_DELTAPLUS', plus, cdfwrite.CDF.CDF_FLOAT, False)
+        write(particle+'_ENERGY_LABL', labels, cdfwrite.CDF.CDF_CHAR, False, max(len(l) for l in labels))
+
+        for direction in DIRECTIONS[data]:
+            flux = synthetic_intensity(rng, seconds_of_mission, centre, 1. if particle != 'Electrons' else 10.)
+            if particle != 'Electrons' or family == 'het':
+                write(direction+'_'+particle+'_Flux', flux, cdfwrite.CDF.CDF_FLOAT)
+                write(direction+'_'+particle+'_Uncertainty', flux*0.1, cdfwrite.CDF.CDF_FLOAT)
+            write(direction+'_'+particle+'_Rate', flux*np.float32(5.), cdfwrite.CDF.CDF_FLOAT)
+
+    for k, direction in enumerate(DIRECTIONS[data]):
+        write(PA_NAME[data]+'_'+direction+'_PA', pitch_angle(rng, seconds_of_mission, k*np.pi/2), cdfwrite.CDF.CDF_FLOAT)
+
+    f.close()
+    return fullpath
+
+
+# EPI-Lo ion composition (ic) file: look directions x energy bins of the proton flux
+EPILO_LOOK_DIRECTIONS = 80
+EPILO_ENERGY_EDGES = np.geomspace(0.02, 15., 49).tolist()
+
+
+def write_epilo_file(path_to_folder, date, data = 'ic', n_records = 1440, version = 'v07', compress = 0, seed = 0):
+    '''
+    This function writes one synthetic EPI-Lo daily cdf: a record varying look direction x energy bin flux cube
+    with ISTP DEPEND_0/1/2 attributes pointing to its Epoch, look direction and energy variables.
+
+    Input variables:
+    1. path_to_folder: folder the file will be written to
+
+    2. date: the date as a string in the form 'YYYYMMDD'
+
+    3. data: 'ic' or 'pe' (only used in the file name)
+
+    4. n_records: number of records of the day
+
+    5. version: the version string of the file e.g. 'v07'
+
+    6. compress: gzip level of the variables, 0 for uncompressed variables
+
+    7. seed: seed of the random generator
+
+    Returns the path to the file.
+    '''
+    cadence = 86400//n_records
+    epoch = epoch_tt2000(date, cadence, n_records)
+    seconds_of_mission = (epoch - epoch_tt2000('20180812', 1, 1)[0])/1e9
+    rng = np.random.default_rng([seed, int(date), n_records, sum(map(ord, data))])
+    centre, minus, plus, labels = energy_table(EPILO_ENERGY_EDGES)
+
+    fullpath = os.path.join(path_to_folder, 'psp_isois-epilo_l2-'+data+'_'+date+'_'+version+'.cdf')
+    if os.path.exists(fullpath):
+        os.remove(fullpath)
+    f = cdfwrite.CDF(fullpath, cdf_spec = {'Compressed': False})
+
+    def write(variable, values, data_type, rec_vary = True, attributes = None):
+        values = np.asarray(values)
+        dims = list(values.shape[1:]) if rec_vary else list(values.shape)
+        spec = {'Variable': variable, 'Data_Type': data_type, 'Num_Elements': 1,
+                'Rec_Vary': rec_vary, 'Dim_Sizes': dims, 'Compress': compress}
+        f.write_var(spec, var_attrs = attributes, var_data = values)
+
+    write('Epoch_ChanP', epoch, cdfwrite.CDF.CDF_TIME_TT2000)
+    write('Look_Direction', np.arange(EPILO_LOOK_DIRECTIONS, dtype = np.int16), cdfwrite.CDF.CDF_INT2, False)
+    write('H_ChanP_Energy', centre, cdfwrite.CDF.CDF_FLOAT, False)
+    write('H_ChanP_Energy_DELTAMINUS', minus, cdfwrite.CDF.CDF_FLOAT, False)
+    write('H_ChanP_Energy_DELTAPLUS', plus, cdfwrite.CDF.CDF_FLOAT, False)
+
+    # every look direction sees the same spectrum with a direction dependent anisotropy
+    intensity = synthetic_intensity(rng, seconds_of_mission, centre, 100.)
+    anisotropy = 1 + 0.5*np.cos(np.linspace(0, 2*np.pi, EPILO_LOOK_DIRECTIONS, endpoint = False))
+    flux = (intensity[:, None, :]*anisotropy[None, :, None]).astype(np.float32)
+    write('H_Flux_ChanP', flux, cdfwrite.CDF.CDF_FLOAT,
+          attributes = {'DEPEND_0': 'Epoch_ChanP', 'DEPEND_1': 'Look_Direction', 'DEPEND_2': 'H_ChanP_Energy'})
+
+    f.close()
+    return fullpath
+
+
+def write_summary_file(path_to_folder, date, cadence = 300, version = 'v07', compress = 0, seed = 0):
+    '''
+    This function writes one synthetic ISOIS summary daily cdf: a few low cadence proton and electron
+    spectra of EPI-Hi and EPI-Lo (with DEPEND_1 energies and LABL_PTR_1 labels) and one integral rate.
+
+    Input variables:
+    1. path_to_folder: folder the file will be written to
+
+    2. date: the date as a string in the form 'YYYYMMDD'
+
+    3. cadence: cadence of the records in seconds
+
+    4. version: the version string of the file e.g. 'v07'
+
+    5. compress: gzip level of the variables, 0 for uncompressed variables
+
+    6. seed: seed of the random generator
+
+    Returns the path to the file.
+    '''
+    n_records = 86400//cadence
+    epoch = epoch_tt2000(date, cadence, n_records)
+    seconds_of_mission = (epoch - epoch_tt2000('20180812', 1, 1)[0])/1e9
+    rng = np.random.default_rng([seed, int(date), cadence, 7])
+
+    fullpath = os.path.join(path_to_folder, 'psp_isois_l2-summary_'+date+'_'+version+'.cdf')
+    if os.path.exists(fullpath):
+        os.remove(fullpath)
+    f = cdfwrite.CDF(fullpath, cdf_spec = {'Compressed': False})
+
+    def write(variable, values, data_type, rec_vary = True, attributes = None, num_elements = 1):
+        values = np.asarray(values)
+        dims = list(values.shape[1:]) if rec_vary else list(values.shape)
+        if data_type == cdfwrite.CDF.CDF_CHAR:
+            rec_vary, dims, values = True, [], list(values)
+        spec = {'Variable': variable, 'Data_Type': data_type, 'Num_Elements': num_elements,
+                'Rec_Vary': rec_vary, 'Dim_Sizes': dims, 'Compress': compress}
+        f.write_var(spec, var_attrs = attributes, var_data = values)
+
+    write('Epoch', epoch, cdfwrite.CDF.CDF_TIME_TT2000)
+    spectra = [('EPIHi_H_Flux', CHANNEL_EDGES['het']['H'][::2], 1.), ('EPIHi_Electrons_Flux', CHANNEL_EDGES['het']['Electrons'], 10.),
+               ('EPILo_H_Flux', EPILO_ENERGY_EDGES[::6], 100.)]
+    for variable, edges, scale in spectra:
+        centre, minus, plus, labels = energy_table(edges)
+        write(variable+'_Energy', centre, cdfwrite.CDF.CDF_FLOAT, False)
+        write(variable+'_LABL', labels, cdfwrite.CDF.CDF_CHAR, num_elements = max(len(l) for l in labels))
+        write(variable, synthetic_intensity(rng, seconds_of_mission, centre, scale), cdfwrite.CDF.CDF_FLOAT,
+              attributes = {'DEPEND_0': 'Epoch', 'DEPEND_1': variable+'_Energy', 'LABL_PTR_1': variable+'_LABL'})
+    rate = synthetic_intensity(rng, seconds_of_mission, np.array([1.]), 1000.)[:, 0]
+    write('EPIHi_Integral_Rate', rate, cdfwrite.CDF.CDF_FLOAT, attributes = {'DEPEND_0': 'Epoch'})
+
+    f.close()
+    return fullpath
+
+
+def generate_dataset(path_to_folder, start_date, days, rates = ['rates10', 'rates60', 'rates3600'], version = 'v07', compress = 0):
+    '''
+    This function writes the synthetic LET1, LET2 and HET files (and the one second files if 'rates' is in rates)
+    for a number of consecutive days, laid out like the PSP database (path_to_folder/data_public/EPIHi/level2)
+    so the folder can be served with the http_standin module.
+
+    Input variables:
+    1. path_to_folder: root folder of the synthetic database
+
+    2. start_date: the first date as a string in the form 'YYYYMMDD'
+
+    3. days: number of consecutive days
+
+    4. rates: list of the rates to generate ('summary' writes the ISOIS summary files)
+
+    5. version: the version string of the files e.g. 'v07'
+
+    6. compress: gzip level of the variables, 0 for uncompressed variables
+
+    Returns the list of paths of the written files.
+    '''
+    level2 = os.path.join(path_to_folder, 'data_public', 'EPIHi', 'level2')
+    os.makedirs(level2, exist_ok = True)
+
+    files = []
+    dt = datetime.strptime(start_date, '%Y%m%d')
+    for i in range(days):
+        date = (dt + timedelta(days = i)).strftime('%Y%m%d')
+        for rate in rates:
+            if rate == 'summary':
+                summary = os.path.join(path_to_folder, 'data_public', 'ISOIS', 'level2')
+                os.makedirs(summary, exist_ok = True)
+                files.append(write_summary_file(summary, date, version = version, compress = compress))
+                continue
+            if rate == 'rates':
+                files.append(write_epihi_file(level2, date, '', rate, version, compress))
+                continue
+            for data in ['let1', 'let2', 'het']:
+                files.append(write_epihi_file(level2, date, data, rate, version, compress))
+    return files
@@ -1,30 +1,103 @@
-import pandas as pd
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
-# import pyspedas as psd
-import matplotlib.dates as mdates
 from datetime import datetime, date
-import cdflib
-from astropy.time import TimeDelta, Time
-from astropy import units as u
-import plotly.graph_objects as go
+import importlib
+import io
 import math
 import urllib.request
 import warnings
 # from contextlib import suppress
-from matplotlib import cm
-# from matplotlib.ticker import MultipleLocator, LogLocator
-from dateutil.parser import parse
-import requests
-import statistics
 import os
-from matplotlib import colors
+import sys
+import tracemalloc
+import threading
+import queue
+import time
+import json
+import re
+import hashlib
+import shutil
+import tempfile
+import weakref
+import argparse
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+try:
+    import resource
+except ImportError:
+    # the resource module is not available on Windows, the peak RSS is then not reported
+    resource = None
+
+class LazyModule:
+    '''
+    Stand-in for a module (or a function/class of a module) that is only imported the first time it is used.
+    
+    Importing pandas, matplotlib, cdflib, astropy, plotly, requests and dateutil takes most of the time 
+    of importing this software. With the stand-ins a worker that only downloads files or averages arrays 
+    does not import the plotting and astronomy packages it never uses.
+    On first use the stand-in imports the module and replaces itself with it in this module,
+    so after that the module is used directly.
+    
+    Input variables:
+    1. global_name: name of the stand-in in this module e.g. 'plt'
+    
+    2. module_name: the module to import e.g. 'matplotlib.pyplot'
+    
+    3. attribute: no input necessary. Name of the function or class to take from the module e.g. 'Time'
+    
+    4. on_import: no input necessary. Function called with the module right after it is imported.
+    '''
+    
+    def __init__(self, global_name, module_name, attribute = None, on_import = None):
+        self.global_name = global_name
+        self.module_name = module_name
+        self.attribute = attribute
+        self.on_import = on_import
+    
+    def load(self):
+        module = importlib.import_module(self.module_name)
+        if self.on_import is not None:
+            self.on_import(module)
+        if self.attribute is not None:
+            module = getattr(module, self.attribute)
+        globals()[self.global_name] = module
+        return module
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+    
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+def set_tick_sizes(pyplot):
+    #set plots' axes' tick label sizes globally
+    pyplot.rc('xtick', labelsize = 30)
+    pyplot.rc('ytick', labelsize = 30)
+
+pd = LazyModule('pd', 'pandas')
+matplotlib = LazyModule('matplotlib', 'matplotlib')
+plt = LazyModule('plt', 'matplotlib.pyplot', on_import = set_tick_sizes)
+# import pyspedas as psd
+mdates = LazyModule('mdates', 'matplotlib.dates')
+cm = LazyModule('cm', 'matplotlib.cm')
+colors = LazyModule('colors', 'matplotlib.colors')
+# from matplotlib.ticker import MultipleLocator, LogLocator
 # from matplotlib.ticker import PercentFormatter
+cdflib = LazyModule('cdflib', 'cdflib')
+Time = LazyModule('Time', 'astropy.time', 'Time')
+TimeDelta = LazyModule('TimeDelta', 'astropy.time', 'TimeDelta')
+u = LazyModule('u', 'astropy.units')
+go = LazyModule('go', 'plotly.graph_objects')
+parse = LazyModule('parse', 'dateutil.parser', 'parse')
+requests = LazyModule('requests', 'requests')
+yaml = LazyModule('yaml', 'yaml')
+pyarrow = LazyModule('pyarrow', 'pyarrow')
+pq = LazyModule('pq', 'pyarrow.parquet')
+ds = LazyModule('ds', 'pyarrow.dataset')
 
-#set plots' axes' tick label sizes globally
-plt.rc('xtick', labelsize = 30)
-plt.rc('ytick', labelsize = 30)
+#root of the PSP ISOIS public data site, all the download urls are built from it
+#(can be pointed to a mirror or to a local stand-in server e.g. for benchmarking)
+DATA_URL = 'http://spp-isois.sr.unh.edu/data_public/'
 
 def info_software(path_to_software_infotxt):
     '''
@@ -39,6 +112,238 @@ def info_software(path_to_software_infotxt):
     for line in file: 
         print(line,)
 
+#versions of the files found in the database listings, so the listing of a folder is fetched once per session
+VERSION_CACHE = {}
+
+def listing_version(url):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    
+    It returns the version of the files (e.g. 'v07') in a folder of the database, 
+    taken from the first cdf file of the folder listing.
+    The version is kept in VERSION_CACHE so that the listing is downloaded only once per session
+    (use VERSION_CACHE.clear() to look it up again).
+    
+    Input variable:
+    url: url of the folder e.g. DATA_URL+'EPIHi/level2/'
+    '''
+    if url in VERSION_CACHE:
+        return VERSION_CACHE[url]
+    
+    try:
+        page = requests.get(url, timeout = 60)
+    except Exception:
+        #no network: the version of the files of the data store or mirror (see sync_mirror) if there are some
+        version = local_version(url)
+        if version == '':
+            raise
+        return version
+    dat = page.text
+    a = dat.find('.cdf')
+    b = a-10
+    c = dat[b:a].find('_')
+    version = dat[b+c+1:a]
+    if a != -1:
+        VERSION_CACHE[url] = version
+    return version
+
+#shared data store: one folder for all the users and jobs of a machine, '' to keep the files in the folders 
+#given to the functions (see use_data_store), and its size limit e.g. '50GB' (None for no limit)
+DATA_STORE = os.environ.get('PSP_DATA_STORE', '')
+DATA_STORE_QUOTA = os.environ.get('PSP_DATA_STORE_QUOTA')
+
+def use_data_store(path_to_store, quota = None):
+    '''
+    This function makes all the functions of the software (retrieve_data, multipanel_v001...) keep the cdf files 
+    in one shared folder instead of the folder given to each function, so the users and jobs of a machine 
+    share the downloaded files. The files are kept in the layout of the database (e.g. EPIHi/level2/...).
+    Several processes can use the store at the same time, a file is downloaded only once (see FileLock).
+    When the store is larger than the quota, the files used the longest time ago are deleted.
+    The store can also be set with the PSP_DATA_STORE and PSP_DATA_STORE_QUOTA environment variables.
+    
+    Input variables:
+    1. path_to_store: folder of the store, '' to stop using it
+    2. quota: no input necessary, largest size of the store in bytes or as a string e.g. '50GB'
+    '''
+    global DATA_STORE, DATA_STORE_QUOTA
+    DATA_STORE = path_to_store
+    DATA_STORE_QUOTA = quota
+
+def data_folder(path_to_folder, instrument):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    It returns the folder where the files of an instrument ('epihi', 'epilo' or 'isois') are kept: 
+    the folder of the data store (see use_data_store) if one is used, path_to_folder otherwise.
+    '''
+    if DATA_STORE == '':
+        return path_to_folder
+    if instrument == 'isois':
+        folder = os.path.join(DATA_STORE, 'ISOIS', 'level2')
+    else:
+        folder = os.path.join(DATA_STORE, instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1], 'level2')
+    os.makedirs(folder, exist_ok = True)
+    return folder
+
+class FileLock:
+    '''
+    A lock on a file shared by all the processes (and threads) of a machine, 
+    e.g. so that only one of them downloads a file while the others wait for it.
+    The lock files are kept in a .locks folder next to the file.
+    
+    Use with a with statement: with FileLock(path): ... 
+    or acquire() (returns False if blocking is False and the lock is held) and release().
+    '''
+    def __init__(self, path, blocking = True):
+        folder = os.path.join(os.path.dirname(os.path.abspath(path)), '.locks')
+        os.makedirs(folder, exist_ok = True)
+        self.path = os.path.join(folder, os.path.basename(path)+'.lock')
+        self.blocking = blocking
+        self.file = None
+    
+    def acquire(self):
+        self.file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self.file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+                        return True
+                    except OSError:
+                        if not self.blocking:
+                            raise
+                        time.sleep(0.1)
+            else:
+                import fcntl
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+        except OSError:
+            self.file.close()
+            self.file = None
+            return False
+    
+    def release(self):
+        if self.file is None:
+            return
+        if os.name == 'nt':
+            import msvcrt
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        self.file.close()
+        self.file = None
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exception):
+        self.release()
+
+def download_file(url, fullpath):
+    '''
+    This function is primarily meant to be used in the retrieve_data function.
+    It downloads a file if it is not already there. The file is locked while it is downloaded 
+    (other processes wait and then use it) and written under a temporary name first, 
+    so an interrupted download never leaves a partial file with the name of the file.
+    In the data store the date the file was used is kept (for the quota, see evict_files).
+    '''
+    name = os.path.basename(fullpath)
+    downloaded = False
+    with FileLock(fullpath):
+        if os.path.exists(fullpath):
+            print('File already present')
+        else:
+            partial = fullpath+'.part'
+            try:
+                urllib.request.urlretrieve(url, partial)
+                os.replace(partial, fullpath)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            downloaded = True
+            print('File saved succesfuly as '+name)
+        print('Path to file: '+fullpath)
+        
+        if DATA_STORE != '' and os.path.abspath(fullpath).startswith(os.path.abspath(DATA_STORE)):
+            #the access date is set explicitly (the modification date is kept, see open_cdf)
+            os.utime(fullpath, ns = (time.time_ns(), os.stat(fullpath).st_mtime_ns))
+    if downloaded and DATA_STORE != '' and DATA_STORE_QUOTA is not None:
+        evict_files(keep = fullpath)
+
+def evict_files(quota = None, keep = ''):
+    '''
+    This function deletes the files of the data store (see use_data_store) used the longest time ago 
+    until the store is smaller than the quota (DATA_STORE_QUOTA by default). Files in use by another process 
+    (being downloaded) and the file keep are not deleted.
+    Returns the list of the deleted files.
+    '''
+    quota = memory_size(DATA_STORE_QUOTA if quota is None else quota)
+    files = []
+    for folder, subfolders, names in os.walk(DATA_STORE):
+        subfolders[:] = [subfolder for subfolder in subfolders if subfolder not in ('.locks', QUARANTINE_FOLDER)]
+        for name in names:
+            if name.endswith('.cdf'):
+                path = os.path.join(folder, name)
+                stat = os.stat(path)
+                files.append((stat.st_atime_ns, stat.st_size, path))
+    
+    total = sum(size for access, size, path in files)
+    deleted = []
+    for access, size, path in sorted(files):
+        if total <= quota:
+            break
+        if os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        lock = FileLock(path, blocking = False)
+        if lock.acquire():
+            try:
+                os.remove(path)
+                total -= size
+                deleted.append(path)
+            finally:
+                lock.release()
+    return deleted
+
+def local_version(url):
+    '''
+    This function is primarily meant to be used in the listing_version function.
+    It returns the version of most of the files (e.g. 'v07') kept in the data store (see use_data_store) 
+    for a folder of the database, '' if there are none.
+    '''
+    if DATA_STORE == '' or not url.startswith(DATA_URL):
+        return ''
+    folder = os.path.join(DATA_STORE, *url[len(DATA_URL):].strip('/').split('/'))
+    if not os.path.isdir(folder):
+        return ''
+    versions = [file_key(name)[1] for name in os.listdir(folder) if name.endswith('.cdf')]
+    return max(set(versions), key = versions.count, default = '')
+
+def file_url(date, instrument, data = '', rate = ''):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    It returns the url of a file of the database, with the inputs of retrieve_data 
+    e.g. file_url('20190404', 'epihi', 'het', 'rates60').
+    '''
+    if instrument == 'isois':
+        urll = DATA_URL+instrument.upper()+"/level2/"
+    else:
+        urll = DATA_URL+instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]+"/level2/"
+    version = listing_version(urll)
+    
+    if instrument == 'isois':
+        return urll+'psp_isois_l2-summary_'+date+'_'+version+'.cdf'
+    if instrument == 'epilo':
+        return urll+'psp_isois-'+instrument+'_l2-'+data+'_'+date+'_'+version+'.cdf'
+    if instrument == 'epihi':
+        if rate == 'rates':
+            return urll+'psp_isois-'+instrument+'_l2-second-'+rate+'_'+date+'_'+version+'.cdf'
+        return urll+'psp_isois-'+instrument+'_l2-'+data+'-'+rate+'_'+date+'_'+version+'.cdf'
+    raise ValueError('The instrument should be epihi, epilo or isois.')
+
 def retrieve_data(path_to_folder, date, instrument, data = '', rate = ''):
     
     '''
@@ -72,74 +377,965 @@ def retrieve_data(path_to_folder, date, instrument, data = '', rate = ''):
     for EPI-Lo: no input needed
     for ISOIS: no input needed'
     
+    If a shared data store is used (see use_data_store) the file is kept in the store instead of path_to_folder.
+    Returns the path to the file.
 
     '''
     
-    if instrument == 'isois':
-        urll = "http://spp-isois.sr.unh.edu/data_public/"+instrument.upper()+"/level2/"
-    else:
-        urll = "http://spp-isois.sr.unh.edu/data_public/"+instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]+"/level2/"
-    page = requests.get(urll)    
-    dat = page.text
-    a = dat.find('.cdf')
-    b = a-10
-    c = dat[b:a].find('_')
-    version = dat[b+c+1:a]
+    path_to_folder = data_folder(path_to_folder, instrument)
+    url = file_url(date, instrument, data, rate)
+
+    try:
+        name = url[url.rfind('/')+1:len(url)]
+        fullpath = path_to_folder+os.sep+name
+        download_file(url, fullpath)
+    except:
+        print('The file for '+date+', '+instrument+', '+data+', '+rate+' is not available, check your input or choose another date!')
+    return fullpath
+
+#files streamed into memory (see stream_data) larger than this (bytes) are kept in a temporary file instead
+STREAM_SPILL_SIZE = 500e6
 
+def stream_cdf(url, spill_size = STREAM_SPILL_SIZE):
+    '''
+    This function is primarily meant to be used in the stream_data and open_cdf functions.
+    It downloads a cdf into memory (into a temporary file if it is larger than spill_size bytes, None for no limit) 
+    and opens it from there, nothing is written in the data folders. Returns a CachedCDF.
+    cdflib (0.4) has no public way to open a file from memory, the buffer is given to it through 
+    its private _file_or_url_or_s3_handler method. If cdflib does not have it (other versions), 
+    the file is written to a temporary folder instead, deleted when the file is not used anymore.
+    '''
+    response = requests.get(url, stream = True, timeout = 60)
+    response.raise_for_status()
+    buffer = io.BytesIO() if spill_size is None else tempfile.SpooledTemporaryFile(max_size = int(spill_size))
+    size = 0
+    for chunk in response.iter_content(1 << 20):
+        buffer.write(chunk)
+        size += len(chunk)
+    if 'Content-Length' in response.headers and size != int(response.headers['Content-Length']):
+        raise IOError('The download of '+url+' is incomplete.')
+    buffer.seek(0)
+    
+    #cdflib reads a file given by url from an in-memory buffer, it is given the buffer instead of downloading the url again
+    if hasattr(cdflib.CDF, '_file_or_url_or_s3_handler'):
+        cdf = cdflib.CDF.__new__(cdflib.CDF)
+        cdf._file_or_url_or_s3_handler = lambda filename, filetype, s3_read_method: buffer
+        cdf.__init__(url)
+        return CachedCDF(url, cdf)
+    
+    folder = tempfile.mkdtemp()
+    path = os.path.join(folder, url.split('/')[-1])
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(buffer, f)
+    buffer.close()
+    cached = CachedCDF(url, cdflib.CDF(path))
+    weakref.finalize(cached, shutil.rmtree, folder, ignore_errors = True)
+    return cached
 
+def stream_data(date, instrument, data = '', rate = '', spill_size = STREAM_SPILL_SIZE):
+    '''
+    This function retrieves a file from the PSP database like retrieve_data, but keeps it in memory 
+    instead of saving it in a folder, e.g. for short jobs that use a day of data once: 
+    nothing is written on disk (unless the file is larger than spill_size, then it is kept in a temporary file 
+    deleted when the file is closed).
+    
+    Input variables:
+    1. date, instrument, data, rate: see retrieve_data
+    2. spill_size: no input necessary, size in bytes above which the file is kept in a temporary file, None for no limit
+    
+    Returns the opened file (a CachedCDF, it can be used like a cdflib.CDF in all the functions of the software), 
+    None if the file is not available.
+    e.g. het = stream_data('20190404', 'epihi', 'het', 'rates60') then plot_pa_flux(het = het)
+    '''
     try:
-        if instrument == 'isois':
-            #ISOIS
-            url = 'http://spp-isois.sr.unh.edu/data_public/ISOIS/level2/psp_isois_l2-summary_'+date+'_'+version+'.cdf'
-            name = url[url.rfind('/')+1:len(url)]
-            fullpath = path_to_folder+os.sep+name
-            # checking if file already exists
-            if os.path.exists(fullpath):
-                print('File already present')
-                print('Path to file: '+fullpath)
-            else:
-                urllib.request.urlretrieve(url, fullpath)
-                print('File saved succesfuly as '+name)
-                print('Path to file: '+fullpath)
-        elif instrument == 'epilo':
-            url = 'http://spp-isois.sr.unh.edu/data_public/'+instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]+'/level2/psp_isois-'+instrument+'_l2-'+data+'_'+date+'_'+version+'.cdf'
-            name = url[url.rfind('/')+1:len(url)]
-            fullpath = path_to_folder+os.sep+name
-            if os.path.exists(fullpath):
-                print('File already present')
-                print('Path to file: '+fullpath)
-            else:
-                urllib.request.urlretrieve(url, fullpath)
-                print('File saved succesfuly as '+name)
-                print('Path to file: '+fullpath)
-        elif instrument == 'epihi':
-            if rate == 'rates':
-                url = 'http://spp-isois.sr.unh.edu/data_public/'+instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]+'/level2/psp_isois-'+instrument+'_l2-second-'+rate+'_'+date+'_'+version+'.cdf'
-                name = url[url.rfind('/')+1:len(url)]
-                fullpath = path_to_folder+os.sep+name
-                if os.path.exists(fullpath):
-                    print('File already present')
-                    print('Path to file: '+fullpath)
+        return stream_cdf(file_url(date, instrument, data, rate), spill_size)
+    except Exception:
+        print('The file for '+date+', '+instrument+', '+data+', '+rate+' is not available, check your input or choose another date!')
+        return None
+
+#name of the file (in each data folder) where the results of verify_files are kept
+VERIFY_RECORD = 'verified_files.json'
+#folder (in each data folder) where the files that fail verify_files are moved
+QUARANTINE_FOLDER = 'quarantine'
+VERIFY_LOCK = threading.Lock()
+
+def file_request(path):
+    '''
+    This function is primarily meant to be used in the verify_files function.
+    It returns the inputs of retrieve_data (date, instrument, data, rate) of a file from its name, 
+    e.g. 'psp_isois-epihi_l2-het-rates60_20190404_v07.cdf' gives ('20190404', 'epihi', 'het', 'rates60').
+    '''
+    name = os.path.basename(path)
+    date = name.split('_')[-2]
+    if name.startswith('psp_isois_l2-summary'):
+        return date, 'isois', '', ''
+    product = name[name.find('l2-')+3:name.rfind('_'+date)]
+    if name.startswith('psp_isois-epilo'):
+        return date, 'epilo', product, ''
+    if product.startswith('second-'):
+        return date, 'epihi', '', product[7:]
+    data, rate = product.split('-')
+    return date, 'epihi', data, rate
+
+def remote_size(path):
+    '''
+    This function is primarily meant to be used in the verify_files function.
+    It returns the size in bytes of a file in the database (from the headers of the server, nothing is downloaded), 
+    None if the server does not give it.
+    '''
+    date, instrument, data, rate = file_request(path)
+    folder = 'ISOIS' if instrument == 'isois' else instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]
+    try:
+        response = requests.head(DATA_URL+folder+'/level2/'+os.path.basename(path), timeout = 30)
+        if response.status_code == 200 and 'Content-Length' in response.headers:
+            return int(response.headers['Content-Length'])
+    except Exception:
+        pass
+    return None
+
+def check_cdf(path, size = None, checksum = None):
+    '''
+    This function is primarily meant to be used in the verify_files function.
+    It checks a cdf file without decoding it: the size against the expected size (if given), 
+    the sha256 checksum against the expected checksum (if given), the header of the file 
+    (cdf magic number, first records) and the end of file written in the header (a truncated download is shorter).
+    Returns the problem found ('' if the file is good) and the checksum of the file.
+    '''
+    actual = os.path.getsize(path)
+    if actual == 0:
+        return 'empty file', ''
+    if size is not None and actual != size:
+        return 'size '+str(actual)+' instead of '+str(size), ''
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        header = f.read(1024)
+        digest.update(header)
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest = digest.hexdigest()
+    if checksum is not None and digest != checksum:
+        return 'checksum', digest
+    
+    if len(header) < 8 or header[0:4] not in (b'\xcd\xf3\x00\x01', b'\xcd\xf2\x60\x02', b'\x00\x00\xff\xff'):
+        return 'not a cdf file', digest
+    if header[0:4] != b'\xcd\xf3\x00\x01':
+        #version 2 cdf, only the magic number is checked
+        return '', digest
+    
+    if header[4:8] == b'\xcc\xcc\x00\x01':
+        #compressed file: one compressed record (CCR) after the magic number
+        record_size = int.from_bytes(header[8:16], 'big') if len(header) >= 20 else 0
+        if int.from_bytes(header[16:20], 'big') != 10 or actual < 8 + record_size:
+            return 'truncated file', digest
+        return '', digest
+    
+    #CDF descriptor record then global descriptor record, which has the end of file and the number of zVariables
+    if len(header) < 28 or int.from_bytes(header[16:20], 'big') != 1:
+        return 'bad cdf header', digest
+    gdr = int.from_bytes(header[20:28], 'big')
+    with open(path, 'rb') as f:
+        f.seek(gdr)
+        record = f.read(64)
+    if len(record) < 64 or int.from_bytes(record[8:12], 'big') != 2:
+        return 'truncated file', digest
+    if actual < int.from_bytes(record[36:44], 'big'):
+        return 'truncated file', digest
+    if int.from_bytes(record[60:64], 'big') == 0:
+        return 'empty file', digest
+    return '', digest
+
+def quarantine_file(path_to_folder, path, problem):
+    '''
+    This function is primarily meant to be used in the verify_files function.
+    It moves a bad file to the quarantine folder of path_to_folder (the date is added to its name, 
+    and a number if the same file was already quarantined in the same second).
+    '''
+    print('The file '+path+' is bad ('+problem+'), it is moved to the quarantine folder.')
+    quarantine = os.path.join(path_to_folder, QUARANTINE_FOLDER)
+    os.makedirs(quarantine, exist_ok = True)
+    target = os.path.join(quarantine, os.path.basename(path)+'.'+datetime.now().strftime('%Y%m%d%H%M%S'))
+    number = 1
+    while os.path.exists(target if number == 1 else target+'-'+str(number)):
+        number += 1
+    shutil.move(path, target if number == 1 else target+'-'+str(number))
+
+def verify_files(path_to_folder, paths = None, manifest = None, check_remote = False, download = True, parallelism = 4):
+    '''
+    This function checks the downloaded cdf files (see check_cdf) in parallel: empty files, truncated downloads, 
+    files that do not have the size of the database or of the manifest and files with a wrong checksum.
+    The bad files are moved to the quarantine folder of path_to_folder and downloaded again (and checked again).
+    The result for each file is kept in the verified_files.json file of path_to_folder, 
+    so the files that did not change since they were checked are not checked again.
+    
+    Input variables:
+    
+    1. path_to_folder: folder of the cdf files
+    
+    2. paths: no input necessary, list of the files to check, all the cdf files of path_to_folder by default
+    
+    3. manifest: no input necessary, the expected sizes and checksums as a dictionary 
+    {file name: {'size': ..., 'sha256': ...}} or the path of a json file with that dictionary
+    
+    4. check_remote: True to compare the sizes with the sizes of the files in the database (one request per file)
+    
+    5. download: True to download the bad files again, False to only move them to the quarantine folder
+    
+    6. parallelism: number of files checked at the same time
+    
+    Returns a dictionary with the list of the 'good' files, the 'bad' files ({path: problem}) and the list of the 'skipped' files 
+    (good files not changed since they were checked, also in 'good').
+    '''
+    if paths is None:
+        paths = sorted(os.path.join(path_to_folder, name) for name in os.listdir(path_to_folder) if name.endswith('.cdf'))
+    if isinstance(manifest, str):
+        with open(manifest) as f:
+            manifest = json.load(f)
+    manifest = manifest or {}
+    
+    record_path = os.path.join(path_to_folder, VERIFY_RECORD)
+    with VERIFY_LOCK:
+        record = {}
+        if os.path.exists(record_path):
+            try:
+                with open(record_path) as f:
+                    record = json.load(f)
+            except ValueError:
+                record = {}
+    
+    def state(path):
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    
+    result = {'good': [], 'bad': {}, 'skipped': []}
+    to_check = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        entry = record.get(os.path.basename(path))
+        if entry is not None and entry.get('problem') == '' and {key: entry.get(key) for key in ('size', 'mtime_ns')} == state(path):
+            result['good'].append(path)
+            result['skipped'].append(path)
+        else:
+            to_check.append(path)
+    
+    def check(path):
+        expected = manifest.get(os.path.basename(path), {})
+        size = expected.get('size')
+        if size is None and check_remote:
+            size = remote_size(path)
+        problem, checksum = check_cdf(path, size, expected.get('sha256'))
+        return path, problem, checksum
+    
+    for attempt in range(2 if download else 1):
+        if len(to_check) == 0:
+            break
+        with ThreadPoolExecutor(max_workers = max(1, parallelism)) as executor:
+            checked = list(executor.map(check, to_check))
+        
+        to_check = []
+        for path, problem, checksum in checked:
+            name = os.path.basename(path)
+            entry = dict(state(path), sha256 = checksum, problem = problem, checked = datetime.now().isoformat(timespec = 'seconds'))
+            if problem == '':
+                result['good'].append(path)
+                result['bad'].pop(path, None)
+                record[name] = entry
+                continue
+            
+            result['bad'][path] = problem
+            record[name] = entry
+            quarantine_file(path_to_folder, path, problem)
+            if download and attempt == 0:
+                date, instrument, data, rate = file_request(path)
+                retrieve_data(os.path.dirname(path), date, instrument, data = data, rate = rate)
+                if os.path.exists(path):
+                    to_check.append(path)
+    
+    with VERIFY_LOCK:
+        if os.path.exists(record_path):
+            try:
+                with open(record_path) as f:
+                    #keep the results written by other calls in the meantime
+                    record = dict(json.load(f), **record)
+            except ValueError:
+                pass
+        with open(record_path+'.tmp', 'w') as f:
+            json.dump(record, f, indent = 1)
+        os.replace(record_path+'.tmp', record_path)
+    return result
+
+#folders of the database mirrored by sync_mirror
+MIRROR_FOLDERS = {'epihi': 'EPIHi/level2/', 'epilo': 'EPILo/level2/', 'isois': 'ISOIS/level2/'}
+
+def file_key(name):
+    '''
+    This function is primarily meant to be used in the sync_mirror function.
+    It splits a file name into the name without the version and the version, 
+    e.g. 'psp_isois-epihi_l2-het-rates60_20190404_v07.cdf' gives ('psp_isois-epihi_l2-het-rates60_20190404', 'v07').
+    '''
+    key, version = name[:-len('.cdf')].rsplit('_', 1)
+    return key, version
+
+def remote_files(url):
+    '''
+    This function is primarily meant to be used in the sync_mirror function.
+    It returns the names of the cdf files of a folder of the database from its listing e.g. DATA_URL+'EPIHi/level2/'.
+    '''
+    from urllib.parse import unquote
+    page = requests.get(url, timeout = 60)
+    page.raise_for_status()
+    return sorted(set(unquote(name) for name in re.findall(r'href="([^"?/]+\.cdf)"', page.text)))
+
+#seconds waited before the first new try of a failed download of sync_mirror (doubled at each try)
+SYNC_RETRY_WAIT = 1
+
+def sync_mirror(path_to_mirror = '', instruments = None, start_date = '', end_date = '', products = None, 
+                prune = False, check_sizes = False, parallelism = 4, retries = 2):
+    '''
+    This function keeps a local copy (mirror) of the level2 folders of the database up to date, 
+    so the analysis can run without the network (use the mirror as data store, see use_data_store).
+    The listing of the database is compared with the mirror: only the files that are not in the mirror 
+    (new days or new versions) are downloaded, in parallel, and checked (see verify_files). 
+    A daily sync only downloads the files of the new day.
+    
+    Input variables:
+    
+    1. path_to_mirror: folder of the mirror (in the layout of the database e.g. EPIHi/level2/...), 
+    the data store (see use_data_store) by default
+    
+    2. instruments: list of the folders to mirror: 'epihi', 'epilo' and/or 'isois' (['epihi'] by default)
+    
+    3. start_date: no input necessary, first date ('YYYYMMDD') to mirror
+    
+    4. end_date: no input necessary, last date ('YYYYMMDD') to mirror
+    
+    5. products: no input necessary, list of the products to mirror e.g. ['het-rates60', 'let1-rates60'], all by default
+    
+    6. prune: True to delete the older versions of the files once the new version is downloaded
+    
+    7. check_sizes: True to also compare the sizes of the files already in the mirror with the database 
+    (one request per file) and download again the files that differ
+    
+    8. parallelism: number of files downloaded at the same time
+    
+    9. retries: number of new tries of a failed download (the files that still fail are downloaded by the next sync)
+    
+    Returns a dictionary with the lists of the 'downloaded', 'failed' and 'pruned' files 
+    and the number of files already 'up_to_date'.
+    '''
+    root = path_to_mirror if path_to_mirror != '' else DATA_STORE
+    if root == '':
+        print('Choose a folder for the mirror (path_to_mirror) or use a data store (see use_data_store).')
+        return None
+    
+    if instruments is None:
+        instruments = ['epihi']
+    if products is None:
+        products = []
+    
+    summary = {'downloaded': [], 'failed': [], 'pruned': [], 'up_to_date': 0}
+    for instrument in instruments:
+        url = DATA_URL+MIRROR_FOLDERS[instrument]
+        folder = os.path.join(root, *MIRROR_FOLDERS[instrument].strip('/').split('/'))
+        os.makedirs(folder, exist_ok = True)
+        
+        #newest version of each file of the database
+        latest = {}
+        for name in remote_files(url):
+            key, version = file_key(name)
+            date = key.split('_')[-1]
+            if (start_date != '' and date < start_date) or (end_date != '' and date > end_date):
+                continue
+            if len(products) > 0 and not any(product in key for product in products):
+                continue
+            if key not in latest or int(version[1:]) > int(latest[key][1:]):
+                latest[key] = version
+        
+        local = {}
+        for name in os.listdir(folder):
+            if name.endswith('.cdf'):
+                key, version = file_key(name)
+                local.setdefault(key, []).append(version)
+        
+        missing = [key+'_'+latest[key]+'.cdf' for key in sorted(latest) if latest[key] not in local.get(key, [])]
+        present = [os.path.join(folder, key+'_'+latest[key]+'.cdf') for key in sorted(latest) if latest[key] in local.get(key, [])]
+        if check_sizes and len(present) > 0:
+            with ThreadPoolExecutor(max_workers = max(1, parallelism)) as executor:
+                sizes = list(executor.map(remote_size, present))
+            for path, size in zip(present, sizes):
+                if size is not None and os.path.getsize(path) != size:
+                    quarantine_file(folder, path, 'size '+str(os.path.getsize(path))+' instead of '+str(size))
+                    missing.append(os.path.basename(path))
+        summary['up_to_date'] += len(latest) - len(missing)
+        
+        def download(name):
+            for attempt in range(retries+1):
+                try:
+                    download_file(url+name, os.path.join(folder, name))
+                    return name, True
+                except Exception:
+                    if attempt < retries:
+                        time.sleep(SYNC_RETRY_WAIT*2**attempt)
+            print('The file '+name+' could not be downloaded.')
+            return name, False
+        
+        with ThreadPoolExecutor(max_workers = max(1, parallelism)) as executor:
+            downloaded = list(executor.map(download, missing))
+        paths = [os.path.join(folder, name) for name, ok in downloaded if ok]
+        checked = verify_files(folder, paths, download = False, parallelism = parallelism)
+        summary['downloaded'] += checked['good']
+        summary['failed'] += [os.path.join(folder, name) for name, ok in downloaded if not ok] + list(checked['bad'])
+        
+        if prune:
+            for key, versions in local.items():
+                if key not in latest or not os.path.exists(os.path.join(folder, key+'_'+latest[key]+'.cdf')):
+                    continue
+                for version in versions:
+                    if version != latest[key]:
+                        path = os.path.join(folder, key+'_'+version+'.cdf')
+                        lock = FileLock(path, blocking = False)
+                        if lock.acquire():
+                            try:
+                                os.remove(path)
+                                summary['pruned'].append(path)
+                            finally:
+                                lock.release()
+    
+    print('Mirror sync: '+str(len(summary['downloaded']))+' files downloaded, '+str(summary['up_to_date'])+' up to date, '
+          +str(len(summary['failed']))+' failed, '+str(len(summary['pruned']))+' pruned.')
+    return summary
+
+#cdf data types read with np.memmap (see MappedCDF), the other types (characters, EPOCH16) are read by cdflib
+CDF_NUMPY_TYPES = {1: 'i1', 2: 'i2', 4: 'i4', 8: 'i8', 11: 'u1', 12: 'u2', 14: 'u4', 21: 'f4', 22: 'f8', 
+                   31: 'f8', 33: 'i8', 41: 'i1', 44: 'f4', 45: 'f8'}
+#encodings of the cdf files with the byte order of this computer
+CDF_NATIVE_ENCODINGS = (4, 6, 8, 16, 17, 19) if sys.byteorder == 'little' else (1, 2, 5, 7, 9, 12, 18)
+#False to decode all the variables with cdflib instead of memory mapping them (see MappedCDF)
+MEMORY_MAP = True
+
+class MappedCDF:
+    '''
+    An opened cdf whose uncompressed variables are read as views of the file mapped in memory (np.memmap) 
+    instead of being read and copied by cdflib: the records of a variable are at fixed places in the file, 
+    found once from its variable index records (VXR) and value records (VVR). 
+    Reading a variable or a range of its records (startrec, endrec) costs no copy, the operating system 
+    reads the pages of the file when they are used (and keeps them in its cache for the next reads).
+    Only the variables of row major files that are not compressed and not sparse are memory mapped, 
+    the other variables (and all the variables of column major or compressed files), the variables in several pieces 
+    and the character variables are read by cdflib.
+    It can be used in place of cdflib.CDF (the other methods are passed on to the cdflib.CDF).
+    
+    Input variable:
+    path: path to the cdf file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.cdf = cdflib.CDF(path)
+        self.layouts = {}
+        with open(path, 'rb') as f:
+            #magic numbers of an uncompressed version 3 file and its CDR (encoding and flags, flag 1: row major)
+            header = f.read(44)
+            self.mappable = (len(header) == 44 and header[0:8] == b'\xcd\xf3\x00\x01\x00\x00\xff\xff' 
+                             and int.from_bytes(header[36:40], 'big') in CDF_NATIVE_ENCODINGS
+                             and int.from_bytes(header[40:44], 'big') & 1 == 1)
+            if self.mappable:
+                f.seek(int.from_bytes(header[20:28], 'big'))
+                gdr = f.read(28)
+                self.vdrs = self.read_vdrs(f, int.from_bytes(gdr[20:28], 'big'))
+    
+    @staticmethod
+    def read_vdrs(f, offset):
+        #chain of the zVariable descriptor records: 
+        #{name: (data type, number of elements, dimensions, flags, first VXR, all dimensions vary, last record, sparse records)}
+        vdrs = {}
+        while offset != 0:
+            f.seek(offset)
+            vdr = f.read(344)
+            dimensions = int.from_bytes(vdr[340:344], 'big')
+            sizes = f.read(8*dimensions)
+            shape = tuple(int.from_bytes(sizes[4*i:4*i+4], 'big') for i in range(dimensions))
+            varys = all(sizes[4*dimensions+4*i:4*dimensions+4*i+4] != b'\x00\x00\x00\x00' for i in range(dimensions))
+            name = vdr[84:340].split(b'\x00')[0].decode('ascii', 'replace')
+            vdrs[name] = (int.from_bytes(vdr[20:24], 'big'), int.from_bytes(vdr[64:68], 'big'), shape, 
+                          int.from_bytes(vdr[44:48], 'big'), int.from_bytes(vdr[28:36], 'big'), varys, 
+                          int.from_bytes(vdr[24:28], 'big', signed = True), int.from_bytes(vdr[48:52], 'big'))
+            offset = int.from_bytes(vdr[12:20], 'big')
+        return vdrs
+    
+    @staticmethod
+    def read_vxrs(f, offset, pieces):
+        #(first record, last record, offset of the data) of the value records, None if a record is compressed
+        while offset != 0:
+            f.seek(offset)
+            vxr = f.read(28)
+            entries = int.from_bytes(vxr[20:24], 'big')
+            used = int.from_bytes(vxr[24:28], 'big')
+            table = f.read(16*entries)
+            for i in range(used):
+                first = int.from_bytes(table[4*i:4*i+4], 'big')
+                last = int.from_bytes(table[4*entries+4*i:4*entries+4*i+4], 'big')
+                record = int.from_bytes(table[8*entries+8*i:8*entries+8*i+8], 'big')
+                f.seek(record+8)
+                kind = int.from_bytes(f.read(4), 'big')
+                if kind == 6:
+                    if MappedCDF.read_vxrs(f, record, pieces) is None:
+                        return None
+                elif kind == 7:
+                    pieces.append((first, last, record+12))
                 else:
-                    urllib.request.urlretrieve(url, fullpath)
-                    print('File saved succesfuly as '+name)
-                    print('Path to file: '+fullpath)
-        
-            else:   
-                url = 'http://spp-isois.sr.unh.edu/data_public/'+instrument[0:len(instrument)-1].upper()+instrument[len(instrument)-1]+'/level2/psp_isois-'+instrument+'_l2-'+data+'-'+rate+'_'+date+'_'+version+'.cdf'
-                name = url[url.rfind('/')+1:len(url)]
-                fullpath = path_to_folder+os.sep+name
+                    return None
+            offset = int.from_bytes(vxr[12:20], 'big')
+        return pieces
+    
+    def layout(self, variable):
+        '''
+        Returns the memory mapped records of a variable (a np.memmap, one row per record), 
+        None if the variable has to be read by cdflib.
+        '''
+        if variable in self.layouts:
+            return self.layouts[variable]
+        mapped = None
+        vdr = self.vdrs.get(variable) if self.mappable else None
+        if vdr is not None:
+            data_type, elements, shape, flags, vxr, varys, last_record, sparse = vdr
+            #flag 4: compressed variable
+            if data_type in CDF_NUMPY_TYPES and elements == 1 and not flags & 4 and sparse == 0 and varys:
+                with open(self.path, 'rb') as f:
+                    pieces = self.read_vxrs(f, vxr, [])
+                #only the variables written in one piece with all their records
+                if pieces is not None and len(pieces) == 1 and pieces[0][0] == 0 and pieces[0][1] == last_record:
+                    first, last, offset = pieces[0]
+                    mapped = np.memmap(self.path, dtype = CDF_NUMPY_TYPES[data_type], mode = 'r', 
+                                       offset = offset, shape = (last+1,) + shape)
+        self.layouts[variable] = mapped
+        return mapped
+    
+    def varget(self, variable = None, startrec = None, endrec = None, **kwargs):
+        mapped = None if kwargs else self.layout(variable)
+        if mapped is None:
+            if startrec is not None or endrec is not None:
+                kwargs['startrec'] = 0 if startrec is None else startrec
+                kwargs['endrec'] = endrec
+            return self.cdf.varget(variable, **kwargs)
+        first = 0 if startrec is None else startrec
+        last = len(mapped)-1 if endrec is None else endrec
+        values = mapped[first:last+1]
+        #like cdflib: a variable with one record is returned without the record dimension (not a range of records), 
+        #a variable that does not vary with the records (flag 1: record variance) always is
+        if len(values) == 1 and ((startrec is None and endrec is None) or not self.vdrs[variable][3] & 1):
+            return values[0]
+        return values
+    
+    def __getattr__(self, name):
+        return getattr(self.cdf, name)
+
+class CachedCDF:
+    '''
+    An opened cdf that keeps the data it has already read (decoded) in memory.
+    It can be used in place of cdflib.CDF in all the functions of the software:
+    varget returns the data read the first time instead of decoding the variable again.
+    The arrays are read only, so they cannot be changed by accident while they are shared.
+    
+    Use the open_cdf function to get one, it reuses the CachedCDF of recently used files.
+    '''
+    
+    def __init__(self, path, cdf = None):
+        self.path = path
+        if cdf is None:
+            #uncompressed variables are memory mapped instead of decoded (see MappedCDF)
+            cdf = MappedCDF(path) if MEMORY_MAP else cdflib.CDF(path)
+        self.cdf = cdf
+        self.data = {}
+        self.info = None
+        #the file is read through one file handle, so one thread at a time (see Pipeline)
+        self.lock = threading.RLock()
+    
+    def varget(self, variable = None, **kwargs):
+        with self.lock:
+            if kwargs:
+                return self.cdf.varget(variable, **kwargs)
+            if variable not in self.data:
+                values = self.cdf.varget(variable)
+                if isinstance(values, np.ndarray):
+                    values.flags.writeable = False
+                self.data[variable] = values
+            return self.data[variable]
+    
+    def cdf_info(self):
+        with self.lock:
+            if self.info is None:
+                self.info = self.cdf.cdf_info()
+            return self.info
+    
+    def __getattr__(self, name):
+        # varinq, varattsget, globalattsget... are passed on to the cdflib.CDF
+        return getattr(self.cdf, name)
+
+def epoch_datetimes(cdf_name):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    
+    It returns the Epoch of a cdf (TT2000, ns since J2000) converted to a list of datetimes (UTC).
+    See epoch_index for the same dates as datetime64 (8 bytes per date, a python datetime takes about 48).
+    
+    Input variable:
+    cdf_name: the name given to the cdf when opened in a notebook e.g. cdf_name = cdflib.CDF(r'path_to_folder')
+    '''
+    return list(epoch_index(cdf_name).to_pydatetime())
+
+def epoch_index(cdf_name):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    
+    It returns the Epoch of a cdf converted to UTC dates as a pandas DatetimeIndex (datetime64, see tt2000_datetimes).
+    For a CachedCDF (see open_cdf) the converted Epoch is kept with the file's data, 
+    so the Epoch of a recently used file is converted only once 
+    (a CDFWindow of a CachedCDF uses the part of the converted Epoch of its time range if there is one).
+    
+    Input variable:
+    cdf_name: the name given to the cdf when opened in a notebook e.g. cdf_name = cdflib.CDF(r'path_to_folder')
+    '''
+    if isinstance(cdf_name, CachedCDF):
+        with cdf_name.lock:
+            if 'Epoch datetimes' not in cdf_name.data:
+                cdf_name.data['Epoch datetimes'] = epoch_index(cdf_name.cdf)
+            return cdf_name.data['Epoch datetimes']
+    
+    if isinstance(cdf_name, CDFWindow) and isinstance(cdf_name.cdf_name, CachedCDF) and 'Epoch datetimes' in cdf_name.cdf_name.data:
+        return cdf_name.cdf_name.data['Epoch datetimes'][cdf_name.first:cdf_name.last]
+    
+    return tt2000_datetimes(cdf_name.varget('Epoch'))
+
+def tt2000_datetimes(t):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    
+    It converts an array of Epoch values (TT2000, ns since J2000) to UTC dates (a pandas DatetimeIndex).
+    The whole array is converted at once by astropy, with the same result as converting 
+    the values one by one as in the other functions of the software.
+    '''
+    if len(t) == 0:
+        return pd.DatetimeIndex([])
+    date_time_str = (Time(2000, format= 'jyear')+ TimeDelta(np.asarray(t)*u.ns)).iso
+    return pd.DatetimeIndex(pd.to_datetime(date_time_str, format = '%Y-%m-%d %H:%M:%S.%f'))
+
+#recently opened files, see open_cdf
+CDF_CACHE = OrderedDict()
+CDF_CACHE_SIZE = 32
+CDF_CACHE_LOCK = threading.Lock()
+
+def open_cdf(path):
+    '''
+    This function opens a cdf file and returns it as a CachedCDF (it can be used like a cdflib.CDF).
+    
+    The last CDF_CACHE_SIZE opened files are kept in CDF_CACHE with the data already read from them, 
+    so opening a recently used file again does not read and decode its data again.
+    A file that changed on disk (e.g. downloaded again) is opened again.
+    
+    Input variable:
+    path: path to the cdf file, or the url of a file of the database (it is then kept in memory, see stream_data)
+    '''
+    remote = path.startswith('http://') or path.startswith('https://')
+    if remote:
+        key = (path,)
+    else:
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+    
+    with CDF_CACHE_LOCK:
+        if key in CDF_CACHE:
+            CDF_CACHE.move_to_end(key)
+            return CDF_CACHE[key]
+    
+    #a url is downloaded without holding the lock, so the other files can be opened meanwhile
+    f = stream_cdf(path) if remote else None
+    with CDF_CACHE_LOCK:
+        if key in CDF_CACHE:
+            CDF_CACHE.move_to_end(key)
+            return CDF_CACHE[key]
+        
+        if f is None:
+            f = CachedCDF(path)
+        CDF_CACHE[key] = f
+        while len(CDF_CACHE) > CDF_CACHE_SIZE:
+            CDF_CACHE.popitem(last = False)
+        return f
+
+def warm_cdf(path, variables = None):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    It opens a cdf with open_cdf and reads (decodes) its Epoch and all its variables 
+    (or only the variables in the list variables), so that using the file afterwards does not need to read anything.
+    '''
+    f = open_cdf(path)
+    epoch_index(f)
+    for variable in f.cdf_info().get('zVariables'):
+        if variables is None or variable in variables:
+            f.varget(variable)
+    return f
+
+def epoch_records(t, start = '', end = ''):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    It finds (binary search) the records of a sorted Epoch array between start and end (end not included) 
+    e.g. '2019-04-04 06:30' and returns the first record and the record after the last one.
+    '''
+    first = 0 if start == '' else int(np.searchsorted(t, datetime_tt2000(start), side = 'left'))
+    last = len(t) if end == '' else int(np.searchsorted(t, datetime_tt2000(end), side = 'left'))
+    return first, max(first, last)
+
+def range_dates(start, end):
+    '''
+    This function returns the dates ('YYYYMMDD') of the daily files that cover a time range 
+    e.g. '2019-04-04 22:00' to '2019-04-05 01:00' (end not included) gives ['20190404', '20190405'].
+    '''
+    last_day = (pd.Timestamp(end) - pd.Timedelta(1, 'ns')).normalize()
+    return [str(d.strftime('%Y%m%d')) for d in pd.date_range(pd.Timestamp(start).normalize(), last_day, freq = 'd')]
+
+class CDFWindow:
+    '''
+    The records of an opened cdf between two times e.g. '2019-04-04 22:00' and '2019-04-05 01:00' (end not included).
+    It can be used in place of cdflib.CDF in the functions of the software (e.g. pa_dataframe, epoch_datetimes): 
+    varget returns only the records of the time range for the variables with one record per Epoch 
+    and the whole variable for the others (energies, labels...).
+    The records are found with a binary search on the Epoch and only these records are read from the file 
+    (sliced from the data already read for a CachedCDF, see open_cdf).
+    
+    Input variables:
+    1. cdf_name: the name given to the cdf when opened e.g. cdf_name = open_cdf(path) or cdflib.CDF(path)
+    2. start, end: the time range, '' for the start or the end of the file
+    '''
+    
+    def __init__(self, cdf_name, start = '', end = ''):
+        self.cdf_name = cdf_name
+        t = cdf_name.varget('Epoch')
+        self.records = len(t)
+        self.first, self.last = epoch_records(t, start, end)
+        self.data = {}
+    
+    def varget(self, variable = None, **kwargs):
+        if kwargs:
+            return self.cdf_name.varget(variable, **kwargs)
+        if variable not in self.data:
+            inquiry = self.cdf_name.varinq(variable)
+            #labels can be stored with one record per label, only the variables with one record per Epoch are cut
+            if not inquiry['Rec_Vary'] or inquiry['Last_Rec']+1 != self.records:
+                values = self.cdf_name.varget(variable)
+            elif isinstance(self.cdf_name, CachedCDF) and variable in self.cdf_name.data:
+                values = self.cdf_name.data[variable][self.first:self.last]
+            else:
+                shape = (self.last-self.first,) + tuple(inquiry['Dim_Sizes'])
+                values = np.empty(shape)
+                if self.last > self.first:
+                    values = self.cdf_name.varget(variable, startrec = self.first, endrec = self.last-1)
+                    #a single record is returned without the record dimension
+                    values = np.reshape(values, shape)
+            self.data[variable] = values
+        return self.data[variable]
+    
+    def __getattr__(self, name):
+        # cdf_info, varinq, varattsget... are passed on to the opened cdf
+        return getattr(self.cdf_name, name)
+
+#width in inches of the time axis of multipanel_v001 (figure width times the default axes fraction)
+MULTIPANEL_AXIS_WIDTH = 35*0.775
+RATE_CADENCES = {'rates10': 10, 'rates60': 60, 'rates3600': 3600}
+
+def pixel_resolution(days, dpi = 300, plot_resolution = 'original', width = MULTIPANEL_AXIS_WIDTH):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    
+    It chooses the data resolution from the number of pixel columns of the time axis: 
+    the coarsest rate that still gives about one sample per pixel column 
+    (at least half a sample, otherwise the finest rate, 'rates10', is used).
+    If that rate gives more than two samples per pixel column and no plot resolution is chosen, 
+    the plot is averaged to about one sample per pixel column (a multiple of the cadence, e.g. '300S').
+    
+    Input variables:
+    1. days: number of consecutive days
+    
+    2. dpi: resolution of the saved figure
+    
+    3. plot_resolution: the plot resolution chosen by the user ('original' if none, see multipanel_v001)
+    
+    4. width: width of the time axis in inches
+    
+    Returns data_resolution and plot_resolution.
+    '''
+    pixels = width*dpi
+    span = days*86400
+    data_resolution = 'rates10'
+    for rate in ['rates3600', 'rates60', 'rates10']:
+        if span/RATE_CADENCES[rate] >= pixels/2:
+            data_resolution = rate
+            break
+    
+    cadence = RATE_CADENCES[data_resolution]
+    if plot_resolution == 'original' and span/cadence > 2*pixels:
+        plot_resolution = str(int(cadence*(span/pixels//cadence)))+'S'
+    return data_resolution, plot_resolution
+
+def auto_resolution(days, dpi = 300):
+    '''
+    This function returns the data resolution multipanel_v001 uses when there is no input 
+    for a plot saved with dpi (see pixel_resolution).
+    '''
+    return pixel_resolution(days, dpi)[0]
+
+def fetch_files(path_to_folder, dates, data_resolution, products = ['let1', 'let2', 'het'], instrument = 'epihi', fallback_rates = []):
+    '''
+    This function is primarily meant to be used in a Pipeline.
+    It downloads the files of the dates (EPI-Hi by default, see retrieve_data) if they are not already 
+    in path_to_folder, checks them (see verify_files) and returns the paths of the good files.
+    If a file is not available at data_resolution, the rates of fallback_rates are tried in order (e.g. ['rates60', 'rates3600']).
+    '''
+    paths = []
+    for date in dates:
+        for product in products:
+            for rate in [data_resolution] + list(fallback_rates):
+                fullpath = retrieve_data(path_to_folder, date, instrument, data = product, rate = rate)
                 if os.path.exists(fullpath):
-                    print('File already present')
-                    print('Path to file: '+fullpath)
+                    if rate != data_resolution:
+                        print('The chosen data resolution is not available, the file for '+rate+'was downloaded instead.')
+                    paths.append(fullpath)
+                    break
+    if len(paths) == 0:
+        return paths
+    #the files are in the shared data store (see use_data_store) or in path_to_folder
+    good = set(verify_files(os.path.dirname(paths[0]), paths, parallelism = 1)['good'])
+    return [path for path in paths if path in good]
+
+def decode_files(paths, variables = None):
+    '''
+    This function is primarily meant to be used in a Pipeline.
+    It reads (decodes) the files (only the variables in the list variables if given) with warm_cdf, 
+    so they are ready in CDF_CACHE when they are used.
+    '''
+    for path in paths:
+        warm_cdf(path, variables)
+    return paths
+
+#number of items (days or windows) a Pipeline works on ahead of the one in use
+PIPELINE_DEPTH = 3
+
+class Pipeline:
+    '''
+    Runs the stages of the work on a list of items (e.g. download then decode the files of each day) 
+    in background threads, one thread per stage, so that a stage works on the next item while 
+    the following stage (or the function using the items) works on the current one.
+    The run time then gets close to the time of the slowest stage instead of the sum of all of them.
+    
+    At most depth items are worked on ahead of the item in use, so the memory used stays the same 
+    however many items there are.
+    
+    Input variables:
+    1. items: list of items (e.g. dates), each item only once
+    2. stages: list of functions, the first one is called with the item, the others with the result of the previous stage.
+    If a stage fails on an item, the following stages skip the item and get(item) raises the error.
+    3. depth: number of items worked on ahead of the item in use
+    
+    Use get(item) to wait until an item went through the stages, then the Pipeline works on one more item 
+    (each item can be used once, its results are not kept afterwards).
+    The items have to be used in the order of the list: getting an item skips the items before it that were not used 
+    (their results are dropped, so the Pipeline does not wait for them to be used), 
+    and getting an item that was already used or skipped raises a ValueError.
+    Use close() at the end, also when the work on the items fails (try ... finally), so the threads stop.
+    '''
+    
+    def __init__(self, items, stages, depth = PIPELINE_DEPTH):
+        self.items = list(items)
+        self.positions = {item: number for number, item in enumerate(self.items)}
+        #position of the next item to use
+        self.position = 0
+        self.stages = stages
+        self.slots = threading.Semaphore(depth)
+        self.results = [{} for stage in stages]
+        self.done = [{item: threading.Event() for item in self.items} for stage in stages]
+        self.stopped = False
+        #items already used with get, their results are not kept
+        self.consumed = set()
+        self.lock = threading.Lock()
+        #queues between the stages
+        self.queues = [queue.Queue(maxsize = depth) for stage in stages[1:]]
+        self.threads = [threading.Thread(target = self.run, args = (number,), daemon = True) for number in range(len(stages))]
+        for thread in self.threads:
+            thread.start()
+    
+    def source(self):
+        for item in self.items:
+            self.slots.acquire()
+            if self.stopped:
+                return
+            yield item, item, None
+    
+    def run(self, number):
+        if number == 0:
+            entries = self.source()
+        else:
+            entries = iter(self.queues[number-1].get, None)
+        
+        for item, value, error in entries:
+            if error is None:
+                try:
+                    value = self.stages[number](value)
+                except Exception as e:
+                    error = e
+            with self.lock:
+                if item in self.consumed:
+                    #the item was already used (result of an earlier stage)
+                    self.done[number].pop(item, None)
                 else:
-                    urllib.request.urlretrieve(url, fullpath)
-                    print('File saved succesfuly as '+name)
-                    print('Path to file: '+fullpath)
-        
-    except:
-        print('The file for '+date+', '+instrument+', '+data+', '+rate+' is not available, check your input or choose another date!')
-    return fullpath
+                    self.results[number][item] = (value, error)
+                    self.done[number][item].set()
+            if number < len(self.queues):
+                self.queues[number].put((item, value, error))
+        
+        if number < len(self.queues):
+            self.queues[number].put(None)
+    
+    def get(self, item, stage = -1):
+        '''
+        waits until the item went through the stage (the last one by default) and returns the result of the stage, 
+        or raises the error of the stage that failed on the item
+        '''
+        position = self.positions[item]
+        with self.lock:
+            if position < self.position:
+                raise ValueError(str(item)+' was already used or skipped, the items of a Pipeline are used in the order of the list')
+            #the items skipped give their place to the next ones
+            for skipped in self.items[self.position:position]:
+                self.drop(skipped)
+                self.slots.release()
+            self.position = position+1
+        
+        self.done[stage][item].wait()
+        self.slots.release()
+        with self.lock:
+            value, error = self.results[stage][item]
+            self.drop(item)
+        if error is not None:
+            raise error
+        return value
+    
+    def drop(self, item):
+        '''
+        forgets the results of an item (call it with the lock), the stages that finish it afterwards do not keep them
+        '''
+        self.consumed.add(item)
+        for number in range(len(self.stages)):
+            if item in self.results[number]:
+                del self.results[number][item]
+                del self.done[number][item]
+    
+    def close(self):
+        '''
+        stops working on new items and waits for the items already started
+        '''
+        self.stopped = True
+        self.slots.release()
+        for thread in self.threads:
+            thread.join()
 
 def get_zvariables(name_of_cdf):
     '''
@@ -331,7 +1527,24 @@ def energy_channels(name_of_cdf):
         print('Done!')
    
                 
-def average_data(cdf_name, variable, wanted_resolution, data_resolution , particle= ''):
+def average_windows(values, av_window, dtype = None):
+    '''
+    This function is primarily meant to be used in the average functions of the software.
+    
+    It returns the averages (ignoring NaN) of the records of values in windows of av_window records, 
+    as in the other functions of the software the last record of each window is not used.
+    The output is allocated once (dtype: e.g. np.float32 for compact data, by default the dtype of the averages), 
+    instead of growing an array window by window.
+    '''
+    values = np.asarray(values)
+    starts = np.arange(0, len(values), av_window)
+    first = np.nanmean(values[0:av_window-1], axis=0)
+    means = np.empty((len(starts),) + np.shape(first), dtype = np.result_type(first) if dtype is None else dtype)
+    for i, j in enumerate(starts):
+        means[i] = np.nanmean(values[j:(j+av_window-1)], axis=0)
+    return means
+
+def average_data(cdf_name, variable, wanted_resolution, data_resolution , particle= '', compact = False):
     '''
     This function creates an averaged dataframe for a chosen variable.
     This function works for all data (Flux, Rate, Pitch Angle and RTN/HGC/HCI data)
@@ -355,31 +1568,20 @@ def average_data(cdf_name, variable, wanted_resolution, data_resolution , partic
     let1 and let2 : 'H', 'He' or 'electrons'
     het: 'H', 'He' or 'electrons'
     
+    6. compact: True to keep the averaged data as float32 (see compact_dataframe)
+    
     '''
     
     av_window = wanted_resolution/data_resolution
     av_window = int(av_window)
     data  = cdf_name.varget(variable)
-    t = cdf_name.varget('Epoch')
-    epoch = []
-    for i in t:
-        date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-        epoch.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
+    epoch = epoch_index(cdf_name)
     
    
-    av_epoch = [] 
     if av_window > 0:
-        
-        for j in np.arange(0, len(epoch), int(av_window)):
-            if j == 0: 
-                av_epoch.append(epoch[j+(int(av_window/2))])
-                av_I   = np.nanmean(data[j:(j+av_window-1)], axis=0)
-                
-            else:
-                av_epoch.append(epoch[j+(int(av_window/2))])
-                av_I    = np.row_stack((av_I, np.nanmean(data[j:(j+av_window-1)], axis=0)))
-            
-            chan_data = av_I
+        av_epoch = epoch[np.arange(0, len(epoch), av_window) + int(av_window/2)]
+        #the compact averages are written as float32 directly
+        chan_data = average_windows(data, av_window, dtype = np.float32 if compact else None)
     
     
     if variable.find('Flux')!= -1 or variable.find('Rate')!= -1 :
@@ -413,10 +1615,12 @@ def average_data(cdf_name, variable, wanted_resolution, data_resolution , partic
         df.columns = cdf_name.varget(labl)
         df['epoch'] = av_epoch
     
+    if compact:
+        df = compact_dataframe(df)
            
     return(df)
 
-def average_data_dataframe(dataframe, wanted_resolution, data_resolution):
+def average_data_dataframe(dataframe, wanted_resolution, data_resolution, compact = False):
     '''
     This function creates an averaged dataframe from a ready made dataframe.
     This function works for all kinds of dataframe, but the first column shouold be epoch.
@@ -430,6 +1634,8 @@ def average_data_dataframe(dataframe, wanted_resolution, data_resolution):
     For EPI-Hi could be 10s, 60s, 300s, 3600s or one second.
     For EPI-Lo you can use the check_resolution function to find out the resolution of the data.
     
+    4. compact: True to keep the averaged data as float32 (see compact_dataframe)
+    
     '''
     
     av_window = wanted_resolution/data_resolution
@@ -440,18 +1646,11 @@ def average_data_dataframe(dataframe, wanted_resolution, data_resolution):
     epoch = dataframe[cols[0]]
     av_epoch = [] 
     if av_window > 0:
-        for j in np.arange(0, len(epoch), int(av_window)):
-            if j == 0: 
-                av_epoch.append(epoch[j+(int(av_window/2))])
-                
-            else:
-                if av_window>(len(epoch)-j):
-                    av_epoch.append(epoch[j])
-                else:
-                    av_epoch.append(epoch[j+(int(av_window/2))])
-                    
-                
-            
+        starts = np.arange(0, len(epoch), av_window)
+        middles = starts + int(av_window/2)
+        #the last window is labelled with its first record if it is shorter than av_window
+        middles[1:] = np.where(av_window > len(epoch) - starts[1:], starts[1:], middles[1:])
+        av_epoch = epoch.values[middles]
     
     
     df = pd.DataFrame(av_epoch, columns =['epoch'])
@@ -461,17 +1660,10 @@ def average_data_dataframe(dataframe, wanted_resolution, data_resolution):
    
     if av_window > 0:
         for col in cols.drop(cols[0]):
-            coll = dataframe[col]
-            for j in np.arange(0, len(dataframe[col]), int(av_window)):
-                if j == 0: 
-                    av   = np.nanmean(coll[j:(j+av_window-1)], axis=0)
-                else:
-                    
-                    av    = np.row_stack((av, np.nanmean(coll[j:(j+av_window-1)], axis=0)))
-            
-            chan_data = av
-            df[col] = av
+            df[col] = average_windows(dataframe[col], av_window, dtype = np.float32 if compact else None)
     
+    if compact:
+        df = compact_dataframe(df)
             
     return(df)
 
@@ -494,17 +1686,581 @@ def average_list(lista, wanted_resolution, data_resolution):
     
     av_epoch = [] 
     if av_window > 0:
-        for j in np.arange(0, len(lista), int(av_window)):
-            if j == 0: 
-                av_epoch.append(lista[j+(int(av_window/2))])
-                
-            else:
-                av_epoch.append(lista[j+(int(av_window/2))])
-                    
-                
+        av_epoch = [lista[j+(int(av_window/2))] for j in range(0, len(lista), av_window)]
               
     return(av_epoch)
 
+#number of records read at a time from the one second files (one hour of data)
+RATES_CHUNK_SIZE = 3600
+
+#values below this are fill values of missing data in the cdf files
+FILL_VALUE_LIMIT = -1e30
+
+def read_chunks(cdf_name, variable, chunk_size = RATES_CHUNK_SIZE):
+    '''
+    This function reads a variable of a cdf chunk_size records at a time, so that only one chunk 
+    is in memory at a time. It is meant for the one second rate files (86400 records per day), 
+    e.g. cdf_name = cdflib.CDF(path) with path from retrieve_data(path_to_folder, date, 'epihi', rate = 'rates').
+    
+    Input variables:
+    1. cdf_name: the name given to the cdf when opened in a notebook
+    2. variable: the variable to read e.g. 'LET1_A_H_Rate'
+    3. chunk_size: number of records of each chunk
+    
+    Yields (epoch, values) for each chunk: the UTC dates (a pandas DatetimeIndex) and the values of the records.
+    '''
+    records = cdf_name.varinq('Epoch')['Last_Rec']+1
+    for start in range(0, records, chunk_size):
+        stop = min(start+chunk_size, records)-1
+        epoch = tt2000_datetimes(cdf_name.varget('Epoch', startrec = start, endrec = stop))
+        values = cdf_name.varget(variable, startrec = start, endrec = stop)
+        yield epoch, values
+
+def reduce_chunks(chunks, wanted_resolution, data_resolution = 1, min_fraction = 0.5):
+    '''
+    This function averages data read in chunks (see read_chunks) to a lower resolution while it is read, 
+    keeping only the averages, so any length of one second data can be reduced to the resolution of a plot
+    in constant memory.
+    
+    For every time bin it returns the mean, the minimum and the maximum (for plots that show the full range 
+    of the data, e.g. spikes that averaging would hide) and the number of records.
+    Fill values count as missing data. Bins with less than min_fraction of their records 
+    (data gaps, including bins with no data at all) are set to NaN, so gaps show up as gaps in plots.
+    
+    Input variables:
+    1. chunks: iterable of (epoch, values) e.g. read_chunks(cdf_name, 'LET1_A_H_Rate'), the chunks of several files can be chained
+    2. wanted_resolution: resolution of the result in seconds e.g. 60, 3600
+    3. data_resolution: resolution of the data in seconds (1 for the one second files)
+    4. min_fraction: smallest fraction of the records of a bin that must be there for the bin to have a value
+    
+    Returns a dictionary of dataframes {'mean', 'min', 'max', 'count'}, each with one column per channel 
+    and an epoch column (the centres of the bins).
+    '''
+    width = int(wanted_resolution*1e9)
+    bins, sums, counts, mins, maxs = [], [], [], [], []
+    
+    for epoch, values in chunks:
+        if len(epoch) == 0:
+            continue
+        values = np.asarray(values, dtype = float)
+        if values.ndim == 1:
+            values = values[:, None]
+        values = np.where(values <= FILL_VALUE_LIMIT, np.nan, values)
+        valid = ~np.isnan(values)
+        
+        chunk_bins = epoch.asi8//width
+        starts = np.flatnonzero(np.r_[True, np.diff(chunk_bins) != 0])
+        chunk_sums = np.add.reduceat(np.where(valid, values, 0.), starts, axis = 0)
+        chunk_counts = np.add.reduceat(valid, starts, axis = 0)
+        chunk_mins = np.fmin.reduceat(values, starts, axis = 0)
+        chunk_maxs = np.fmax.reduceat(values, starts, axis = 0)
+        chunk_bins = chunk_bins[starts]
+        
+        #the first bin of the chunk may be the last bin of the previous chunk
+        if len(bins) > 0 and bins[-1][-1] == chunk_bins[0]:
+            sums[-1][-1] += chunk_sums[0]
+            counts[-1][-1] += chunk_counts[0]
+            mins[-1][-1] = np.fmin(mins[-1][-1], chunk_mins[0])
+            maxs[-1][-1] = np.fmax(maxs[-1][-1], chunk_maxs[0])
+            chunk_bins, chunk_sums, chunk_counts = chunk_bins[1:], chunk_sums[1:], chunk_counts[1:]
+            chunk_mins, chunk_maxs = chunk_mins[1:], chunk_maxs[1:]
+            if len(chunk_bins) == 0:
+                #the whole chunk was in the last bin of the previous chunk
+                continue
+        
+        bins.append(chunk_bins)
+        sums.append(chunk_sums)
+        counts.append(chunk_counts)
+        mins.append(chunk_mins)
+        maxs.append(chunk_maxs)
+    
+    if len(bins) == 0:
+        return {stat: pd.DataFrame({'epoch': []}) for stat in ['mean', 'min', 'max', 'count']}
+    
+    bins = np.concatenate(bins)
+    counts = np.concatenate(counts)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        means = np.concatenate(sums)/counts
+    
+    #every bin between the first and the last one, the bins without data are gaps
+    grid = np.arange(bins[0], bins[-1]+1)
+    position = bins - bins[0]
+    result = {}
+    for stat, values in [('mean', means), ('min', np.concatenate(mins)), ('max', np.concatenate(maxs)), ('count', counts)]:
+        full = np.full((len(grid), values.shape[1]), np.nan if stat != 'count' else 0.)
+        full[position] = values
+        result[stat] = full
+    
+    gaps = result['count'] < min_fraction*wanted_resolution/data_resolution
+    for stat in ['mean', 'min', 'max']:
+        result[stat][gaps] = np.nan
+    
+    epoch = pd.to_datetime(grid*width + width//2)
+    for stat in result:
+        result[stat] = pd.DataFrame(result[stat])
+        result[stat]['epoch'] = epoch
+    return result
+
+def stream_rates(path_to_folder, start_date, end_date, variable, wanted_resolution, chunk_size = RATES_CHUNK_SIZE, min_fraction = 0.5):
+    '''
+    This function reduces the one second EPI-Hi rates of a date range (any length) to a lower resolution 
+    in constant memory: the files are downloaded (the next one while the current one is read) 
+    and read chunk_size records at a time (see read_chunks and reduce_chunks).
+    
+    Input variables:
+    
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    
+    2. start_date: first date in the form 'YYYYMMDD'
+    
+    3. end_date: last date in the form 'YYYYMMDD'
+    
+    4. variable: a variable of the one second files e.g. 'LET1_A_H_Rate', 'HET_B_Electrons_Rate'
+    
+    5. wanted_resolution: resolution of the result in seconds e.g. 60, 3600
+    
+    6. chunk_size: number of records read at a time
+    
+    7. min_fraction: smallest fraction of the records of a bin that must be there for the bin to have a value
+    
+    Returns a dictionary of dataframes {'mean', 'min', 'max', 'count'} (see reduce_chunks) 
+    with the energy labels of the channels as column names when the files have them.
+    '''
+    dates = [str(d.strftime('%Y%m%d')) for d in pd.date_range(start_date, end_date, freq = 'd')]
+    pipeline = Pipeline(dates, [lambda date: fetch_files(path_to_folder, [date], 'rates', products = [''])], depth = 1)
+    labels = []
+    
+    def chunks():
+        for date in dates:
+            for path in pipeline.get(date):
+                f = cdflib.CDF(path)
+                if len(labels) == 0:
+                    #e.g. LET1_H_ENERGY_LABL for LET1_A_H_Rate
+                    parts = variable.split('_')
+                    label = parts[0]+'_'+parts[2]+'_ENERGY_LABL'
+                    if label in f.cdf_info().get('zVariables'):
+                        labels.extend(str(l).strip() for l in f.varget(label))
+                for chunk in read_chunks(f, variable, chunk_size):
+                    yield chunk
+    
+    try:
+        result = reduce_chunks(chunks(), wanted_resolution, 1, min_fraction)
+    finally:
+        pipeline.close()
+    
+    for stat in result:
+        if len(labels) == result[stat].shape[1]-1:
+            result[stat].columns = labels + ['epoch']
+    return result
+
+#number of records read at a time from the EPI-Lo files (each record is a look direction x energy bin cube)
+EPILO_CHUNK_SIZE = 256
+
+def datetime_tt2000(date):
+    '''
+    This function is primarily meant to be used in other functions in the software.
+    It converts a date (e.g. '20190404', '2019-04-04 06:30' or a datetime) to an Epoch value (ns since J2000), 
+    the inverse of the conversion of tt2000_datetimes.
+    '''
+    return (pd.Timestamp(date) - pd.Timestamp('2000-01-01 12:00')).value
+
+def epilo_variables(cdf_name):
+    '''
+    This function returns the data cubes of an EPI-Lo cdf (the variables with look direction and/or energy bin 
+    dimensions) with their shape (without the records) and the variables they depend on (from the 
+    DEPEND_0, DEPEND_1 and DEPEND_2 attributes): the Epoch, the look directions and the energies.
+    
+    Input variable:
+    cdf_name: the name given to the cdf when opened in a notebook e.g. cdf_name = cdflib.CDF(r'path_to_file')
+    
+    Returns a dictionary {variable: {'shape': [...], 'DEPEND_0': ..., 'DEPEND_1': ..., 'DEPEND_2': ...}}
+    '''
+    cubes = {}
+    for variable in cdf_name.cdf_info().get('zVariables'):
+        inquiry = cdf_name.varinq(variable)
+        if not inquiry['Rec_Vary'] or inquiry['Num_Dims'] == 0 or inquiry['Data_Type_Description'] == 'CDF_CHAR':
+            continue
+        attributes = cdf_name.varattsget(variable)
+        cubes[variable] = {'shape': inquiry['Dim_Sizes']}
+        for depend in ['DEPEND_0', 'DEPEND_1', 'DEPEND_2']:
+            if depend in attributes:
+                cubes[variable][depend] = attributes[depend]
+    return cubes
+
+def epilo_chunks(cdf_name, variable, start = '', end = '', look_directions = None, energy_bins = None, 
+                 combine_directions = False, chunk_size = EPILO_CHUNK_SIZE):
+    '''
+    This function is primarily meant to be used in the epilo_dataframe function.
+    
+    It reads the records of an EPI-Lo data cube between start and end chunk_size records at a time 
+    and keeps only the chosen look directions and energy bins of each chunk, so the full cube is never in memory.
+    Fill values are set to NaN.
+    Yields (epoch, values) for each chunk, values having one column per look direction and energy bin 
+    (per energy bin if combine_directions is True: the mean over the chosen look directions).
+    '''
+    depend_0 = cdf_name.varattsget(variable).get('DEPEND_0', 'Epoch')
+    #only the Epoch is read in full, to find the records of the time range
+    t = cdf_name.varget(depend_0)
+    first, last = epoch_records(t, start, end)
+    
+    for begin in range(first, last, chunk_size):
+        stop = min(begin+chunk_size, last)
+        values = np.asarray(cdf_name.varget(variable, startrec = begin, endrec = stop-1), dtype = float)
+        if values.ndim == 2:
+            values = values[:, None, :]
+        if look_directions is not None:
+            values = values[:, look_directions, :]
+        if energy_bins is not None:
+            values = values[:, :, energy_bins]
+        values[values <= FILL_VALUE_LIMIT] = np.nan
+        if combine_directions:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category = RuntimeWarning)
+                values = np.nanmean(values, axis = 1)
+        else:
+            values = values.reshape(len(values), -1)
+        yield tt2000_datetimes(t[begin:stop]), values
+
+def epilo_dataframe(cdf_name, variable, start = '', end = '', look_directions = None, energy_bins = None, 
+                    combine_directions = False, wanted_resolution = None, data_resolution = None, chunk_size = EPILO_CHUNK_SIZE):
+    '''
+    This function creates a dataframe (epoch and one column per look direction and energy bin) 
+    of an EPI-Lo data cube, like the EPI-Hi dataframes of pa_dataframe and average_data.
+    Only the records of the time range and the chosen look directions and energy bins are kept 
+    (the file is read in chunks, see epilo_chunks), so large files can be used on any computer.
+    
+    Input variables:
+    
+    1. cdf_name: the name given to the cdf when opened in a notebook e.g. cdf_name = cdflib.CDF(r'path_to_file')
+    The file can be retrieved with retrieve_data(path_to_folder, date, 'epilo', data = 'ic') (or data = 'pe').
+    
+    2. variable: the data cube e.g. 'H_Flux_ChanP' (see epilo_variables for the cubes of a file)
+    
+    3. start, end: no input necessary. Time range to read e.g. '2019-04-04 06:00' and '2019-04-04 12:00' 
+    (end not included), the whole file by default.
+    
+    4. look_directions: no input necessary. List of the look directions (indices) to keep, all by default.
+    
+    5. energy_bins: no input necessary. List of the energy bins (indices) to keep, all by default.
+    
+    6. combine_directions: True to average the chosen look directions (one column per energy bin)
+    
+    7. wanted_resolution: no input necessary. Resolution in seconds to average the data to (e.g. 3600), 
+    the data is averaged while it is read (see reduce_chunks).
+    
+    8. data_resolution: resolution of the data in seconds, only needed with wanted_resolution 
+    (to find the bins with missing data), taken from the Epoch by default.
+    
+    9. chunk_size: number of records read at a time
+    
+    The column names are the look direction and the energy of the bin (from the DEPEND_1 and DEPEND_2 variables 
+    when they do not change with time, the indices otherwise), e.g. '12, 0.53' for look direction 12 and 0.53 MeV.
+    '''
+    attributes = cdf_name.varattsget(variable)
+    shape = cdf_name.varinq(variable)['Dim_Sizes']
+    cube = len(shape) == 2
+    
+    def axis_labels(depend, size, chosen):
+        labels = [str(i) for i in range(size)]
+        if depend in attributes and not cdf_name.varinq(attributes[depend])['Rec_Vary']:
+            values = np.atleast_1d(cdf_name.varget(attributes[depend]))
+            if len(values) == size:
+                labels = ['%.4g' % v if isinstance(v, (float, np.floating)) else str(v) for v in values]
+        return labels if chosen is None else [labels[i] for i in chosen]
+    
+    #a variable without look directions has the energies as its only dimension
+    directions = axis_labels('DEPEND_1', shape[0], look_directions) if cube else ['']
+    energies = axis_labels('DEPEND_2' if cube else 'DEPEND_1', shape[-1], energy_bins)
+    if combine_directions or not cube:
+        columns = energies
+    else:
+        columns = [d+', '+e for d in directions for e in energies]
+    
+    chunks = epilo_chunks(cdf_name, variable, start, end, look_directions, energy_bins, combine_directions, chunk_size)
+    if wanted_resolution is None:
+        parts = list(chunks)
+        if len(parts) == 0:
+            return pd.DataFrame(columns = ['epoch'] + columns)
+        data = pd.DataFrame(np.concatenate([values for epoch, values in parts]), columns = columns)
+        data.insert(0, 'epoch', np.concatenate([epoch.values for epoch, values in parts]))
+        return data
+    
+    if data_resolution is None:
+        t = cdf_name.varget(attributes.get('DEPEND_0', 'Epoch'))
+        data_resolution = float(np.median(np.diff(t)))/1e9 if len(t) > 1 else wanted_resolution
+    result = reduce_chunks(chunks, wanted_resolution, data_resolution)['mean']
+    result.columns = columns + ['epoch']
+    return result[['epoch'] + columns]
+
+def epilo_range(path_to_folder, start, end, variable, data = 'ic', look_directions = None, energy_bins = None, 
+                combine_directions = False, wanted_resolution = None):
+    '''
+    This function creates the dataframe of an EPI-Lo data cube (see epilo_dataframe) over a time range 
+    that can span several daily files. The files are downloaded if needed (the next one while the current one is read).
+    
+    Input variables:
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    2. start: start of the time range e.g. '20190404' or '2019-04-04 06:00'
+    3. end: end of the time range (not included) e.g. '20190406'
+    4. variable: the data cube e.g. 'H_Flux_ChanP'
+    5. data: 'ic' or 'pe'
+    6-9. look_directions, energy_bins, combine_directions, wanted_resolution: see epilo_dataframe
+    '''
+    dates = range_dates(start, end)
+    pipeline = Pipeline(dates, [lambda date: fetch_files(path_to_folder, [date], '', products = [data], instrument = 'epilo')], depth = 1)
+    try:
+        frames = []
+        for date in dates:
+            for path in pipeline.get(date):
+                frames.append(epilo_dataframe(cdflib.CDF(path), variable, start, end, look_directions, energy_bins, 
+                                              combine_directions, wanted_resolution))
+    finally:
+        pipeline.close()
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index = True)
+
+def compact_dataframe(dataframe):
+    '''
+    This function returns a dataframe that uses less memory, for loading many days 
+    (see the compact option of pa_dataframe, average_data and multipanel_v001):
+    the float columns as float32 (4 bytes per value instead of 8), the epoch as datetime64 (8 bytes per date) 
+    and the text columns as categorical (each label is stored once).
+    '''
+    dtypes = {}
+    for column, dtype in dataframe.dtypes.items():
+        if column == 'epoch':
+            dtypes[column] = 'datetime64[ns]'
+        elif dtype.kind == 'f':
+            dtypes[column] = np.float32
+        elif dtype == object:
+            dtypes[column] = 'category'
+    return dataframe.astype(dtypes)
+
+class LabelledArray:
+    '''
+    The data of some channels of a cdf: an epoch array (datetime64), a 2-D array of values 
+    (one row per epoch, one column per channel) and the labels of the channels.
+    It is used in place of dataframes while the data of many days is read and put together 
+    (see pa_array and multipanel_v001): the arrays of the cdf are used without copying them, 
+    a slice or a time range (between) is a view of the arrays, concat copies the data only once, 
+    and to_dataframe makes the dataframe at the end.
+    
+    Input variables:
+    1. epoch: the dates (e.g. epoch_index(cdf_name))
+    2. values: the values, one row per date (a 1-D array is one channel)
+    3. labels: the labels of the channels (the dataframe column names)
+    '''
+    __slots__ = ('epoch', 'values', 'labels')
+    
+    def __init__(self, epoch, values, labels):
+        self.epoch = np.asarray(epoch, dtype = 'datetime64[ns]')
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, None]
+        self.values = values
+        self.labels = tuple(labels)
+    
+    def __len__(self):
+        return len(self.epoch)
+    
+    def __getitem__(self, records):
+        return LabelledArray(self.epoch[records], self.values[records], self.labels)
+    
+    def between(self, start = '', end = ''):
+        '''
+        Returns the records between start and end (end not included) e.g. '2019-04-04 06:30', found with a binary search.
+        '''
+        first = 0 if start == '' else int(np.searchsorted(self.epoch, np.datetime64(pd.Timestamp(start)), side = 'left'))
+        last = len(self) if end == '' else int(np.searchsorted(self.epoch, np.datetime64(pd.Timestamp(end)), side = 'left'))
+        return self[first:max(first, last)]
+    
+    def join(self, other):
+        '''
+        Returns the channels of self and other (with the same epoch) in one LabelledArray.
+        '''
+        return LabelledArray(self.epoch, np.hstack([self.values, other.values]), self.labels + other.labels)
+    
+    def compact(self):
+        '''
+        Returns the LabelledArray with float32 values (see compact_dataframe).
+        '''
+        if self.values.dtype.kind != 'f':
+            return self
+        return LabelledArray(self.epoch, self.values.astype(np.float32, copy = False), self.labels)
+    
+    @staticmethod
+    def concat(arrays):
+        '''
+        Returns the LabelledArrays one after the other in a new LabelledArray (the data is copied once).
+        Channels missing in some of the arrays are filled with NaN (like pandas.concat).
+        '''
+        if any(array.labels != arrays[0].labels for array in arrays):
+            return LabelledArray.from_dataframe(pd.concat([array.to_dataframe() for array in arrays], sort = False))
+        return LabelledArray(np.concatenate([array.epoch for array in arrays]), 
+                             np.concatenate([array.values for array in arrays]), arrays[0].labels)
+    
+    @staticmethod
+    def from_dataframe(dataframe):
+        '''
+        Returns the LabelledArray of a dataframe with an epoch column.
+        '''
+        columns = [column for column in dataframe.columns if column != 'epoch']
+        return LabelledArray(dataframe['epoch'].values, dataframe[columns].values, columns)
+    
+    def resample(self, plot_resolution, origin = None):
+        '''
+        Returns the LabelledArray averaged to the plot resolution e.g. '10min' (NaN are ignored, empty bins are NaN), 
+        with the same bins as pandas resample (starting at midnight of the first day, labelled with their start).
+        origin: no input necessary, the start of the bins (datetime64) instead of midnight of the first day.
+        '''
+        offset = pd.tseries.frequencies.to_offset(plot_resolution)
+        if len(self) == 0 or not isinstance(offset, pd.offsets.Tick):
+            #weeks and months do not have a fixed length, use pandas
+            if len(self) == 0:
+                return self
+            return LabelledArray.from_dataframe(resample_dataframe(self.to_dataframe(), plot_resolution))
+        
+        if origin is None:
+            origin = self.epoch.min().astype('datetime64[D]').astype('datetime64[ns]')
+        origin = np.datetime64(origin, 'ns')
+        bins = (self.epoch - origin).astype(np.int64)//offset.nanos
+        first = bins.min()
+        bins = bins - first
+        size = bins.max() + 1
+        
+        means = np.empty((size, self.values.shape[1]))
+        #one channel at a time, so only one channel is copied at a time
+        for column in range(self.values.shape[1]):
+            values = np.asarray(self.values[:, column], dtype = float)
+            valid = ~np.isnan(values)
+            total = np.bincount(bins, weights = np.where(valid, values, 0), minlength = size)
+            count = np.bincount(bins, weights = valid, minlength = size)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                means[:, column] = total/count
+        
+        dtype = self.values.dtype if self.values.dtype.kind == 'f' else float
+        epoch = origin + (first + np.arange(size))*np.timedelta64(offset.nanos, 'ns')
+        return LabelledArray(epoch, means.astype(dtype), self.labels)
+    
+    def align(self, grid, tolerance):
+        '''
+        Returns the LabelledArray on the dates of grid (datetime64 array): the record nearest to each date 
+        if it is less than tolerance (a numpy or pandas timedelta) away, NaN otherwise.
+        '''
+        grid = np.asarray(grid, dtype = 'datetime64[ns]')
+        values = np.full((len(grid), self.values.shape[1]), np.nan, dtype = self.values.dtype if self.values.dtype.kind == 'f' else float)
+        if len(self) == 0:
+            return LabelledArray(grid, values, self.labels)
+        
+        after = np.clip(np.searchsorted(self.epoch, grid), 1, len(self)-1) if len(self) > 1 else np.zeros(len(grid), dtype = int)
+        before = np.maximum(after-1, 0)
+        nearest = np.where(np.abs(grid - self.epoch[before]) <= np.abs(self.epoch[after] - grid), before, after)
+        matched = np.abs(self.epoch[nearest] - grid) <= np.timedelta64(pd.Timedelta(tolerance))
+        values[matched] = self.values[nearest[matched]]
+        return LabelledArray(grid, values, self.labels)
+    
+    def integrate(self, starts, ends, cadence = None):
+        '''
+        Returns the integrals over time (in seconds) of all the channels between each start and end (datetime64 arrays), 
+        e.g. the fluences of events from the fluxes, and the fraction of each interval covered by data.
+        Each record stands for cadence seconds centered on its date (the median time between the records by default), 
+        records partly in an interval count for the part inside it and gaps (missing records, NaN or fill values) count for 0.
+        All the intervals are computed at once from the cumulative sums of the records.
+        '''
+        starts = np.asarray(starts, dtype = 'datetime64[ns]')
+        ends = np.asarray(ends, dtype = 'datetime64[ns]')
+        if len(self) == 0:
+            return np.zeros((len(starts), self.values.shape[1])), np.zeros((len(starts), self.values.shape[1]))
+        if cadence is None:
+            cadence = np.median(np.diff(self.epoch))/np.timedelta64(1, 's') if len(self) > 1 else 0
+        
+        time = (self.epoch - self.epoch[0])/np.timedelta64(1, 's')
+        valid = np.isfinite(self.values) & (self.values > FILL_VALUE_LIMIT)
+        values = np.where(valid, self.values, 0).astype(float)
+        total = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(values*cadence, axis = 0)])
+        covered = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(valid*float(cadence), axis = 0)])
+        
+        def accumulated(dates):
+            #sum of the records ended before each date and the part of the record going on at that date
+            x = (dates - self.epoch[0])/np.timedelta64(1, 's')
+            ended = np.searchsorted(time + cadence/2, x, side = 'right')
+            going_on = np.minimum(ended, len(self)-1)
+            part = np.where(ended < len(self), np.clip(x - (time[going_on] - cadence/2), 0, cadence), 0)[:, None]
+            return total[ended] + values[going_on]*part, covered[ended] + valid[going_on]*part
+        
+        integral_end, covered_end = accumulated(ends)
+        integral_start, covered_start = accumulated(starts)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            coverage = (covered_end - covered_start)/((ends - starts)/np.timedelta64(1, 's'))[:, None]
+        return integral_end - integral_start, coverage
+    
+    def to_dataframe(self, epoch = True):
+        '''
+        Returns the data as a dataframe with the epoch as first column (epoch = False for the values only).
+        '''
+        #the arrays read from a cdf are read only, the dataframe gets its own copy of them
+        values = self.values if self.values.flags.writeable else self.values.copy()
+        dataframe = pd.DataFrame(values, columns = list(self.labels))
+        if epoch:
+            dataframe.insert(0, 'epoch', self.epoch)
+        return dataframe
+
+def align_arrays(arrays, method = 'nearest', tolerance = None, resolution = None, grid = None):
+    '''
+    This function puts the series of several detectors and directions (e.g. LET1 A, LET1 B, LET2 C and HET A) 
+    on one time grid, so that they can be compared, combined (e.g. the anisotropy) or plotted together 
+    even if their records do not have the same dates. All the records are matched at once (no loop over the records).
+    
+    Input variables:
+    1. arrays: dictionary {name: LabelledArray} e.g. {'LET1': pa_array(let1, 'H', 'A'), 'LET2': pa_array(let2, 'H', 'C')}
+    
+    2. method: 'nearest' to take the record nearest to each date of the grid (NaN if there is none within tolerance)
+    or 'mean' to average all the series to the same bins of resolution (see LabelledArray.resample)
+    
+    3. tolerance: only for 'nearest', largest time between a date of the grid and the matched record 
+    e.g. '30s' or pd.Timedelta(seconds = 30), by default half the median time between the dates of the grid
+    
+    4. resolution: only for 'mean', the length of the bins e.g. '10min'
+    
+    5. grid: only for 'nearest', the dates to put the series on (datetime64 array or DatetimeIndex), 
+    by default the epoch of the first series
+    
+    Returns a dictionary {name: LabelledArray} with the same epoch for all the series.
+    '''
+    names = list(arrays)
+    if method == 'mean':
+        arrays = {name: arrays[name].resample(resolution) for name in names}
+        epochs = [arrays[name].epoch for name in names if len(arrays[name]) > 0]
+        if len(epochs) == 0:
+            return arrays
+        #all the bins have the same origin (midnight), the grid runs from the first to the last bin of all the series
+        step = np.timedelta64(pd.tseries.frequencies.to_offset(resolution).nanos, 'ns')
+        start = min(epoch[0] for epoch in epochs)
+        grid = start + np.arange(int((max(epoch[-1] for epoch in epochs) - start)//step) + 1)*step
+        tolerance = pd.Timedelta(0)
+    
+    if grid is None:
+        grid = arrays[names[0]].epoch
+    grid = np.asarray(grid, dtype = 'datetime64[ns]')
+    if tolerance is None:
+        tolerance = pd.Timedelta(np.median(np.diff(grid)))/2 if len(grid) > 1 else pd.Timedelta(0)
+    return {name: arrays[name].align(grid, tolerance) for name in names}
+
+def channel_array(cdf_name, variable, labels, channels = None):
+    '''
+    This function returns a variable of a cdf (e.g. 'A_H_Rate') with its epoch as a LabelledArray, 
+    the channels labelled with the labels variable (e.g. 'H_ENERGY_LABL') or a list of labels.
+    channels: the indices of the channels to keep e.g. [0, 3, 6] (all the channels if None).
+    '''
+    if isinstance(labels, str):
+        labels = cdf_name.varget(labels)
+    values = cdf_name.varget(variable)
+    if channels is not None:
+        values = np.asarray(values)[:, channels]
+        labels = [labels[channel] for channel in channels]
+    return LabelledArray(epoch_index(cdf_name).values, values, labels)
+
 def join_dataframes(dataframe_one, dataframe_two):
     '''
     This function is primarily meant to be in other functions in the software. 
@@ -532,7 +2288,7 @@ def join_dataframes(dataframe_one, dataframe_two):
     
     return(r)
 
-def pa_dataframe(cdf_name, particle, direction= ''):
+def pa_dataframe(cdf_name, particle, direction= '', compact = False):
     '''
     This function creates a dataframe that includes the cdf file's epoch, pitch angle and flux for a chosen direction 
     and particle. This dataframe can be used in the pa_fluxes function and is also used in the multipanel function.
@@ -553,56 +2309,60 @@ def pa_dataframe(cdf_name, particle, direction= ''):
     LET2: 'C' (no input necessary)
     
     direction A is the main look direction for both LET and HET
+    
+    4. compact: True to keep the pitch angles and fluxes as float32 (see compact_dataframe)
+    
+    The epoch column holds the dates of epoch_datetimes: each date is a datetime (a pandas Timestamp), 
+    as in the dataframe made from the list of datetimes before, in both modes.
 
     
     '''
     
-    t = cdf_name.varget('Epoch')
-    
-    time = []
-    for tt in t:
-        date_time_str = (Time(2000, format= 'jyear')+ TimeDelta(tt*u.ns)).iso
-        time.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
-       
-        
-    data = pd.DataFrame(time, columns = ['epoch'])
+    result = pa_array(cdf_name, particle, direction).to_dataframe()
+    if compact:
+        result = compact_dataframe(result)
+    return(result)
     
+def pa_array(cdf_name, particle, direction = ''):
+    '''
+    This function returns the pitch angle and the fluxes of pa_dataframe as a LabelledArray 
+    (the data is put together with the arrays of the cdf and no dataframe is made).
+    See pa_dataframe for the input variables.
+    '''
     if direction == '' or direction == 'C':
-        pa = cdf_name.varget('LET2_C_PA')
-        data['LET2_C_PA'] = pa
-    
+        pa_variable = 'LET2_C_PA'
+        direction = 'C'
+    elif any(item.find('HET')!=-1 for item in cdf_name.cdf_info().get('zVariables')):
+        pa_variable = 'HET_'+direction+'_PA'
     else:
-        info = cdf_name.cdf_info()
-        zVar = info.get('zVariables')
-
-        i = 0
-        for item in zVar:
-            if item.find('HET')!=-1:
-                i = i+1
-        if i==0:
-            pa = cdf_name.varget('LET1_'+direction+'_PA')
-            data['LET1_'+direction+'_PA'] = pa
-            
-        else:
-            pa = cdf_name.varget('HET_'+direction+'_PA')
-            data['HET_'+direction+'_PA'] = pa
-            
-            
-    if direction == '' or direction == 'C':
-        flux = cdf_name.varget('C_'+particle+'_Flux')
-        labl = cdf_name.varget(particle+'_ENERGY_LABL')
-        
-        d = pd.DataFrame(flux, columns = labl)
+        pa_variable = 'LET1_'+direction+'_PA'
     
-    else:
-        flux = cdf_name.varget(direction+'_'+particle+'_Flux')
-        labl = cdf_name.varget(particle+'_ENERGY_LABL')
-        d = pd.DataFrame(flux, columns = labl)
+    pa = channel_array(cdf_name, pa_variable, [pa_variable])
+    flux = channel_array(cdf_name, direction+'_'+particle+'_Flux', particle+'_ENERGY_LABL')
+    return pa.join(flux)
 
+def pa_range(path_to_folder, start, end, data = 'let1', particle = 'H', direction = 'A', data_resolution = 'rates60', compact = False):
+    '''
+    This function creates the dataframe of pa_dataframe (epoch, pitch angle and fluxes) over a time range 
+    with minute precision that can span several daily files, e.g. a 3 hour event over midnight.
+    Only the records of the time range are read from each file (see CDFWindow), 
+    so the time it takes depends on the length of the time range and not on the number of days.
     
-    result = pd.concat([data,d], axis = 1)
-    return(result)
-    
+    Input variables:
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    2. start: start of the time range e.g. '2019-04-04 22:30'
+    3. end: end of the time range (not included) e.g. '2019-04-05 01:30'
+    4. data: 'let1', 'let2' or 'het'
+    5. particle, direction, compact: see pa_dataframe ('C' for let2)
+    6. data_resolution: 'rates10', 'rates60' or 'rates3600'
+    '''
+    frames = []
+    for path in fetch_files(path_to_folder, range_dates(start, end), data_resolution, products = [data]):
+        frames.append(pa_dataframe(CDFWindow(open_cdf(path), start, end), particle, direction = direction, compact = compact))
+    if len(frames) == 0:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index = True)
+
 def plot(cdf_name, variable, title = '', ylabel = ''):
     '''
    This function plots the data for any chosen variable from the cdf.
@@ -754,33 +2514,18 @@ def plot_pa_flux(let1 = '', let2 = '', het = '', title = '' , e_bins = [] , want
     
     if het == '':    
         #LET 1
-        time1 = let1.varget("Epoch")
-        t1 = []
-    
-        #changing Epoch to readable UTC u.ns where ns = nanoseconds
-        for i in time1:
-            date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-            t1.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
-        
+        #changing Epoch to readable UTC (see epoch_datetimes)
+        t1 = epoch_datetimes(let1)
             
         #LET2
-    
-        time2 = let2.varget("Epoch")
-        t2 = []
-    
-        #changing Epoch to readable UTC u.ns where ns = nanoseconds
-        for i in time2:
-            date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-            t2.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))    
-            
-            
+        t2 = epoch_datetimes(let2)
             
-        LET2_C_PA = let2.varget('LET2_C_PA')
         LET1_A_PA = let1.varget('LET1_A_PA')
         LET1_B_PA = let1.varget('LET1_B_PA')
         
-        data_PA_LET2 = {'epoch' : t2, 'PA' : LET2_C_PA}
-        data_PA_LET1 = {'epoch' : t1, 'PA A' : LET1_A_PA, 'PA B' : LET1_B_PA}
+        #LET2 does not always have the same records as LET1, its pitch angle is put on the LET1 epoch (see align_arrays)
+        LET2_C_PA = align_arrays({'LET1': channel_array(let1, 'LET1_A_PA', ['PA A']), 
+                                  'LET2': channel_array(let2, 'LET2_C_PA', ['PA C'])})['LET2'].values[:, 0]
         
         pa_data = {'epoch' : t1,'PA A' : LET1_A_PA, 'PA B' : LET1_B_PA, 'PA C' : LET2_C_PA}
         
@@ -882,14 +2627,8 @@ def plot_pa_flux(let1 = '', let2 = '', het = '', title = '' , e_bins = [] , want
         
     if het != '':
         
-        time1 = het.varget("Epoch")
-        t1 = []
-    
-        #changing Epoch to readable UTC u.ns where ns = nanoseconds
-        for i in time1:
-            date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-            t1.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
-             
+        #changing Epoch to readable UTC (see epoch_datetimes)
+        t1 = epoch_datetimes(het)
             
         HET_A_PA = het.varget('HET_A_PA')
         HET_B_PA = het.varget('HET_B_PA')
@@ -981,7 +2720,309 @@ def plot_pa_flux(let1 = '', let2 = '', het = '', title = '' , e_bins = [] , want
         fig.subplots_adjust(hspace=0.05)
         
 
-def spec_plot_pa(let1 = '', let2 = '', het = '',  title='', colorbar=True, ylabel='Pitch\nAngle ('+r'$\mathregular{^\circ}$'+')', colbar_orientation='horizontal', even_limits=False, colorbar_label=True, colormap=cm.inferno):
+def line_fit(x, y, weight, axis = -1):
+    '''
+    This function is primarily meant to be used in the anisotropy and spectral_fit functions.
+    It fits straight lines y = a + b*x along axis of the arrays, all the lines at once (weighted least squares), 
+    points with weight 0 are not used. Returns a, b, the variances of a and b and their covariance 
+    (for weights 1/uncertainty**2), NaN where there are less than two different x to fit.
+    '''
+    s = weight.sum(axis = axis)
+    sx = (weight*x).sum(axis = axis)
+    sxx = (weight*x**2).sum(axis = axis)
+    sy = (weight*y).sum(axis = axis)
+    sxy = (weight*x*y).sum(axis = axis)
+    delta = s*sxx - sx**2
+    enough = ((weight > 0).sum(axis = axis) >= 2) & (delta > 1e-12*np.maximum(s, 1e-300)**2)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        a = np.where(enough, (sxx*sy - sx*sxy)/delta, np.nan)
+        b = np.where(enough, (s*sxy - sx*sy)/delta, np.nan)
+        variance_a = np.where(enough, sxx/delta, np.nan)
+        variance_b = np.where(enough, s/delta, np.nan)
+        covariance = np.where(enough, -sx/delta, np.nan)
+    return a, b, variance_a, variance_b, covariance
+
+def direction_arrays(cdf_name, detector, direction, particle = 'H'):
+    '''
+    This function is primarily meant to be used in the anisotropy function.
+    It returns the pitch angle, the fluxes and the uncertainties of the fluxes (None if the cdf has none) 
+    of one look direction as LabelledArrays, e.g. detector = 'LET1' and direction = 'A'.
+    '''
+    labels = particle+'_ENERGY_LABL'
+    pa = channel_array(cdf_name, detector+'_'+direction+'_PA', ['PA'])
+    flux = channel_array(cdf_name, direction+'_'+particle+'_Flux', labels)
+    uncertainty = None
+    if direction+'_'+particle+'_Uncertainty' in cdf_name.cdf_info().get('zVariables'):
+        uncertainty = channel_array(cdf_name, direction+'_'+particle+'_Uncertainty', labels)
+    return pa, flux, uncertainty
+
+def anisotropy_arrays(let1 = '', let2 = '', het = '', particle = 'H', tolerance = None):
+    '''
+    This function returns the anisotropy and its uncertainty (see anisotropy) as LabelledArrays.
+    For a CachedCDF (see open_cdf) the result is kept with the data of the file (of let1 for LET), 
+    so it is computed only once for a recently used file.
+    '''
+    main = het if het != '' else let1
+    key = 'Anisotropy '+particle
+    if het == '':
+        key += ' '+str(getattr(let2, 'path', id(let2)))+' '+str(tolerance)
+    if isinstance(main, CachedCDF) and key in main.data:
+        return main.data[key]
+    
+    if het != '':
+        directions = [direction_arrays(het, 'HET', 'A', particle), direction_arrays(het, 'HET', 'B', particle)]
+    else:
+        directions = [direction_arrays(let1, 'LET1', 'A', particle), direction_arrays(let1, 'LET1', 'B', particle)]
+        #LET2 does not always have the same records as LET1, LET C is put on the LET1 epoch
+        pa, flux, uncertainty = direction_arrays(let2, 'LET2', 'C', particle)
+        arrays = {'pa': pa, 'flux': flux} if uncertainty is None else {'pa': pa, 'flux': flux, 'uncertainty': uncertainty}
+        aligned = align_arrays(arrays, tolerance = tolerance, grid = directions[0][0].epoch)
+        directions.append((aligned['pa'], aligned['flux'], aligned.get('uncertainty')))
+    
+    #(time, direction, channel)
+    mu = np.stack([np.cos(np.radians(pa.values[:, 0].astype(float))) for pa, flux, uncertainty in directions], axis = 1)[:, :, None]
+    intensity = np.stack([flux.values.astype(float) for pa, flux, uncertainty in directions], axis = 1)
+    weighted = all(uncertainty is not None for pa, flux, uncertainty in directions)
+    if weighted:
+        sigma = np.stack([uncertainty.values.astype(float) for pa, flux, uncertainty in directions], axis = 1)
+        with np.errstate(divide = 'ignore'):
+            weight = 1/sigma**2
+    else:
+        weight = np.ones(intensity.shape)
+    valid = np.isfinite(intensity) & (intensity > FILL_VALUE_LIMIT) & np.isfinite(weight) & (weight > 0) & np.isfinite(mu)
+    weight = np.where(valid, weight, 0)
+    intensity = np.where(valid, intensity, 0)
+    mu = np.where(valid, mu, 0)
+    
+    a, b, variance_a, variance_b, covariance = line_fit(mu, intensity, weight, axis = 1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        values = np.where(a > 0, b/a, np.nan)
+        if weighted:
+            ratio = b/a
+            errors = 1/np.abs(a)*np.sqrt(np.maximum(variance_b + ratio**2*variance_a - 2*ratio*covariance, 0))
+            errors[~np.isfinite(values)] = np.nan
+        else:
+            errors = np.full(values.shape, np.nan)
+    
+    epoch = directions[0][1].epoch
+    labels = directions[0][1].labels
+    result = LabelledArray(epoch, values, labels), LabelledArray(epoch, errors, labels)
+    if isinstance(main, CachedCDF):
+        with main.lock:
+            main.data[key] = result
+    return result
+
+def anisotropy(let1 = '', let2 = '', het = '', particle = 'H', tolerance = None):
+    '''
+    This function computes the first order anisotropy of the particles for every energy channel and every time step at once.
+    For each time step and energy channel a straight line I = a + b*mu is fitted to the fluxes I of the look directions 
+    (LET A, B and C or HET A and B) against the cosine mu of their pitch angles, weighted by the uncertainties of the fluxes.
+    The first order anisotropy is A1 = 3*integral(mu*I)/integral(I) over mu from -1 to 1, which is A1 = b/a for the fitted line, 
+    between -1 and 1 when the fitted intensities are not negative: positive if the particles stream along the magnetic field 
+    (pitch angles below 90 degrees), negative if they stream against it, 0 if they are isotropic.
+    The uncertainty of A1 is propagated from the uncertainties of the fluxes (NaN if the cdf has no uncertainties).
+    Time steps with less than two look directions with data are NaN.
+    
+    Open the files like for plot_pa_flux e.g. let1 = open_cdf(r'C:/Users/Desktop/folder/psp_isois-epihi_l2-let1-rates60_20190404_v07.cdf')
+    
+    Input variables:
+    
+    !!! Either input both let1 and let2 or just het !!!
+    
+    1. let1: the name given to the let1 cdf when opened (directions A and B of LET)
+    
+    2. let2: the name given to the let2 cdf when opened (direction C of LET, put on the epoch of let1 see align_arrays)
+    
+    3. het: the name given to the het cdf when opened (directions A and B of HET)
+    
+    4. particle: 'H', 'He' (or 'Electrons' for HET)
+    
+    5. tolerance: only for LET, largest time between a LET1 and a LET2 record to use them together 
+    e.g. '30s', half the time between the LET1 records by default
+    
+    Returns two dataframes with the epoch and one column per energy channel: the anisotropy and its uncertainty.
+    '''
+    values, errors = anisotropy_arrays(let1, let2, het, particle, tolerance)
+    return values.to_dataframe(), errors.to_dataframe()
+
+def anisotropy_survey(path_to_folder, start_date, end_date, detector = 'het', particle = 'H', data_resolution = 'rates3600'):
+    '''
+    This function computes the anisotropy (see anisotropy) over a date range, e.g. several months for an event survey. 
+    The files are downloaded if needed (the next days while the current one is computed).
+    
+    Input variables:
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    2. start_date: first date in the form 'YYYYMMDD'
+    3. end_date: last date in the form 'YYYYMMDD'
+    4. detector: 'het' or 'let'
+    5. particle: 'H', 'He' (or 'Electrons' for HET)
+    6. data_resolution: 'rates10', 'rates60' or 'rates3600'
+    
+    Returns the anisotropy and its uncertainty as two dataframes (see anisotropy).
+    '''
+    products = ['het'] if detector == 'het' else ['let1', 'let2']
+    dates = [str(d.strftime('%Y%m%d')) for d in pd.date_range(start_date, end_date, freq = 'd')]
+    pipeline = Pipeline(dates, [lambda date: fetch_files(path_to_folder, [date], data_resolution, products = products)])
+    try:
+        values = []
+        errors = []
+        for date in dates:
+            files = {os.path.basename(path).split('-')[2]: open_cdf(path) for path in pipeline.get(date)}
+            if any(product not in files for product in products):
+                print('No '+detector.upper()+' files for '+date)
+                continue
+            if detector == 'het':
+                day = anisotropy_arrays(het = files['het'], particle = particle)
+            else:
+                day = anisotropy_arrays(let1 = files['let1'], let2 = files['let2'], particle = particle)
+            values.append(day[0])
+            errors.append(day[1])
+    finally:
+        pipeline.close()
+    
+    if len(values) == 0:
+        return pd.DataFrame(), pd.DataFrame()
+    return LabelledArray.concat(values).to_dataframe(), LabelledArray.concat(errors).to_dataframe()
+
+def plot_anisotropy(anisotropy_data, uncertainty = None, e_bins = [], title = ''):
+    '''
+    This function plots the anisotropy of anisotropy or anisotropy_survey: all the energy channels as a spectrogram 
+    (red: along the magnetic field, blue: against it) and the chosen energy channels with their uncertainty.
+    
+    Input variables:
+    1. anisotropy_data: the anisotropy dataframe
+    2. uncertainty: no input necessary, the uncertainty dataframe
+    3. e_bins: no input necessary, list of the energy channels (numbers) to plot in their own panels e.g. [0, 4]
+    4. title: title of the plot as a string
+    '''
+    labels = [column for column in anisotropy_data.columns if column != 'epoch']
+    epoch = anisotropy_data['epoch']
+    
+    fig, axarr = plt.subplots(len(e_bins)+1, figsize=[20, 5*(len(e_bins)+1)], sharex=True, squeeze=False)
+    axarr = axarr[:, 0]
+    axarr[0].set_title(title, size = 20)
+    
+    quadmesh = axarr[0].pcolormesh(epoch, np.arange(len(labels))+1, anisotropy_data[labels].values.transpose(), 
+                                   cmap = 'RdBu_r', vmin = -1, vmax = 1, shading = 'nearest')
+    axarr[0].set_yticks(np.arange(len(labels))+1)
+    axarr[0].set_yticklabels(labels)
+    colorbar = fig.colorbar(quadmesh, ax = axarr[0], pad = 0.01)
+    colorbar.set_label('A1', size = 20)
+    
+    for number, e_bin in enumerate(e_bins):
+        ax = axarr[number+1]
+        ax.plot(epoch, anisotropy_data[labels[e_bin]], color = 'black', label = labels[e_bin])
+        if uncertainty is not None:
+            ax.fill_between(epoch, anisotropy_data[labels[e_bin]] - uncertainty[labels[e_bin]], 
+                            anisotropy_data[labels[e_bin]] + uncertainty[labels[e_bin]], color = 'grey', alpha = 0.4)
+        ax.axhline(y=0, ls='-', color='black', lw = 0.5)
+        ax.set_ylim([-1.5, 1.5])
+        ax.set_ylabel('A1', size = 20)
+        ax.legend(loc = 'center left', prop = {'size':17}, bbox_to_anchor= (1, 0.5))
+    
+    axarr[-1].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
+    axarr[-1].set_xlabel('UTC', size = 20)
+    fig.subplots_adjust(hspace=0.05)
+    return fig, axarr
+
+def spectral_fit(cdf_name, particle = 'H', direction = 'A', channels = [], broken = False, reference_energy = 1):
+    '''
+    This function fits the energy spectrum of every time step with a power law I = J0*(E/reference_energy)**index, 
+    or a broken power law (two indices joined at a break energy), all the time steps at once. 
+    The fit is a weighted least squares in log space: the energy of a channel is the geometric mean of its edges 
+    (ENERGY - ENERGY_DELTAMINUS and ENERGY + ENERGY_DELTAPLUS) and the weights come from the relative uncertainties 
+    of the fluxes (all the channels have the same weight if the cdf has no uncertainties).
+    Channels without data (fill values, zero or negative fluxes) are not used, 
+    time steps with less than 3 channels with data (4 for broken) are NaN.
+    
+    Input variables:
+    1. cdf_name: the name given to the cdf when opened e.g. het = open_cdf(r'C:/Users/Desktop/folder/psp_isois-epihi_l2-het-rates10_20190404_v07.cdf')
+    (a time range of a file can be fitted with CDFWindow)
+    2. particle: 'H', 'He' or 'Electrons'
+    3. direction: 'A', 'B' (or 'C' for LET2)
+    4. channels: no input necessary, list of the energy channels (numbers) to fit e.g. [0, 1, 2, 3, 4], all by default
+    5. broken: True to fit a broken power law
+    6. reference_energy: energy in MeV at which the normalization J0 is given (power law only)
+    
+    Returns a dataframe with the epoch and for the power law the columns index, index_uncertainty, normalization, 
+    normalization_uncertainty, chi2 and channels (number of channels used), 
+    for the broken power law the columns index_low, index_high, index_low_uncertainty, index_high_uncertainty, 
+    break_energy, normalization (flux at the break energy), chi2 and channels.
+    '''
+    energy = np.atleast_2d(cdf_name.varget(particle+'_ENERGY'))[0].astype(float)
+    low = energy - np.atleast_2d(cdf_name.varget(particle+'_ENERGY_DELTAMINUS'))[0]
+    high = energy + np.atleast_2d(cdf_name.varget(particle+'_ENERGY_DELTAPLUS'))[0]
+    if len(channels) == 0:
+        channels = list(range(energy.size))
+    channels = np.asarray(channels)
+    
+    flux = channel_array(cdf_name, direction+'_'+particle+'_Flux', list(energy))
+    intensity = flux.values[:, channels].astype(float)
+    weighted = direction+'_'+particle+'_Uncertainty' in cdf_name.cdf_info().get('zVariables')
+    valid = np.isfinite(intensity) & (intensity > 0)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        y = np.where(valid, np.log10(np.where(valid, intensity, 1)), 0)
+        if weighted:
+            sigma = cdf_name.varget(direction+'_'+particle+'_Uncertainty')[:, channels].astype(float)
+            #uncertainty of log10(I) is sigma/(I*ln(10))
+            weight = (intensity*np.log(10)/sigma)**2
+            valid &= np.isfinite(weight) & (weight > 0)
+        else:
+            weight = np.ones(intensity.shape)
+    weight = np.where(valid, weight, 0)
+    y = np.where(valid, y, 0)
+    x = np.log10(np.sqrt(low*high))[channels]
+    used = valid.sum(axis = 1)
+    
+    result = pd.DataFrame({'epoch': flux.epoch})
+    if not broken:
+        x = x - np.log10(reference_energy)
+        a, b, variance_a, variance_b, covariance = line_fit(x[None, :], y, weight, axis = 1)
+        fitted = (used >= 3) & np.isfinite(b)
+        residual = y - (a[:, None] + b[:, None]*x[None, :])
+        result['index'] = np.where(fitted, b, np.nan)
+        result['index_uncertainty'] = np.where(fitted & weighted, np.sqrt(variance_b), np.nan)
+        result['normalization'] = np.where(fitted, 10**a, np.nan)
+        result['normalization_uncertainty'] = np.where(fitted & weighted, 10**a*np.log(10)*np.sqrt(variance_a), np.nan)
+        result['chi2'] = np.where(fitted, (weight*np.nan_to_num(residual)**2).sum(axis = 1), np.nan)
+        result['channels'] = used
+        return result
+    
+    #the break is tried at every edge between two channels with at least two channels on each side, 
+    #for each candidate log10(I) = a + b_low*min(x - x_break, 0) + b_high*max(x - x_break, 0) is linear in (a, b_low, b_high)
+    order = np.argsort(x)
+    edges = np.log10(high[channels][order])[1:-2]
+    best = np.full(intensity.shape[0], np.inf)
+    parameters = np.full((intensity.shape[0], 3), np.nan)
+    errors = np.full((intensity.shape[0], 3), np.nan)
+    breaks = np.full(intensity.shape[0], np.nan)
+    for edge in edges:
+        design = np.stack([np.ones(x.size), np.minimum(x - edge, 0), np.maximum(x - edge, 0)], axis = 1)
+        normal = (weight @ (design[:, :, None]*design[:, None, :]).reshape(x.size, 9)).reshape(-1, 3, 3)
+        right = (weight*y) @ design
+        sides = ((weight > 0) & (x < edge)[None, :]).sum(axis = 1), ((weight > 0) & (x > edge)[None, :]).sum(axis = 1)
+        solvable = (sides[0] >= 2) & (sides[1] >= 2) & (np.abs(np.linalg.det(normal)) > 1e-12)
+        normal[~solvable] = np.eye(3)
+        inverse = np.linalg.inv(normal)
+        fit = np.einsum('tij,tj->ti', inverse, right)
+        chi2 = (weight*(y - fit @ design.T)**2).sum(axis = 1)
+        better = solvable & (chi2 < best)
+        best[better] = chi2[better]
+        parameters[better] = fit[better]
+        errors[better] = np.sqrt(np.maximum(np.diagonal(inverse, axis1 = 1, axis2 = 2)[better], 0))
+        breaks[better] = edge
+    
+    result['index_low'] = parameters[:, 1]
+    result['index_high'] = parameters[:, 2]
+    result['index_low_uncertainty'] = errors[:, 1] if weighted else np.nan
+    result['index_high_uncertainty'] = errors[:, 2] if weighted else np.nan
+    result['break_energy'] = 10**breaks
+    result['normalization'] = 10**parameters[:, 0]
+    result['chi2'] = np.where(np.isfinite(best), best, np.nan)
+    result['channels'] = used
+    return result
+
+def spec_plot_pa(let1 = '', let2 = '', het = '',  title='', colorbar=True, ylabel='Pitch\nAngle ('+r'$\mathregular{^\circ}$'+')', colbar_orientation='horizontal', even_limits=False, colorbar_label=True, colormap='inferno'):
     '''
     
     This function creates a spectrogram of the flux for each pitch angle of either LET or HET.
@@ -1037,7 +3078,7 @@ def spec_plot_pa(let1 = '', let2 = '', het = '',  title='', colorbar=True, ylabe
     
     9. colorbar_label: True if you want to label the colorbar or False 
     
-    10. colormap: can be any of the matplotlib colormaps e.g. cm.inferno, cm.jet 
+    10. colormap: can be any of the matplotlib colormaps or their names e.g. 'inferno', cm.jet 
         link: https://matplotlib.org/stable/tutorials/colors/colormaps.html
     
 
@@ -1288,7 +3329,7 @@ def spec_plot_pa(let1 = '', let2 = '', het = '',  title='', colorbar=True, ylabe
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%Y \n %H:%M:%S'))
 
 
-def spec_plot(fig, ax, epoch, energy_channels, intensity, ylabel = '', title='', colorbar=True, colbar_orientation='vertical', even_limits=False, colorbar_label=True, colormap=cm.inferno):
+def spec_plot(fig, ax, epoch, energy_channels, intensity, ylabel = '', title='', colorbar=True, colbar_orientation='vertical', even_limits=False, colorbar_label=True, colormap='inferno'):
     '''
     This function creates a spectrogram of the flux or rate for each energy channel. 
     This function is primarily used in the multipanel plot function, but can be called from another plotting function.
@@ -1326,7 +3367,7 @@ def spec_plot(fig, ax, epoch, energy_channels, intensity, ylabel = '', title='',
     
     9. colorbar_label: True if you want to label the colorbar or False 
     
-    10. colormap: can be any of the matplotlib colormaps e.g. cm.inferno, cm.jet 
+    10. colormap: can be any of the matplotlib colormaps or their names e.g. 'inferno', cm.jet 
         link: https://matplotlib.org/stable/tutorials/colors/colormaps.html
     
     
@@ -1355,7 +3396,7 @@ def spec_plot(fig, ax, epoch, energy_channels, intensity, ylabel = '', title='',
         X = epoch
         Y = np.arange(len(energy_channels))+1  #energy channels
         norm = colors.LogNorm(vmin=hmin, vmax=hmax)
-        quadmesh = ax.pcolormesh(X, Y, intensity.transpose(), norm=norm, cmap=cmap, vmin= hmin, vmax= hmax )
+        quadmesh = ax.pcolormesh(X, Y, intensity.transpose(), norm=norm, cmap=cmap)
         quadmesh2 = ax.pcolormesh(X, Y, hist_0.transpose(),  cmap=cm.gray, vmin= 0, vmax= 0 )
         
         
@@ -1389,70 +3430,546 @@ def spec_plot(fig, ax, epoch, energy_channels, intensity, ylabel = '', title='',
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%Y \n %H:%M:%S'))
 
 
-def multipanel_v001( path_to_folder, date, days, data_resolution = 'auto', plot_resolution = 'original'):
+def peak_rss():
+    '''
+    This function returns the peak resident set size (the largest amount of RAM the process has used so far) in bytes.
+    It returns 0 if the operating system does not provide it (Windows).
+    '''
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return peak
+    return peak*1024
 
+def memory_checkpoint(report, stage):
     '''
-    This function creates a multipanel plot that includes:
-    1. Proton flux direction A (LET)
-    2. Proton flux direction A (HET)
-    3. Count rate of protons for LET as a spectrogram
-    4. Count rate of protons for HET as a spectrogram
-    5. Count rate of electrons for LET as a spectrogram
-    6. Count rate of electrons for HET as a spectrogram
-    7. Electron count rate direction A LET
-    8. Electron count rate direction A HET
-    9. Proton Flux 1.2-1.4 MeV directions A,B,C (LET)
-    10. Pitch Angle LET directions A,B,C
-    11. Proton Flux 11.3-13.5 MeV directions A and B (HET)
-    12. Pitch Angle directions A and B (HET)
+    This function is primarily meant to be used in other functions in the software (e.g. multipanel_v001).
+    
+    It adds the memory accounting of a stage to a report (a list) and starts the accounting of the next stage.
+    The stage is the work done since the previous checkpoint.
+    
+    For each stage the report contains:
+    current_MB: the memory allocated by python at the end of the stage (tracemalloc)
+    peak_MB: the largest memory allocated by python during the stage (tracemalloc)
+    peak_rss_MB: the peak resident set size of the process so far (includes the memory used outside python
+    e.g. by the plotting backend)
     
+    tracemalloc must be running (tracemalloc.start()) for current_MB and peak_MB to be measured.
     
     Input variables:
+    1. report: list to which the stage is appended
     
-    1. path_to_folder: Choose a folder in your computer where you want to save the data.
-    The data will be automatically saved in the chosen folder as a cdf file. 
-    The files will be named with the exact name they have in the database.
-    Path exemple: 'C:/Users/Desktop/folder'
-    Use r before the quotation marks if using the back slash in the path name. 
-    This cancels out any special python characters.
-    Or use  / as in the example instead.
+    2. stage: name of the stage as a string
+    '''
+    current = 0
+    peak = 0
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+    
+    report.append({'stage': stage, 'current_MB': current/1e6, 'peak_MB': peak/1e6, 'peak_rss_MB': peak_rss()/1e6})
+    return report
+
+def print_memory_report(report):
+    '''
+    This function prints a memory report created with memory_checkpoint as a table.
+    '''
+    print('%-28s %12s %12s %14s' % ('stage', 'current MB', 'peak MB', 'peak RSS MB'))
+    for stage in report:
+        print('%-28s %12.1f %12.1f %14.1f' % (stage['stage'], stage['current_MB'], stage['peak_MB'], stage['peak_rss_MB']))
+
+def memory_size(size):
+    '''
+    This function converts a memory size to bytes.
+    The size can be a number of bytes or a string like '500MB', '2GB' or '2.5 GB'.
+    '''
+    if isinstance(size, str):
+        size = size.strip().upper().replace(' ', '')
+        units = {'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12, 'B': 1}
+        for unit in units:
+            if size.endswith(unit):
+                return float(size[:len(size)-len(unit)])*units[unit]
+        return float(size)
+    return float(size)
+
+#approximate memory (bytes) multipanel_v001 needs per loaded record (all ten dataframes with their
+#epoch columns and the concat copies) and per plotted record (lines, the spectrogram copies and meshes),
+#measured with memory_report on 1-3 days of 10s and 60s data
+MULTIPANEL_BYTES_PER_RECORD = 2000
+MULTIPANEL_BYTES_PER_PLOTTED_RECORD = 10000
+#bytes per pixel of the rendered figure (RGBA canvas and the copies made when saving it)
+MULTIPANEL_BYTES_PER_PIXEL = 8
+#memory used by python and the imported modules before any data is loaded
+MULTIPANEL_BASE_BYTES = 200e6
+
+def estimate_multipanel_memory(days, data_resolution, plot_resolution = 'original', aggregate_on_load = False, dpi = 300, panels = 12):
+    '''
+    This function estimates the peak memory (in bytes) multipanel_v001 needs for a given number of days,
+    data resolution and plot resolution.
     
-    2. date: Input the date you wish to plot as a string in the form: 'YYYYMMDD'
+    Input variables:
+    1. days: number of consecutive days
     
-    3. days: Number of consecutive days you wish to plot
+    2. data_resolution: 'rates10', 'rates60' or 'rates3600'
     
-    4. data_resolution:  No input is necessary.
-    For EPI-Hi there are three possible choices of resolution: 10 seconds, 60 seconds and 3600 seconds.
-    The input should be one of the following strings: 'rates10', 'rates60' or 'rates3600'
+    3. plot_resolution: 'original' or a resolution string like '10min' (see multipanel_v001)
     
-    'rates10': If the 10s resolution is not available, the function will automatically download 60s resolution files. 
-    If this is not available either, 3600s data will be downloaded.
-    'rates60': If the 60s resolution is not available, the function will automatically download 10s resolution files. 
-    If this is not available either, 3600s data will be downloaded.
-    'rates3600': If the 3600s resolution is not available, the function will automatically download 60s resolution files. 
-    If this is not available either, 10s data will be downloaded.
+    4. aggregate_on_load: True if each day is averaged to the plot resolution as soon as it is loaded 
+    (then only one day at full resolution is kept in memory)
+    
+    5. dpi: resolution of the saved figure
+    
+    6. panels: number of panels of the plot (see MULTIPANEL_PANELS), the data and the figure 
+    are taken to grow with the number of panels
+    '''
+    cadence = int(data_resolution[5:])
+    records = days*86400/cadence
+    
+    plotted = records
+    if plot_resolution != 'original':
+        plotted = min(records, days*86400/resolution_seconds(plot_resolution))
+    
+    loaded = records
+    if aggregate_on_load:
+        loaded = 86400/cadence + plotted
+    
+    share = panels/len(MULTIPANEL_PANELS)
+    canvas = 35*MULTIPANEL_PANEL_HEIGHT*panels*dpi*dpi*MULTIPANEL_BYTES_PER_PIXEL
+    return MULTIPANEL_BASE_BYTES + share*(loaded*MULTIPANEL_BYTES_PER_RECORD + plotted*MULTIPANEL_BYTES_PER_PLOTTED_RECORD) + canvas
 
-    If there is no inpu,t depending on the number of consecutive days you choose to plot,
-    the function will automatically choose the most appropriate resolution. 
-    For 1-3 days it will be 60 seconds. If however the 60 second data is not available, 
-    the function will download 10 second data and if this is not available it will download 3600 second data.
-    For 4+ days it will be 3600 seconds. If however the 3600 second data is not available, 
-    the function will download 60 second data and if this is not available it will download 10 second data.
+def budget_resolution(days, data_resolution, plot_resolution, memory_budget, dpi = 300, panels = 12):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
     
+    It chooses how to load the data so that a multipanel plot stays under a memory budget. 
+    The options are tried in this order:
+    1. the chosen data and plot resolution
+    2. averaging each day to the plot resolution as soon as it is loaded (aggregated loading)
+    3. a coarser data resolution (rates10 -> rates60 -> rates3600)
+    4. a coarser plot resolution with aggregated loading
     
+    Input variables:
+    1. days: number of consecutive days
     
-    5. plot_resolution: no input is necessary. You can also choose to average the data of the plot.
-     For example: 'S', '30S', 'min', '10min', 'H', '3H','d', '3d', 'W' 
-     keywords: 
-     seconds: 'S'
-     minutes: 'min'
-     hours: 'H'
-     days: 'd'
-     weeks: 'W'
+    2. data_resolution: 'rates10', 'rates60' or 'rates3600'
+    
+    3. plot_resolution: 'original' or a resolution string like '10min' (see multipanel_v001)
+    
+    4. memory_budget: the memory budget in bytes or as a string e.g. '2GB'
+    
+    5. dpi: resolution of the saved figure
+    
+    6. panels: number of panels of the plot (see estimate_multipanel_memory)
+    
+    Returns data_resolution, plot_resolution and aggregate_on_load (True or False).
+    '''
+    budget = memory_size(memory_budget)
+    
+    if estimate_multipanel_memory(days, data_resolution, plot_resolution, False, dpi, panels) <= budget:
+        return data_resolution, plot_resolution, False
+    
+    if plot_resolution != 'original':
+        if estimate_multipanel_memory(days, data_resolution, plot_resolution, True, dpi, panels) <= budget:
+            print('Memory budget: each day is averaged to '+plot_resolution+' as soon as it is loaded.')
+            return data_resolution, plot_resolution, True
+    
+    rates = ['rates10', 'rates60', 'rates3600']
+    for rate in rates[rates.index(data_resolution)+1:]:
+        for aggregate_on_load in [False, True]:
+            if aggregate_on_load and plot_resolution == 'original':
+                continue
+            if estimate_multipanel_memory(days, rate, plot_resolution, aggregate_on_load, dpi, panels) <= budget:
+                print('Memory budget: the data resolution '+rate+' is used instead of '+data_resolution+'.')
+                return rate, plot_resolution, aggregate_on_load
+    
+    for resolution in ['10min', 'H', '3H', '6H', 'd']:
+        if estimate_multipanel_memory(days, 'rates3600', resolution, True, dpi, panels) <= budget:
+            print('Memory budget: the data resolution rates3600 is used and the plot is averaged to '+resolution+'.')
+            return 'rates3600', resolution, True
+    
+    print('The memory budget is too small for this plot, the coarsest resolution is used.')
+    return 'rates3600', 'd', True
+
+def resolution_seconds(plot_resolution):
+    '''
+    This function returns the length in seconds of a plot resolution string like '30S', '10min', 'H' or 'W'.
+    '''
+    offset = pd.tseries.frequencies.to_offset(plot_resolution)
+    try:
+        return pd.Timedelta(offset).total_seconds()
+    except ValueError:
+        # weeks or months are not fixed frequencies, use their length from a Sunday
+        start = pd.Timestamp('2000-01-02')
+        return (start + offset - start).total_seconds()
 
+def resample_day(array, plot_resolution, pending = None, origin = None):
     '''
+    This function is primarily meant to be used in the multipanel_v001 function (loading with a memory budget).
     
-    if plot_resolution!= 'original':
+    It averages one day of data (a LabelledArray) to the plot resolution as soon as it is loaded, 
+    with the same bins as when all the days are averaged at once: the bins start at origin for all the days 
+    and the records of the last bin of the day are not averaged yet, they are given back to be averaged 
+    with the next day (pending), so no bin is averaged in two parts.
+    
+    Input variables:
+    1. array: the LabelledArray of the day
+    2. plot_resolution: a fixed length e.g. '10min', '7H' (see LabelledArray.resample)
+    3. pending: the records given back with the previous day (None for the first day)
+    4. origin: the start of the bins given back with the previous day (None for the first day: midnight of the first record)
+    
+    Returns the averaged bins, the records of the last bin (pending) and the origin. 
+    Average the pending records of the last day with LabelledArray.resample(plot_resolution, origin).
+    '''
+    if pending is not None and len(pending) > 0:
+        array = LabelledArray.concat([pending, array])
+    if len(array) == 0:
+        return array, pending, origin
+    if origin is None:
+        origin = array.epoch.min().astype('datetime64[D]').astype('datetime64[ns]')
+    size = np.timedelta64(pd.tseries.frequencies.to_offset(plot_resolution).nanos, 'ns')
+    last_bin = origin + ((array.epoch.max() - origin)//size)*size
+    cut = int(np.searchsorted(array.epoch, last_bin, side = 'left'))
+    return array[:cut].resample(plot_resolution, origin), array[cut:], origin
+
+def resample_dataframe(dataframe, plot_resolution):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    
+    It averages a dataframe with an epoch column to the plot resolution (e.g. '10min', see multipanel_v001)
+    and returns it with the epoch as a column again.
+    '''
+    dataframe = dataframe.resample(plot_resolution, on='epoch').mean()
+    dataframe.reset_index(inplace=True)
+    return dataframe
+
+#height in inches of one panel of multipanel_v001
+MULTIPANEL_PANEL_HEIGHT = 45/12
+
+#the panels of multipanel_v001 from top to bottom. Each panel is a dictionary with the keys:
+#type: 'flux' (fluxes of some energy channels), 'spectrogram' (count rates of the energy channels), 
+#'rate' (count rates of some energy channels), 'directions' (fluxes of some channels in several directions) 
+#or 'pa' (pitch angles of several directions)
+#detector: 'let' or 'het' (LET direction C is in the let2 files, directions A and B in the let1 files)
+#direction: 'A', 'B' or 'C', several directions for 'directions' and 'pa' e.g. ['A', 'B', 'C'] or 'ABC'
+#particle: 'H', 'He' or 'Electrons' ('H' if not given)
+#channels: the indices of the energy channels, a list e.g. [0, 3, 6] or a slice e.g. slice(0, None, 3) (all the channels if not given)
+#ylabel: label of the panel ('{channel}' is replaced by the label of the channel), made from the other keys if not given
+MULTIPANEL_PANELS = [
+    {'type': 'flux', 'detector': 'let', 'direction': 'A', 'particle': 'H', 'channels': slice(0, None, 3),
+     'ylabel': 'Proton \n Flux \n LET \n direction A \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$'},
+    {'type': 'flux', 'detector': 'het', 'direction': 'A', 'particle': 'H', 'channels': slice(0, None, 3),
+     'ylabel': 'Proton \n Flux \n HET \n direction A \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$'},
+    {'type': 'spectrogram', 'detector': 'let', 'direction': 'A', 'particle': 'H', 'ylabel': 'Proton \n energy \n LET \n direction A'},
+    {'type': 'spectrogram', 'detector': 'het', 'direction': 'A', 'particle': 'H', 'ylabel': 'Proton \n energy \n HET \n direction A'},
+    {'type': 'spectrogram', 'detector': 'let', 'direction': 'A', 'particle': 'Electrons', 'ylabel': 'Electrons \n energy \n LET \n direction A'},
+    {'type': 'spectrogram', 'detector': 'het', 'direction': 'A', 'particle': 'Electrons', 'ylabel': 'Electrons \n energy \n HET \n direction A'},
+    {'type': 'rate', 'detector': 'let', 'direction': 'A', 'particle': 'Electrons', 'channels': slice(2, None, 2),
+     'ylabel': 'Electron \n count rate \n LET \n direction A '},
+    {'type': 'rate', 'detector': 'het', 'direction': 'A', 'particle': 'Electrons', 'channels': slice(2, None, 3),
+     'ylabel': 'Electron \n count rate \n HET \n direction A '},
+    {'type': 'directions', 'detector': 'let', 'direction': ['A', 'B', 'C'], 'particle': 'H', 'channels': [3],
+     'ylabel': 'Proton \n Flux{channel}\n LET \n directions \n A, B, C  \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$'},
+    {'type': 'pa', 'detector': 'let', 'direction': ['A', 'B', 'C']},
+    {'type': 'directions', 'detector': 'het', 'direction': ['A', 'B'], 'particle': 'H', 'channels': [3],
+     'ylabel': 'Proton \n  Flux{channel}\n HET \n directions \n A and B \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$'},
+    {'type': 'pa', 'detector': 'het', 'direction': ['A', 'B']},
+]
+
+PANEL_TYPES = ['flux', 'spectrogram', 'rate', 'directions', 'pa']
+DIRECTION_COLORS = {'A': 'red', 'B': 'blue', 'C': 'green'}
+PARTICLE_NAMES = {'H': 'Proton', 'He': 'Helium', 'Electrons': 'Electron'}
+
+def multipanel_panels(panels = None):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    It returns the list of panels (see MULTIPANEL_PANELS) of a panel specification: 
+    None for all the panels of MULTIPANEL_PANELS, or a list of panels and/or indices of panels of MULTIPANEL_PANELS 
+    e.g. [2, 3, {'type': 'pa', 'detector': 'het', 'direction': 'AB'}].
+    '''
+    if panels is None:
+        return list(MULTIPANEL_PANELS)
+    result = []
+    for panel in panels:
+        if not isinstance(panel, dict):
+            panel = MULTIPANEL_PANELS[int(panel)]
+        if panel.get('type') not in PANEL_TYPES:
+            raise ValueError('Unknown panel type '+str(panel.get('type'))+', the types are '+', '.join(PANEL_TYPES))
+        result.append(panel)
+    if len(result) == 0:
+        raise ValueError('The plot needs at least one panel')
+    return result
+
+def panel_product(detector, direction):
+    '''
+    This function returns the EPI-Hi file ('let1', 'let2' or 'het') with the data of a detector ('let' or 'het') in a direction.
+    '''
+    if detector.lower().startswith('het'):
+        return 'het'
+    if direction == 'C':
+        return 'let2'
+    return 'let1'
+
+def panel_series(panel):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    It returns the data a panel (see MULTIPANEL_PANELS) needs, one entry per direction: 
+    (file, variable, labels) with the file ('let1', 'let2' or 'het'), the variable of the cdf 
+    and the variable with the labels of its channels (None for the pitch angles).
+    '''
+    particle = panel.get('particle', 'H')
+    series = []
+    for direction in list(panel.get('direction', 'A')):
+        product = panel_product(panel['detector'], direction)
+        if panel['type'] == 'pa':
+            series.append((product, product.upper()+'_'+direction+'_PA', None))
+        elif panel['type'] in ['flux', 'directions']:
+            series.append((product, direction+'_'+particle+'_Flux', particle+'_ENERGY_LABL'))
+        else:
+            series.append((product, direction+'_'+particle+'_Rate', particle+'_ENERGY_LABL'))
+    return series
+
+def panel_products(panels = None):
+    '''
+    This function returns the EPI-Hi files ('let1', 'let2' and/or 'het') the panels of multipanel_v001 need (see multipanel_panels).
+    '''
+    products = set(series[0] for panel in multipanel_panels(panels) for series in panel_series(panel))
+    return [product for product in ['let1', 'let2', 'het'] if product in products]
+
+def panel_channels(channels, count):
+    '''
+    This function returns the indices of the channels of a panel (see MULTIPANEL_PANELS) for a variable with count channels: 
+    channels can be None (all the channels), an index, a list of indices or a slice.
+    '''
+    if channels is None:
+        return list(range(count))
+    if isinstance(channels, slice):
+        return list(range(count)[channels])
+    if not isinstance(channels, (list, tuple)):
+        channels = [channels]
+    return [range(count)[int(channel)] for channel in channels]
+
+def panel_ylabel(panel, channel = ''):
+    '''
+    This function returns the label of a panel of multipanel_v001 (see MULTIPANEL_PANELS), 
+    channel is the label of the energy channel of the panel (if it has only one).
+    '''
+    if 'ylabel' in panel:
+        return panel['ylabel'].replace('{channel}', channel)
+    detector = panel['detector'].upper()[:3]
+    directions = list(panel.get('direction', 'A'))
+    particle = panel.get('particle', 'H')
+    name = PARTICLE_NAMES.get(particle, particle)
+    units = 'cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV'+('' if particle == 'Electrons' else '/nuc')+')$^{-1}$'
+    if panel['type'] == 'flux':
+        return name+' \n Flux \n '+detector+' \n direction '+directions[0]+' \n '+units
+    if panel['type'] == 'spectrogram':
+        return name+' \n energy \n '+detector+' \n direction '+directions[0]
+    if panel['type'] == 'rate':
+        return name+' \n count rate \n '+detector+' \n direction '+directions[0]
+    if panel['type'] == 'directions':
+        return name+' \n Flux '+channel+'\n '+detector+' \n directions \n '+', '.join(directions)+' \n '+units
+    return detector+' \n Pitch Angle \n $\\mathregular{^{\\circ}}$'
+
+def mask_gaps(epoch, dataframe, max_gap = 7200):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    It sets the values of the record before each gap of more than max_gap seconds to NaN (in place), 
+    so that the lines of the plot are not drawn across the gaps.
+    '''
+    gaps = np.diff(np.asarray(epoch, dtype = 'datetime64[ns]')) > np.timedelta64(max_gap, 's')
+    #the gap before the last record is not checked (as in the loops used before)
+    records = np.flatnonzero(gaps[:-1])
+    if len(records) > 0:
+        dataframe.iloc[records, :] = np.nan
+    return dataframe
+
+def plot_panel(fig, ax, panel, data, columns, energies = None):
+    '''
+    This function is primarily meant to be used in the multipanel_v001 function.
+    It plots a panel (see MULTIPANEL_PANELS) on ax.
+    
+    Input variables:
+    1. fig, ax: the figure and the axes of the panel
+    2. panel: the panel
+    3. data: (epoch, dataframe) of each entry of panel_series(panel)
+    4. columns: the labels of the channels to plot for each entry of panel_series(panel)
+    5. energies: the energy channels of a spectrogram
+    '''
+    directions = list(panel.get('direction', 'A'))
+    ylabel = panel_ylabel(panel, columns[0][0] if len(columns[0]) == 1 else '')
+    
+    if panel['type'] == 'spectrogram':
+        epoch, dataframe = data[0]
+        if list(dataframe.columns) != list(columns[0]):
+            dataframe = dataframe[columns[0]]
+        spec_plot(fig, ax, epoch, energies, dataframe, ylabel = ylabel)
+        return
+    
+    if panel['type'] in ['flux', 'rate']:
+        epoch, dataframe = data[0]
+        for column in columns[0]:
+            ax.plot(epoch, dataframe[column], label = column)
+        ax.set_yscale('log')
+        ax.legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5), ncol=2 )
+    
+    if panel['type'] == 'directions':
+        for direction, (epoch, dataframe), labels in zip(directions, data, columns):
+            for column in labels:
+                ax.plot(epoch, dataframe[column], label = column+' direction '+direction, color = DIRECTION_COLORS.get(direction))
+        ax.set_yscale('log')
+        ax.legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
+    
+    if panel['type'] == 'pa':
+        for direction, (epoch, dataframe), series in zip(directions, data, panel_series(panel)):
+            ax.plot(epoch, dataframe[series[1]], label = series[0].upper()+' '+direction+' PA', color = DIRECTION_COLORS.get(direction))
+        ax.set_ylim([0, 180])
+        ax.yaxis.set_ticks(np.arange(0, 180+45, 45))
+        ax.axhline(y=45, ls='-', color='black')
+        ax.axhline(y=90, ls='-', color='black')
+        ax.axhline(y=135, ls='-', color='black')
+        ax.legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
+    
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
+    ax.set_ylabel(ylabel, size = 30)
+
+def multipanel_v001( path_to_folder, date, days, data_resolution = 'auto', plot_resolution = 'original', memory_budget = None, memory_report = False, output_file = '', dpi = 300, time_range = None, compact = False, panels = None):
+
+    '''
+    This function creates a multipanel plot that includes by default:
+    1. Proton flux direction A (LET)
+    2. Proton flux direction A (HET)
+    3. Count rate of protons for LET as a spectrogram
+    4. Count rate of protons for HET as a spectrogram
+    5. Count rate of electrons for LET as a spectrogram
+    6. Count rate of electrons for HET as a spectrogram
+    7. Electron count rate direction A LET
+    8. Electron count rate direction A HET
+    9. Proton Flux 1.2-1.4 MeV directions A,B,C (LET)
+    10. Pitch Angle LET directions A,B,C
+    11. Proton Flux 11.3-13.5 MeV directions A and B (HET)
+    12. Pitch Angle directions A and B (HET)
+    
+    Other panels can be chosen with panels, only the files, variables and channels of the chosen panels 
+    are read, averaged and plotted.
+    
+    The files of the next days are downloaded and read in the background while the current day is checked (see Pipeline).
+    
+    Input variables:
+    
+    1. path_to_folder: Choose a folder in your computer where you want to save the data.
+    The data will be automatically saved in the chosen folder as a cdf file. 
+    The files will be named with the exact name they have in the database.
+    Path exemple: 'C:/Users/Desktop/folder'
+    Use r before the quotation marks if using the back slash in the path name. 
+    This cancels out any special python characters.
+    Or use  / as in the example instead.
+    
+    2. date: Input the date you wish to plot as a string in the form: 'YYYYMMDD'
+    
+    3. days: Number of consecutive days you wish to plot
+    
+    4. data_resolution:  No input is necessary.
+    For EPI-Hi there are three possible choices of resolution: 10 seconds, 60 seconds and 3600 seconds.
+    The input should be one of the following strings: 'rates10', 'rates60' or 'rates3600'
+    
+    'rates10': If the 10s resolution is not available, the function will automatically download 60s resolution files. 
+    If this is not available either, 3600s data will be downloaded.
+    'rates60': If the 60s resolution is not available, the function will automatically download 10s resolution files. 
+    If this is not available either, 3600s data will be downloaded.
+    'rates3600': If the 3600s resolution is not available, the function will automatically download 60s resolution files. 
+    If this is not available either, 10s data will be downloaded.
+
+    'summary': a quicklook of the ISOIS summary files (a lot less data to download for long time ranges, see quicklook).
+    If the summary cadence is too coarse for the time range, the EPI-Hi data is plotted.
+
+    If there is no input, the function will automatically choose the most appropriate resolution 
+    from the number of pixel columns of the plot (the dpi) and the number of days: the coarsest resolution 
+    that still gives about one data point per pixel column (see pixel_resolution). 
+    E.g. at 300 dpi: 10 seconds for 1-2 days, 60 seconds for 3-169 days and 3600 seconds for longer time ranges.
+    If no plot_resolution is chosen and the data has a lot more points than pixel columns, 
+    the plot is averaged to about one point per pixel column.
+    The fallback resolutions are the same as for the chosen resolutions above.
+    
+    
+    
+    5. plot_resolution: no input is necessary. You can also choose to average the data of the plot.
+     For example: 'S', '30S', 'min', '10min', 'H', '3H','d', '3d', 'W' 
+     keywords: 
+     seconds: 'S'
+     minutes: 'min'
+     hours: 'H'
+     days: 'd'
+     weeks: 'W'
+     
+    6. memory_budget: no input is necessary. The largest amount of memory the function should use,
+    in bytes or as a string e.g. '2GB'. If the chosen resolutions would need more memory than the budget, 
+    the function averages each day to the plot resolution as soon as it is loaded, 
+    uses a coarser data resolution or a coarser plot resolution (in this order) so that the run stays under the budget.
+    
+    7. memory_report: True if you want the memory used by each stage of the function 
+    (download, files check, dataframes, averaging, gap masking, plot, save) to be printed and returned.
+    The memory is measured with tracemalloc and the peak RSS of the process (see memory_checkpoint).
+    
+    8. output_file: no input is necessary. By default the plot is saved as path_to_folder/date.png.
+    Otherwise the path of the file (the extension chooses the format e.g. '.png' or '.pdf')
+    or a list of paths to save the plot in several files. It can also be an opened file e.g. io.BytesIO() (saved as png).
+    
+    9. dpi: resolution of the saved plot, 300 by default. A list of resolutions (one for each output file) can be given.
+    
+    10. time_range: no input is necessary. (start, end) to plot only a part of the days e.g. 
+    ('2019-04-04 22:30', '2019-04-05 01:30'), only the records of the time range are read (see CDFWindow). 
+    The days must cover the time range, see multipanel_range.
+    
+    11. compact: True to keep the data of each day as float32 as soon as it is loaded (see compact_dataframe), 
+    about half the memory of the data for long time ranges.
+    
+    12. panels: no input is necessary (the 12 panels above). The panels to plot from top to bottom: 
+    a list of panels (dictionaries with the type, detector, direction, particle and channels of the panel, see MULTIPANEL_PANELS) 
+    and/or numbers of the panels above (0 for the first one) e.g. 
+    [2, 3, {'type': 'flux', 'detector': 'het', 'direction': 'B', 'particle': 'He', 'channels': [0, 2, 4]}]
+    The panels are not used for data_resolution = 'summary'.
+
+    '''
+    
+    if data_resolution == 'summary':
+        return quicklook(path_to_folder, date, days, plot_resolution = plot_resolution, output_file = output_file, dpi = dpi)
+    
+    panels = multipanel_panels(panels)
+    
+    outputs = output_file
+    if isinstance(outputs, str) and outputs == '':
+        outputs = path_to_folder+r"/"+date+".png"
+    if not isinstance(outputs, list):
+        outputs = [outputs]
+    dpis = dpi
+    if not isinstance(dpis, list):
+        dpis = [dpi]*len(outputs)
+    #the cdf files are kept in the shared data store if one is used (see use_data_store)
+    path_to_folder = data_folder(path_to_folder, 'epihi')
+    
+    report = []
+    started_tracing = False
+    if memory_report:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        memory_checkpoint(report, 'start')
+    
+    #length of the plotted time in days
+    span = days
+    if time_range is not None:
+        span = (pd.Timestamp(time_range[1]) - pd.Timestamp(time_range[0]))/pd.Timedelta(days = 1)
+    
+    if data_resolution == 'auto':
+        data_resolution, plot_resolution = pixel_resolution(span, max(dpis), plot_resolution)
+    
+    aggregate_on_load = False
+    if memory_budget is not None:
+        data_resolution, plot_resolution, aggregate_on_load = budget_resolution(span, data_resolution, plot_resolution, memory_budget, max(dpis), len(panels))
+    
+    if plot_resolution!= 'original':
         last_l = plot_resolution[-1]
         if last_l == 'S':
             if len(plot_resolution) == 1:
@@ -1483,20 +4000,33 @@ def multipanel_v001( path_to_folder, date, days, data_resolution = 'auto', plot_
         
         
     
-    url = "http://spp-isois.sr.unh.edu/data_public/EPIHi/level2/"
-    page = requests.get(url)    
-    dat = page.text
-    a = dat.find('.cdf')
-    b = a-10
-    c = dat[b:a].find('_')
-    version = dat[b+c+1:a]
-    
     dates = []
     dt = parse(date)
     
     for i in range(days): 
         dates.append(str(dt.strftime('%Y%m%d')) )
         dt += pd.Timedelta(days=1)
+    
+    def open_window(path):
+        #only the records of the time range are read
+        if time_range is None:
+            return open_cdf(path)
+        return CDFWindow(open_cdf(path), time_range[0], time_range[1])
+    
+    #records of the last bin of the previous day of each series and start of the bins, see resample_day
+    pending = {}
+    bins = {'origin': None}
+    
+    def prepare(array, item):
+        #as soon as a day is loaded: float32 values (compact) and averaging to the plot resolution (memory budget)
+        if compact:
+            array = array.compact()
+        if aggregate_on_load and plot_resolution != 'original':
+            if not isinstance(pd.tseries.frequencies.to_offset(plot_resolution), pd.offsets.Tick):
+                #weeks and months: calendar bins, averaged again when the days are put together
+                return array.resample(plot_resolution)
+            array, pending[item], bins['origin'] = resample_day(array, plot_resolution, pending.get(item), bins['origin'])
+        return array
         
         
     rates = ['rates10', 'rates60','rates3600']
@@ -1517,248 +4047,41 @@ def multipanel_v001( path_to_folder, date, days, data_resolution = 'auto', plot_
                 downloaded_resolution = 'rates3600'
                 rates_loop = ['rates60','rates10']
                 
-    instruments =  ['let1','let2','het']
-    
-    files_let1 = []    
-    files_let2 = []
-    files_het = []
-    
-
-        
-        
-    
-    for j in dates:
-        if data_resolution!='auto':
-        
-            retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = data_resolution)
-            retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = data_resolution)
-            retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = data_resolution)
-            
-#             Checking data availability for let1
-            if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')
-            elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-            
-                downloaded_resolution = rates_loop[0]
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[0])
-                
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                    files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                    print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[1]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[1])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                        files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                    
-                      
-                
-#             Check data availability for let2
-            if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')
-            
-            elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                downloaded_resolution = rates_loop[0]
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[0])
-                
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                    files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                    print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[1]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[1])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                        files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                    
-                    
-                    
-#             Check data availability for het
-            if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')
-            
-            elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                downloaded_resolution = rates_loop[0]
-                retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[0])
-                
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                    files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                    print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[1]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[1])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                        files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                    
-                    
-        if data_resolution == 'auto':
-            
-            if days in range(1,4):
-                rates_loop = ['rates10','rates3600']
-                
-                data_resolution = 'rates60'
-                downloaded_resolution = 'rates60'
-                
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = data_resolution)
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = data_resolution)
-                retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = data_resolution)
-            
-#             Checking data availability for let1
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                        
-                    
-    #             Check data availability for let2
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                        
-                        
-    #             Check data availability for het
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                       
-                
-                
-            
-            if days >=4:
-                rates_loop = ['rates60','rates10']
-                
-                data_resolution = 'rates3600'
-                downloaded_resolution = 'rates3600'
-                
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = data_resolution)
-                retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = data_resolution)
-                retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = data_resolution)
-            
-#             Checking data availability for let1
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'let1', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_let1.append(path_to_folder+'\psp_isois-epihi_l2-let1-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                        
-                    
-    #             Check data availability for let2
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'let2', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_let2.append(path_to_folder+'\psp_isois-epihi_l2-let2-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                        
-                        
-    #             Check data availability for het
-                if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf'):
-                    files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')
-                
-                elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+data_resolution+'_'+j+'_'+version+'.cdf')== False:
-                    downloaded_resolution = rates_loop[0]
-                    retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[0])
-                    
-                    if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf'):
-                        files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')
-                        print('The chosen data resolution is not available, the file for '+rates_loop[0]+'was downloaded instead.')
-                    
-                    elif os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[0]+'_'+j+'_'+version+'.cdf')== False:
-                        downloaded_resolution = rates_loop[1]
-                        retrieve_data(path_to_folder, j, 'epihi', data = 'het', rate = rates_loop[1])
-                        
-                        if os.path.exists(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf'):
-                            files_het.append(path_to_folder+'\psp_isois-epihi_l2-het-'+rates_loop[1]+'_'+j+'_'+version+'.cdf')
-                            print('The chosen data resolution is not available, the file for '+rates_loop[1]+'was downloaded instead.')
-                        
-                       
-            
-    if len(files_let1) == 0:
+    #only the files of the panels are downloaded and read (see panel_products)
+    products = panel_products(panels)
+    files = {product: [] for product in products}
+    
+    #the variables the panels need, with the Epoch and the labels and energies of their channels
+    variables = ['Epoch']
+    for panel in panels:
+        for product, variable, labels in panel_series(panel):
+            variables += [variable] if labels is None else [variable, labels, panel.get('particle', 'H')+'_ENERGY']
+    
+    #download, check (and decode) the next days in the background while the current day is used,
+    #the lower resolutions are downloaded if the chosen one is not available
+    stages = [lambda j: fetch_files(path_to_folder, [j], data_resolution, products = products, fallback_rates = rates_loop)]
+    if len(products)*days <= CDF_CACHE_SIZE:
+        #only decode ahead if all the files stay in CDF_CACHE until they are used
+        stages.append(lambda paths: decode_files(paths, variables))
+    pipeline = Pipeline(dates, stages)
+    downloaded_resolution = data_resolution
+    try:
+        for j in dates:
+            for path in pipeline.get(j, stage = 0):
+                product, rate = file_request(path)[2:]
+                files[product].append(path)
+                if rate != data_resolution:
+                    downloaded_resolution = rate
+    finally:
+        pipeline.close()
+    
+    if memory_report:
+        memory_checkpoint(report, 'download')
+        
+    if any(len(files[product]) == 0 for product in products):
         print('No files were found for the chosen dates. There must be a datagap in the database.')
         
-    elif len(files_let1)!=0:
+    else:
         
         if plot_resolution!= 'original':
             
@@ -1767,606 +4090,1271 @@ def multipanel_v001( path_to_folder, date, days, data_resolution = 'auto', plot_
             if downloaded_resolution == 'rates3600' and multiply<3600:
                 plot_resolution = 'original'
                 
-             
-        #check if files are empty
-        for file in files_let1:
-            f = cdflib.CDF(file)
-            zVar = f.cdf_info().get('zVariables')
-            if len(zVar) ==0:
-                print('The file '+file+'is empty!')
-                files_let1.remove(file)
-                
-        for file in files_let2:
+        #the files were checked when they were fetched, the bad files were downloaded again (see verify_files)
+        if memory_report:
+            memory_checkpoint(report, 'files check')
+        
+        #the data of each day is kept as LabelledArrays (the arrays of the cdf, no dataframes), 
+        #the days are put together once at the end and the dataframes of the plots are made from the result
+        first = {product: open_window(files[product][0]) for product in products}
+        
+        #each variable is read once for all the panels that use it (see panel_series), 
+        #with only the channels the panels plot
+        series = []
+        for panel in panels:
+            series += [item for item in panel_series(panel) if item not in series]
+        labels = {item: [item[1]] if item[2] is None else list(first[item[0]].varget(item[2])) for item in series}
+        
+        needed = {item: set() for item in series}
+        columns = []
+        energies = []
+        for panel in panels:
+            panel_columns = []
+            for item in panel_series(panel):
+                channels = panel_channels(None if item[2] is None else panel.get('channels'), len(labels[item]))
+                needed[item].update(channels)
+                panel_columns.append([labels[item][channel] for channel in channels])
+            columns.append(panel_columns)
             
-            f = cdflib.CDF(file)
-            zVar = f.cdf_info().get('zVariables')
-            if len(zVar) ==0:
-                print('The file '+file+'is empty!')
-                files_let2.remove(file)
-    
-        for file in files_het:
-            f = cdflib.CDF(file)
-            zVar = f.cdf_info().get('zVariables')
-            if len(zVar) ==0:
-                print('The file '+file+'is empty!')
-                files_het.remove(file)
-    
+            #for spec plot
+            if panel['type'] == 'spectrogram':
+                item = panel_series(panel)[0]
+                energy_channels = first[item[0]].varget(panel.get('particle', 'H')+'_ENERGY')
+                energies.append(np.asarray(energy_channels)[panel_channels(panel.get('channels'), len(labels[item]))])
+            else:
+                energies.append(None)
         
-        #start with making dataframe of the first day and if days>1 then loop through files and add data to dataframes the average
-        #epoch is the same and precise to ns so can theoretically use any epoch
-        let1 =  cdflib.CDF(files_let1[0])
+        channels = {item: None if len(needed[item]) == len(labels[item]) else sorted(needed[item]) for item in series}
+        data = {item: [] for item in series}
         
-        let2 =  cdflib.CDF(files_let2[0])
-        het  =  cdflib.CDF(files_het[0])
+        #compact and/or average each day to the plot resolution before adding the next days (see prepare)
+        for product in products:
+            for i in files[product]:
+                next_day = open_window(i)
+                for item in series:
+                    if item[0] == product:
+                        data[item].append(prepare(channel_array(next_day, item[1], labels[item] if item[2] is None else item[2], channels[item]), item))
         
+        for item in series:
+            if pending.get(item) is not None and len(pending[item]) > 0:
+                data[item].append(pending[item].resample(plot_resolution, bins['origin']))
+            data[item] = LabelledArray.concat(data[item])
         
-        let_A_data = pa_dataframe(let1, 'H', direction= 'A')
-        let_B_data = pa_dataframe(let1, 'H', direction= 'B')
-        let_C_data = pa_dataframe(let2, 'H', direction= 'C')
+        if memory_report:
+            memory_checkpoint(report, 'dataframes')
         
-        het_A_data = pa_dataframe(het, 'H', direction= 'A')
-        het_B_data = pa_dataframe(het, 'H', direction= 'B')
+        #the days averaged on load are already on the bins of the whole time range (see resample_day)
+        if plot_resolution != 'original' and len(pending) == 0:
+            for item in series:
+                data[item] = data[item].resample(plot_resolution)
         
-        let_epoch = let1.varget('Epoch')
-        rate_epoch = het.varget('Epoch')
-        t2 = []
-        t1 = []
+        #the epochs are kept apart from the data
+        for item in series:
+            data[item] = (pd.Series(data[item].epoch, name = 'epoch'), data[item].to_dataframe(epoch = False))
         
+        if memory_report:
+            memory_checkpoint(report, 'averaging')
         
-    #changing Epoch to readable UTC u.ns where ns = nanoseconds
-        for i in rate_epoch:
-            date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-            t1.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
-    
-        rate_ep = pd.DataFrame(t1, columns = ['epoch'])
+        if len(dates) ==1:
+            dtt = parse(date)
         
-        for i in let_epoch:
-            date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-            t2.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
-    
-        let_ep = pd.DataFrame(t2, columns = ['epoch'])
+            t_date = str(dtt.strftime('%d.%m.%Y')) 
+          
+            plot_title = 'PSP ISOIS '+t_date
+        if len(dates) > 1:
+            dtt = parse(dates[0])
+            dtto = parse(dates[-1])
         
+            t_date = str(dtt.strftime('%d.%m.%Y')) 
+            to_date = str(dtto.strftime('%d.%m.%Y')) 
+          
+            plot_title = 'PSP ISOIS '+t_date+'-'+to_date
+        if time_range is not None:
+            plot_title = 'PSP ISOIS '+pd.Timestamp(time_range[0]).strftime('%d.%m.%Y %H:%M')+'-'+pd.Timestamp(time_range[1]).strftime('%d.%m.%Y %H:%M')
         
-        r_hetA_e = het.varget("A_Electrons_Rate")
-        r_hetB_e = het.varget("B_Electrons_Rate")
+        #no lines across the gaps of more than 2 hours
+        for item in series:
+            mask_gaps(*data[item])
         
-        labl = het.varget('Electrons_ENERGY_LABL')
+        if memory_report:
+            memory_checkpoint(report, 'gap masking')
     
-        rate_hetA_e = pd.DataFrame(r_hetA_e, columns = labl)
-        rate_hetB_e = pd.DataFrame(r_hetB_e, columns = labl)
-        
-        concat_rateA = [rate_ep, rate_hetA_e]
-        concat_rateB = [rate_ep, rate_hetB_e]
-        
-        rate_hetA_e = pd.concat(concat_rateA, axis = 1)
-        rate_hetB_e = pd.concat(concat_rateB, axis = 1)
-        
-        
-        #for spec plot
-        #already have the het electron rate
-        letA_H_energy_channels = let1.varget('H_ENERGY')
-        letA_e_energy_channels = let1.varget('Electrons_ENERGY')
-        
-        hetA_H_energy_channels = het.varget('H_ENERGY')
-        hetA_e_energy_channels = het.varget('Electrons_ENERGY')
-        
-        labl_het_H = het.varget('H_ENERGY_LABL')
-        labl_let_H = let1.varget('H_ENERGY_LABL')
-        
-        letA_H_intensity = pd.DataFrame(let1.varget('A_H_Rate'), columns = labl_let_H)
-        hetA_H_intensity = pd.DataFrame(het.varget('A_H_Rate'), columns = labl_het_H)
-        
-        concat_letA = [let_ep, letA_H_intensity]
-        concat_hetA = [rate_ep, hetA_H_intensity]
-        
-        letA_H_intensity = pd.concat(concat_letA, axis = 1)
-        hetA_H_intensity = pd.concat(concat_hetA, axis = 1)
-       
+        fig, axarr = plt.subplots(len(panels), figsize=[35, MULTIPANEL_PANEL_HEIGHT*len(panels)], sharex=True, squeeze=False)
+        axarr = axarr[:, 0]
+        axarr[0].set_title(plot_title, size = 40) 
         
-    #     with the new version also LET has electron data
+        for number, panel in enumerate(panels):
+            plot_panel(fig, axarr[number], panel, [data[item] for item in panel_series(panel)], columns[number], energies[number])
     
-        letA_e_energy_channels = let1.varget('Electrons_ENERGY')
-        
-        labl_let_e = let1.varget('Electrons_ENERGY_LABL')
-        
-        rate_letA_e = pd.DataFrame(let1.varget('A_Electrons_Rate'), columns = labl_let_e)
-        
-        concat_letA_e = [let_ep, rate_letA_e]
+        for number in range(0,len(panels)-1):
+            axarr[number].get_xaxis().set_visible(False)
+         
+        axarr[-1].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S\n %d-%m-%y'))
+                  
+        plt.rc('xtick', labelsize = 25)
+        plt.rc('ytick', labelsize = 25)
         
-        rate_letA_e = pd.concat(concat_letA_e, axis = 1)
+        axarr[-1].set_xlabel('UTC', size = 30) 
+        fig.subplots_adjust(hspace=0.05)
         
+        time_list = data[series[0]][0].tolist()
         
+        for number in range(0,len(panels)):
+            axarr[number].set_xlim([time_list[0],time_list[len(time_list)-1]])
     
-        # make loop that opens files and adds them to general dataframe for let1, let2 and het.
-        # can start with first day and then loop through files and append data to the dataframe
-        # average data daily
-        
-        if days >1:
-            #add data to df
-            for i in files_let1[1:]:
-                     
-                    
-                let1_next =  cdflib.CDF(i)
-                
-                labl_let_H_next = let1_next.varget('H_ENERGY_LABL')
-                let_Are = let1_next.varget("A_Electrons_Rate")
-                
-                
+        if memory_report:
+            memory_checkpoint(report, 'plot')
+    
+        for output, output_dpi in zip(outputs, dpis):
+            plt.savefig(output ,dpi=(output_dpi), bbox_inches = 'tight')
         
-                let1_A_d = pa_dataframe(let1_next, 'H', direction= 'A')
-                let1_B_d = pa_dataframe(let1_next, 'H', direction= 'B')
-                
+        if memory_report:
+            memory_checkpoint(report, 'save')
     
-                
-                frames_let_A = [let_A_data, let1_A_d]
-                frames_let_B = [let_B_data, let1_B_d]
-                
-                
-                let_A_data = pd.concat(frames_let_A, sort=False)
-                let_B_data = pd.concat(frames_let_B, sort=False)
-                
-    #             frames for spec
+    if memory_report:
+        print_memory_report(report)
+        if started_tracing:
+            tracemalloc.stop()
+        return report
+   
+def multipanel_range(path_to_folder, start, end, data_resolution = 'auto', plot_resolution = 'original', memory_budget = None, output_file = '', dpi = 300, compact = False, panels = None):
+    '''
+    This function creates the multipanel plot of multipanel_v001 for a time range with minute precision 
+    e.g. a 3 hour event over midnight. The daily files that cover the time range are downloaded and 
+    only the records of the time range are read from them, so short time ranges are plotted quickly.
     
-                let_epoch = let1_next.varget('Epoch')
-                t2 = []
+    Input variables:
+    1. path_to_folder: see multipanel_v001
+    2. start: start of the time range e.g. '2019-04-04 22:30'
+    3. end: end of the time range (not included) e.g. '2019-04-05 01:30'
+    4. data_resolution, plot_resolution, memory_budget, dpi, compact, panels: see multipanel_v001 
+    (the automatic resolution is chosen from the length of the time range)
+    5. output_file: no input is necessary. By default the plot is saved as path_to_folder/YYYYMMDD_HHMM-YYYYMMDD_HHMM.png
+    '''
+    dates = range_dates(start, end)
+    if output_file == '':
+        output_file = path_to_folder+r"/"+pd.Timestamp(start).strftime('%Y%m%d_%H%M')+'-'+pd.Timestamp(end).strftime('%Y%m%d_%H%M')+'.png'
+    return multipanel_v001(path_to_folder, dates[0], len(dates), data_resolution = data_resolution, plot_resolution = plot_resolution, 
+                           memory_budget = memory_budget, output_file = output_file, dpi = dpi, time_range = (start, end), compact = compact, panels = panels)
+
+def loop_plot(path_to_folder, start_date, end_date, frequency, memory_budget = None, panels = None):
     
-            #changing Epoch to readable UTC u.ns where ns = nanoseconds
-                for i in let_epoch:
-                    date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-                    t2.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
+    '''
+    This function plots and saves in loop of n days the plots between the start and end date (+n days, if the data is available). 
+    The function uses directly the multipanel function's default inputs for data resolution.
+    The files of the next plot are downloaded and read in the background while the current plot is made.
     
-                let_ep = pd.DataFrame(t2, columns = ['epoch'])
-     
-        
-                letA_H_intensity_next = pd.DataFrame(let1_next.varget('A_H_Rate'), columns = labl_let_H_next)
-                
-                concat_let_next = [let_ep, letA_H_intensity_next]
-                
-                letA_H_intensity_next = pd.concat(concat_let_next, axis = 1)
-        
-                frame_let_AH = [letA_H_intensity, letA_H_intensity_next]
-            
-                letA_H_intensity = pd.concat(frame_let_AH, sort=False)
-                
-                
-    #           electron data for let
-                labl_let_e_next = let1_next.varget('Electrons_ENERGY_LABL')
-                
-                rate_letA_e_next = pd.DataFrame(let_Are, columns = labl_let_e_next)
-                
-                concat_rateA_let = [let_ep, rate_letA_e_next]
-                
-                rate_letA_e_next = pd.concat(concat_rateA_let, axis = 1)
-                
-                
-                frames_eRate_A_let = [rate_letA_e, rate_letA_e_next]
-                
-                
-                rate_letA_e = pd.concat(frames_eRate_A_let, sort=False)
-                
-                    
-           
+    Input parameters:
+    
+    1. path_to_folder: Choose a folder in your computer where you want to save the data.
+    The data will be automatically saved in the chosen folder as a cdf file. 
+    The files will be named with the exact name they have in the database.
+    Path exemple: 'C:/Users/Desktop/folder'
+    Use r before the quotation marks if using the back slash in the path name. 
+    This cancels out any special python characters.
+    Or use  / as in the example instead.
+    
+    2. start_date: date from which to plot in the form 'YYYYMMDD'
+    
+    3. end_date: date untill which to plot in the form 'YYYYMMDD'
+    
+    4. frequency: number of days each plot should contain. The input should be an integer.
+    
+    5. memory_budget: no input is necessary. The largest amount of memory each plot should use, 
+    in bytes or as a string e.g. '2GB' (see multipanel_v001).
+    
+    6. panels: no input is necessary. The panels of the plots (see multipanel_v001).
+    
+    '''
+    
+    if frequency == 1:
+        f = 'd'
+    elif frequency>1:
+        f = str(frequency)+'d'
+    
+    plot_days = pd.date_range(start_date,end_date,freq=f)
+    days = []
+    for i in plot_days:
+        days.append(str(i.strftime('%Y%m%d')))
           
-            for i in files_let2[1:]:
-                     
-                
-                let2_next =  cdflib.CDF(i)
-                
-                let2_C_d = pa_dataframe(let2_next, 'H', direction= 'C')
+    #load the next window in the background while the current one is plotted, 
+    #with the data resolution multipanel_v001 chooses (from the same plot resolution)
+    data_resolution, plot_resolution = pixel_resolution(frequency)
+    if memory_budget is not None:
+        data_resolution = budget_resolution(frequency, data_resolution, plot_resolution, memory_budget, panels = len(multipanel_panels(panels)))[0]
+    products = panel_products(panels)
+    window_dates = lambda date: [str(d.strftime('%Y%m%d')) for d in pd.date_range(date, periods = frequency, freq = 'd')]
+    stages = [lambda date: fetch_files(path_to_folder, window_dates(date), data_resolution, products = products)]
+    if 2*len(products)*frequency <= CDF_CACHE_SIZE:
+        #only decode ahead if the files of the current and the next window fit in CDF_CACHE
+        stages.append(decode_files)
+    pipeline = Pipeline(days, stages, depth = 1)
+    try:
+        for date in days:
+            pipeline.get(date)
+            multipanel_v001( path_to_folder, date, frequency, memory_budget = memory_budget, panels = panels )
+            #the figures are saved, close them so they do not pile up in memory over the loop
+            plt.close('all')
+    finally:
+        pipeline.close()
+
+#number of points across the width of a quicklook plot: the summary files are used 
+#as long as their cadence gives at least this many points for the plotted time range
+QUICKLOOK_POINTS = 1000
+
+def summary_dataframes(path_to_folder, dates, variables = None):
+    '''
+    This function is primarily meant to be used in the quicklook function.
     
-                
-                frames_let_C = [let_C_data, let2_C_d]
-                  
-            
-                let_C_data = pd.concat(frames_let_C, sort=False)
-                
-                
-                
-            for i in files_het[1:]:
-                     
-                het_next  =  cdflib.CDF(i)
-            
-                het_A_d = pa_dataframe(het_next, 'H', direction= 'A')
-                het_B_d = pa_dataframe(het_next, 'H', direction= 'B')
-                 
-                het_Are = het_next.varget("A_Electrons_Rate")
-                het_Bre = het_next.varget("B_Electrons_Rate")
-        
-        
-                rate_epoch = het_next.varget('Epoch')
-                t1 = []
+    It loads the time series of the ISOIS summary files of the dates (downloading them if needed, 
+    the next one while the current one is read) and returns one dataframe per variable 
+    (epoch and one column per channel, labelled with the LABL_PTR_1 labels of the variable if it has them).
     
-            #changing Epoch to readable UTC u.ns where ns = nanoseconds
-                for i in rate_epoch:
-                    date_time_str = (Time(2000, format='jyear') + TimeDelta(i*u.ns)).iso
-                    t1.append(datetime.strptime(date_time_str, '%Y-%m-%d %H:%M:%S.%f'))
+    Input variables:
+    1. path_to_folder: folder of the cdf files
+    2. dates: list of dates in the form 'YYYYMMDD'
+    3. variables: list of the variables to load, all the time series of the files by default
+    '''
+    pipeline = Pipeline(dates, [lambda date: fetch_files(path_to_folder, [date], '', products = [''], instrument = 'isois')], depth = 1)
+    try:
+        frames = OrderedDict()
+        for date in dates:
+            for path in pipeline.get(date):
+                f = cdflib.CDF(path)
+                epoch = tt2000_datetimes(f.varget('Epoch'))
+                names = variables
+                if names is None:
+                    names = [v for v in f.cdf_info().get('zVariables') if f.varinq(v)['Rec_Vary'] and v != 'Epoch' 
+                             and f.varinq(v)['Data_Type_Description'] != 'CDF_CHAR' and f.varattsget(v).get('DEPEND_0') == 'Epoch']
+                for variable in names:
+                    values = np.asarray(f.varget(variable), dtype = float)
+                    values[values <= FILL_VALUE_LIMIT] = np.nan
+                    attributes = f.varattsget(variable)
+                    if values.ndim == 1:
+                        columns = [variable]
+                    elif 'LABL_PTR_1' in attributes:
+                        columns = [str(l).strip() for l in f.varget(attributes['LABL_PTR_1'])]
+                    else:
+                        columns = [str(i) for i in range(values.shape[1])]
+                    frame = pd.DataFrame(values.reshape(len(values), -1), columns = columns)
+                    frame.insert(0, 'epoch', epoch)
+                    frames.setdefault(variable, []).append(frame)
+    finally:
+        pipeline.close()
+    return OrderedDict((variable, pd.concat(parts, ignore_index = True)) for variable, parts in frames.items())
+
+def quicklook(path_to_folder, date, days, variables = None, plot_resolution = 'original', output_file = '', dpi = 100):
+    '''
+    This function creates an overview plot of long time ranges (weeks to years) from the ISOIS summary files only, 
+    which are a lot smaller than the EPI-Hi LET1, LET2 and HET files: one panel per summary time series 
+    (spectrograms for the spectra, lines for the single rates).
     
-                rate_ep = pd.DataFrame(t1, columns = ['epoch'])
-     
-                labl_next = het_next.varget('Electrons_ENERGY_LABL')
-                labl_het_H_next = het_next.varget('H_ENERGY_LABL')
-        
-        
-                rate_hetA_next = pd.DataFrame(het_Are, columns = labl_next)
-                rate_hetB_next = pd.DataFrame(het_Bre, columns = labl_next)
-                
-                
-                concat_rateA = [rate_ep, rate_hetA_next]
-                concat_rateB = [rate_ep, rate_hetB_next]
-        
-                rate_hetA_next = pd.concat(concat_rateA, axis = 1)
-                rate_hetB_next = pd.concat(concat_rateB, axis = 1)
-        
-                
-                frames_het_A = [het_A_data, het_A_d]
-                frames_het_B = [het_B_data, het_B_d]
-                
-                frames_eRate_A = [rate_hetA_e, rate_hetA_next]
-                frames_eRate_B = [rate_hetB_e, rate_hetB_next]
-                
-                
-                het_A_data = pd.concat(frames_het_A, sort=False)
-                het_B_data = pd.concat(frames_het_B, sort=False)
-                
-                rate_hetA_e = pd.concat(frames_eRate_A, sort=False)
-                rate_hetB_e = pd.concat(frames_eRate_B, sort=False)
-        
-                #             frames for spec
+    If the time range is so short (or plot_resolution so fine) that the summary cadence is too coarse for the plot,
+    the function makes the full multipanel_v001 plot from the EPI-Hi files instead.
+    The function is also used by multipanel_v001 with data_resolution = 'summary'.
     
-                hetA_H_intensity_next = pd.DataFrame(het_next.varget('A_H_Rate'), columns = labl_het_H_next)
-                
-                concat_het_next = [rate_ep, hetA_H_intensity_next]
-                
-                hetA_H_intensity_next = pd.concat(concat_het_next, axis = 1)
-        
-                frame_het_AH = [hetA_H_intensity, hetA_H_intensity_next]
-            
-                hetA_H_intensity = pd.concat(frame_het_AH, sort=False)
+    Input variables:
     
-     
-        
-        let_A_data.reset_index(drop=True, inplace=True)
-        let_B_data.reset_index(drop=True, inplace=True)
-        let_C_data.reset_index(drop=True, inplace=True)
-        
-        het_A_data.reset_index(drop=True, inplace=True)
-        het_B_data.reset_index(drop=True, inplace=True)
-        
-        rate_hetA_e.reset_index(drop=True, inplace=True)
-        rate_hetB_e.reset_index(drop=True, inplace=True)
-        
-        letA_H_intensity.reset_index(drop=True, inplace=True) 
-        hetA_H_intensity.reset_index(drop=True, inplace=True)
-        
-        rate_letA_e.reset_index(drop=True, inplace=True)
-        
-        
-        
-        
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    
+    2. date: first date in the form 'YYYYMMDD'
+    
+    3. days: number of consecutive days
+    
+    4. variables: no input necessary. List of the summary variables to plot, all the time series by default.
+    
+    5. plot_resolution: no input necessary. Resolution to average the data to e.g. '6H', 'd' (see multipanel_v001).
+    
+    6. output_file: no input necessary. By default the plot is saved as path_to_folder/date_quicklook.png (see multipanel_v001).
+    
+    7. dpi: resolution of the saved plot
+    '''
+    dates = []
+    dt = parse(date)
+    for i in range(days): 
+        dates.append(str(dt.strftime('%Y%m%d')) )
+        dt += pd.Timedelta(days=1)
+    
+    if plot_resolution != 'original':
+        wanted = resolution_seconds(plot_resolution)
+    else:
+        wanted = days*86400./QUICKLOOK_POINTS
+    
+    #cadence of the summary files, from the first available day
+    cadence = None
+    for j in dates:
+        fullpath = retrieve_data(path_to_folder, j, 'isois')
+        if os.path.exists(fullpath):
+            t = cdflib.CDF(fullpath).varget('Epoch')
+            if len(t) > 1:
+                cadence = float(np.median(np.diff(t)))/1e9
+                break
+    
+    if cadence is None or wanted < cadence:
+        print('The summary data is too coarse (or not available) for this time range, the EPI-Hi data is plotted instead.')
+        if output_file == '':
+            output_file = path_to_folder+r"/"+date+"_quicklook.png"
+        return multipanel_v001(path_to_folder, date, days, plot_resolution = plot_resolution, output_file = output_file, dpi = dpi)
+    
+    data = summary_dataframes(path_to_folder, dates, variables)
+    if len(data) == 0:
+        print('No summary files were found for the chosen dates. There must be a datagap in the database.')
+        return
+    
+    fig, axarr = plt.subplots(len(data), figsize=[35, 5*len(data)], sharex=True, squeeze=False)
+    axarr = axarr[:, 0]
+    for ax, (variable, dataframe) in zip(axarr, data.items()):
         if plot_resolution != 'original':
-            
-            let_A_data = let_A_data.resample(plot_resolution, on='epoch').mean()
-            let_B_data = let_B_data.resample(plot_resolution, on='epoch').mean()
-            let_C_data = let_C_data.resample(plot_resolution, on='epoch').mean()
-            
-            het_A_data = het_A_data.resample(plot_resolution, on='epoch').mean()
-            het_B_data = het_B_data.resample(plot_resolution, on='epoch').mean()
+            dataframe = resample_dataframe(dataframe, plot_resolution)
+        intensity = dataframe.drop('epoch', axis = 1)
+        label = variable.replace('_', ' \n ')
+        if intensity.shape[1] > 1:
+            spec_plot(fig, ax, dataframe.epoch, intensity.columns, intensity, ylabel = label+' \n channel')
+        else:
+            ax.plot(dataframe.epoch, intensity.iloc[:, 0], color = 'black')
+            if (intensity.iloc[:, 0] > 0).any():
+                ax.set_yscale('log')
+            ax.set_ylabel(label, size = 30)
+    
+    axarr[-1].xaxis.set_major_formatter(mdates.DateFormatter('%d-%m-%y'))
+    axarr[-1].set_xlabel('UTC', size = 30)
+    axarr[-1].set_xlim([parse(dates[0]), parse(dates[-1]) + pd.Timedelta(days=1)])
+    fig.subplots_adjust(hspace=0.05)
+    
+    outputs = output_file
+    if isinstance(outputs, str) and outputs == '':
+        outputs = path_to_folder+r"/"+date+"_quicklook.png"
+    if not isinstance(outputs, list):
+        outputs = [outputs]
+    dpis = dpi if isinstance(dpi, list) else [dpi]*len(outputs)
+    for output, output_dpi in zip(outputs, dpis):
+        plt.savefig(output ,dpi=(output_dpi), bbox_inches = 'tight')
+
+def cdf_table(cdf_name):
+    '''
+    This function is primarily meant to be used in the export_parquet function.
     
-            rate_hetA_e = rate_hetA_e.resample(plot_resolution, on='epoch').mean()
-            rate_hetB_e = rate_hetB_e.resample(plot_resolution, on='epoch').mean()
-            
-            letA_H_intensity = letA_H_intensity.resample(plot_resolution, on='epoch').mean()
-            hetA_H_intensity = hetA_H_intensity.resample(plot_resolution, on='epoch').mean()
-            
-            rate_letA_e = rate_letA_e.resample(plot_resolution, on='epoch').mean()
-             
-            let_A_data.reset_index(inplace=True)
-            let_B_data.reset_index(inplace=True)
-            let_C_data.reset_index(inplace=True)
-        
-            het_A_data.reset_index(inplace=True)
-            het_B_data.reset_index(inplace=True)
-        
-            rate_hetA_e.reset_index(inplace=True)
-            rate_hetB_e.reset_index(inplace=True)
-        
-            letA_H_intensity.reset_index(inplace=True) 
-            hetA_H_intensity.reset_index(inplace=True)
-            
-            rate_letA_e.reset_index(inplace=True)
-            
-            let_epoch = letA_H_intensity.epoch
-            het_epoch = hetA_H_intensity.epoch
-            rate_epoch = rate_hetA_e.epoch
-            rate_let_epoch = rate_letA_e.epoch
-            
-            letA_H_intensity = letA_H_intensity.drop('epoch', axis = 1)
-            hetA_H_intensity = hetA_H_intensity.drop('epoch', axis = 1)
-            rate_letA_e = rate_letA_e.drop('epoch', axis = 1)
-            rate_hetA_e = rate_hetA_e.drop('epoch', axis = 1)
-        
-        
-        
-        if plot_resolution == 'original':
-            
-            let_epoch = letA_H_intensity.epoch
-            het_epoch = hetA_H_intensity.epoch
-            rate_epoch = rate_hetA_e.epoch
-            rate_let_epoch = rate_letA_e.epoch
-            
-            
-            letA_H_intensity = letA_H_intensity.drop('epoch', axis = 1)
-            hetA_H_intensity = hetA_H_intensity.drop('epoch', axis = 1)
-            rate_letA_e = rate_letA_e.drop('epoch', axis = 1)
-            rate_hetA_e = rate_hetA_e.drop('epoch', axis = 1)
-        
-        
-   
-        #choose to always plot A dir energies
-        
-        
-        col_letA = list(let_A_data.columns)
-        col_letB = list(let_B_data.columns)
-        col_letC = list(let_C_data.columns)
-        
-        col_hetA = list(het_A_data.columns)
-        col_hetB = list(het_B_data.columns)
-        
-        col_hetA_rate = list(rate_hetA_e.columns)
-        col_hetB_rate = list(rate_hetB_e.columns)
-        
-        col_letA_rate = list(rate_letA_e.columns)
-        
-        if len(dates) ==1:
-            dtt = parse(date)
-        
-            t_date = str(dtt.strftime('%d.%m.%Y')) 
-          
-            plot_title = 'PSP ISOIS '+t_date
-        if len(dates) > 1:
-            dtt = parse(dates[0])
-            dtto = parse(dates[-1])
-        
-            t_date = str(dtt.strftime('%d.%m.%Y')) 
-            to_date = str(dtto.strftime('%d.%m.%Y')) 
-          
-            plot_title = 'PSP ISOIS '+t_date+'-'+to_date
-        
-        
-        time_one =  0  
-        for i in range(1, len(let_A_data.epoch)-1):
-            minus = let_A_data.epoch[i]-let_A_data.epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in col_letA[1::]:
-                    let_A_data[j][i-1] = np.nan
-            time_one+=1    
-        
-        time_one =  0  
-        for i in range(1, len(let_B_data.epoch)-1):
-            minus = let_B_data.epoch[i]-let_B_data.epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in col_letB[1::]:
-                    let_B_data[j][i-1] = np.nan
-            time_one+=1    
-        
-        time_one =  0  
-        for i in range(1, len(let_C_data.epoch)-1):
-            minus = let_C_data.epoch[i]-let_C_data.epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in col_letC[1::]:
-                    let_C_data[j][i-1] = np.nan
-            time_one+=1    
-        
-        
-        time_one =  0  
-        for i in range(1, len(het_A_data.epoch)-1):
-            minus = het_A_data.epoch[i]-het_A_data.epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in col_hetA[1::]:
-                    het_A_data[j][i-1] = np.nan
-            time_one+=1    
-        
-        time_one =  0  
-        for i in range(1, len(het_B_data.epoch)-1):
-            minus = het_B_data.epoch[i]-het_B_data.epoch[time_one]
-            seconds = minus.total_seconds()
+    It returns all the time series of a cdf as one dataframe: the epoch and one column per variable 
+    (e.g. 'LET1_A_PA') or per energy channel of a variable (e.g. 'A_H_Flux_3' for channel 3 of A_H_Flux),
+    and the variables that do not change with time (energies, deltas and labels) as a dictionary.
+    '''
+    columns = {'epoch': epoch_index(cdf_name)}
+    constants = {}
+    
+    for variable in cdf_name.cdf_info().get('zVariables'):
+        if variable == 'Epoch':
+            continue
+        values = cdf_name.varget(variable)
+        if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf' and values.ndim in [1, 2] \
+                and cdf_name.varinq(variable)['Rec_Vary'] and len(values) == len(columns['epoch']):
+            if values.ndim == 1:
+                columns[variable] = values
+            else:
+                for channel in range(values.shape[1]):
+                    columns[variable+'_'+str(channel)] = values[:, channel]
+        else:
+            constants[variable] = np.asarray(values).tolist()
+    
+    return pd.DataFrame(columns), constants
+
+def month_partition(output_folder, data_resolution, detector, month):
+    '''
+    This function returns the path of the parquet file of one month (e.g. '2022-03') and detector, 
+    laid out so that pyarrow can choose the partitions from the folder names:
+    output_folder/data_resolution/detector=het/month=2022-03/part.parquet
+    '''
+    return os.path.join(output_folder, data_resolution, 'detector='+detector, 'month='+month, 'part.parquet')
+
+def export_parquet(path_to_folder, start_date, end_date, output_folder, data_resolution = 'rates60', detectors = ['let1', 'let2', 'het']):
+    '''
+    This function exports the EPI-Hi time series (epochs, fluxes, uncertainties, rates and pitch angles) 
+    of a date range to parquet files, one file per month and detector, so that long studies 
+    can read them with read_parquet instead of opening thousands of daily cdf files.
+    
+    Each day is a row group of the file, so read_parquet only reads the days and the columns it needs.
+    The energies, deltas and labels of the channels are kept in the metadata of the files.
+    Exporting a month again adds the new days to the month (days already exported are replaced).
+    
+    Input variables:
+    
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    
+    2. start_date: first date in the form 'YYYYMMDD'
+    
+    3. end_date: last date in the form 'YYYYMMDD'
+    
+    4. output_folder: folder of the parquet files
+    
+    5. data_resolution: 'rates10', 'rates60', 'rates300' or 'rates3600'
+    
+    6. detectors: list of the detectors to export, any of 'let1', 'let2' and 'het'
+    
+    Returns the list of written files.
+    '''
+    dates = [str(d.strftime('%Y%m%d')) for d in pd.date_range(start_date, end_date, freq = 'd')]
+    months = OrderedDict()
+    for date in dates:
+        months.setdefault(date[0:4]+'-'+date[4:6], []).append(date)
+    
+    written = []
+    for detector in detectors:
+        for month, month_dates in months.items():
+            frames = []
+            constants = {}
+            #the next days are downloaded and decoded while the current one is converted
+            pipeline = Pipeline(month_dates, [lambda date: fetch_files(path_to_folder, [date], data_resolution, products = [detector])])
+            try:
+                for date in month_dates:
+                    for path in pipeline.get(date):
+                        frame, constants = cdf_table(open_cdf(path))
+                        frames.append(frame)
+            finally:
+                pipeline.close()
+            if len(frames) == 0:
+                print('No '+detector+' files for '+month)
+                continue
             
-            if seconds >7200:
-                for j in col_hetB[1::]:
-                    het_B_data[j][i-1] = np.nan
-            time_one+=1    
-       
-        
-        time_one =  0  
-        for i in range(1, len(let_epoch)-1):
-            minus = let_epoch[i]-let_epoch[time_one]
-            seconds = minus.total_seconds()
+            fullpath = month_partition(output_folder, data_resolution, detector, month)
+            if os.path.exists(fullpath):
+                old = pq.read_table(fullpath).to_pandas()
+                new_days = set(pd.concat(frames)['epoch'].dt.normalize())
+                frames = [old[~old['epoch'].dt.normalize().isin(new_days)]] + frames
             
-            if seconds >7200:
-                for j in letA_H_intensity.columns:
-                    letA_H_intensity[j][i-1] = np.nan
-            time_one+=1
-        
-        time_one =  0  
-        for i in range(1, len(het_epoch)-1):
-            minus = het_epoch[i]-het_epoch[time_one]
-            seconds = minus.total_seconds()
+            data = pd.concat(frames, sort = False, ignore_index = True)
+            days = [frame for day, frame in data.groupby(data['epoch'].dt.normalize())]
+            data = pd.concat(days, ignore_index = True)
             
-            if seconds >7200:
-                for j in hetA_H_intensity.columns:
-                    hetA_H_intensity[j][i-1] = np.nan
-            time_one+=1
-         
+            table = pyarrow.Table.from_pandas(data, preserve_index = False)
+            table = table.replace_schema_metadata(dict(table.schema.metadata or {}, psp_constants = json.dumps(constants)))
+            os.makedirs(os.path.dirname(fullpath), exist_ok = True)
+            #one row group per day (the days have the same length at a given resolution)
+            pq.write_table(table, fullpath, row_group_size = max(len(day) for day in days), compression = 'zstd')
+            print('Exported '+str(len(days))+' days to '+fullpath)
+            written.append(fullpath)
+    return written
+
+def read_parquet(output_folder, detector, start, end, columns = None, data_resolution = 'rates60'):
+    '''
+    This function reads the time series exported with export_parquet.
+    Only the months, the days (row groups) and the columns asked for are read from the files.
     
-        time_one =  0  
-        for i in range(1, len(rate_let_epoch)-1):
-            minus = rate_let_epoch[i]-rate_let_epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in rate_letA_e.columns:
-                    rate_letA_e[j][i-1] = np.nan
-            time_one+=1
-         
-        
-        time_one =  0  
-        for i in range(1, len(rate_epoch)-1):
-            minus = rate_epoch[i]-rate_epoch[time_one]
-            seconds = minus.total_seconds()
-            
-            if seconds >7200:
-                for j in rate_hetA_e.columns:
-                    rate_hetA_e[j][i-1] = np.nan
-            time_one+=1
-         
-        
-        
+    Example, HET A proton flux channels 3 to 5 from March to June 2022:
+    read_parquet(folder, 'het', '20220301', '20220701', channel_columns('A_H_Flux', [3, 4, 5]), 'rates60')
     
-        fig, axarr = plt.subplots(12, figsize=[35, 45], sharex=True)
-        axarr[0].set_title(plot_title, size = 40) 
+    Input variables:
     
-        for col in col_letA[2::3]:
-            axarr[0].plot(let_A_data.epoch, let_A_data[col], label = col )
-        axarr[0].set_yscale('log')
-        axarr[0].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5), ncol=2 )
-        axarr[0].set_ylabel('Proton \n Flux \n LET \n direction A \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$', size = 30) 
+    1. output_folder: folder of the parquet files (the output_folder of export_parquet)
     
-        for colu in col_hetA[2::3]:
-            axarr[1].plot(het_A_data.epoch, het_A_data[colu],label = colu  )
-        axarr[1].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[1].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5), ncol=2 )
-        axarr[1].set_yscale('log')
-        axarr[1].set_ylabel('Proton \n Flux \n HET \n direction A \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$', size = 30) 
-        
-        spec_plot(fig, axarr[2],let_epoch, letA_H_energy_channels, letA_H_intensity, ylabel = 'Proton \n energy \n LET \n direction A')
-        
-        spec_plot(fig, axarr[3],het_epoch, hetA_H_energy_channels, hetA_H_intensity, ylabel = 'Proton \n energy \n HET \n direction A')
-        
-        spec_plot(fig, axarr[4],rate_let_epoch, letA_e_energy_channels, rate_letA_e, ylabel = 'Electrons \n energy \n LET \n direction A')
-        
-        spec_plot(fig, axarr[5],rate_epoch, hetA_e_energy_channels, rate_hetA_e, ylabel = 'Electrons \n energy \n HET \n direction A')
-        
-        for collss in col_letA_rate[2::2]:
-            axarr[6].plot(rate_let_epoch, rate_letA_e[collss], label = collss)
-          
-        axarr[6].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[6].set_yscale('log')
-        axarr[6].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) , ncol= 2)
-        axarr[6].set_ylabel('Electron \n count rate \n LET \n direction A ', size = 30) 
-     
-        for colss in col_hetA_rate[2::3]:
-            axarr[7].plot(rate_epoch, rate_hetA_e[colss], label = colss)
-          
-        axarr[7].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[7].set_yscale('log')
-        axarr[7].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) , ncol= 2)
-        axarr[7].set_ylabel('Electron \n count rate \n HET \n direction A ', size = 30) 
-     
+    2. detector: 'let1', 'let2' or 'het'
     
-        axarr[8].plot(let_A_data.epoch, let_A_data[col_letA[5]], label = col_letA[5]+' direction A',color = 'red')
-        axarr[8].plot(let_B_data.epoch, let_B_data[col_letB[5]], label = col_letB[5]+' direction B',color = 'blue')
-        axarr[8].plot(let_C_data.epoch, let_C_data[col_letC[5]], label = col_letC[5]+' direction C',color = 'green')
-        axarr[8].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[8].set_yscale('log')
-        axarr[8].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
-        axarr[8].set_ylabel('Proton \n Flux'+col_letA[5]+'\n LET \n directions \n A, B, C  \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$', size = 30) 
-         
-        axarr[9].plot(let_A_data.epoch, let_A_data[col_letA[1]], label = 'LET1 A PA', color = 'red')
-        axarr[9].plot(let_B_data.epoch, let_B_data[col_letB[1]], label = 'LET1 B PA', color = 'blue')
-        axarr[9].plot(let_C_data.epoch, let_C_data[col_letC[1]], label = 'LET2 C PA',color = 'green')
-        axarr[9].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[9].set_ylabel('LET \n Pitch Angle \n $\mathregular{^{\circ}}$', size = 30) 
-        axarr[9].set_ylim([0, 180])
-        axarr[9].yaxis.set_ticks(np.arange(0, 180+45, 45))
+    3. start: start of the time range, as a string in the form 'YYYYMMDD' (or 'YYYY-MM-DD HH:MM') or a datetime
     
-      
-        axarr[9].axhline(y=45, ls='-', color='black')
-        axarr[9].axhline(y=90, ls='-', color='black')
-        axarr[9].axhline(y=135, ls='-', color='black')
-        axarr[9].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
-         
-        axarr[10].plot(het_A_data.epoch, het_A_data[col_hetA[5]], label = col_hetA[5]+' direction A',color = 'red')
-        axarr[10].plot(het_B_data.epoch, het_B_data[col_hetB[5]], label = col_hetB[5]+' direction B',color = 'blue')
-        axarr[10].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[10].set_yscale('log')
-        axarr[10].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
-        axarr[10].set_ylabel('Proton \n  Flux'+col_hetA[5]+'\n HET \n directions \n A and B \n cm$^{-2}$ sr$^{-1}$ s$^{-1}$ \n (MeV/nuc)$^{-1}$', size = 30) 
-        
-        axarr[11].plot(het_A_data.epoch, het_A_data[col_hetA[1]], label = 'HET A PA', color = 'red')
-        axarr[11].plot(het_B_data.epoch, het_B_data[col_hetB[1]], label = 'HET B PA', color = 'blue')
-        axarr[11].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S \n %d-%m-%y'))
-        axarr[11].set_ylabel('HET \n Pitch Angle \n $\mathregular{^{\circ}}$', size = 30) 
-        axarr[11].set_ylim([0, 180])
-        axarr[11].yaxis.set_ticks(np.arange(0, 180+45, 45))
+    4. end: end of the time range (not included)
     
-        
-        axarr[11].axhline(y=45, ls='-', color='black')
-        axarr[11].axhline(y=90, ls='-', color='black')
-        axarr[11].axhline(y=135, ls='-', color='black')
-        
-        
+    5. columns: list of the columns to read (e.g. ['A_H_Flux_3', 'HET_A_PA'], see channel_columns).
+    No input necessary, all the columns are read by default. The epoch is always read.
     
+    6. data_resolution: resolution of the exported data
     
-        for number in range(0,11):
-            axarr[number].get_xaxis().set_visible(False)
-         
-        axarr[11].xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S\n %d-%m-%y'))
-        axarr[11].legend(loc = 'center left', prop = {'size':30},  bbox_to_anchor= (1, 0.5) )
-                  
-        plt.rc('xtick', labelsize = 25)
-        plt.rc('ytick', labelsize = 25)
-        
-        axarr[11].set_xlabel('UTC', size = 30) 
-        fig.subplots_adjust(hspace=0.05)
-        
-        time_list = let_A_data.epoch.tolist()
-        
-        for number in range(0,12):
-            axarr[number].set_xlim([time_list[0],time_list[len(time_list)-1]])
+    Returns a dataframe with the epoch and the columns (and the energies, deltas and labels 
+    of the channels as a dictionary in dataframe.attrs['constants']).
+    '''
+    start = pd.Timestamp(start)
+    end = pd.Timestamp(end)
+    months = [str(m.strftime('%Y-%m')) for m in pd.period_range(start, end, freq = 'M')]
+    folder = os.path.join(output_folder, data_resolution)
+    
+    dataset = ds.dataset(folder, format = 'parquet', partitioning = 'hive')
+    if columns is not None:
+        columns = ['epoch'] + [column for column in columns if column != 'epoch']
+    #the month filter chooses the files, the epoch filter the row groups (from their statistics)
+    condition = (ds.field('detector') == detector) & ds.field('month').isin(months) \
+                & (ds.field('epoch') >= start) & (ds.field('epoch') < end)
+    table = dataset.to_table(columns = columns, filter = condition)
+    
+    data = table.to_pandas()
+    if columns is None:
+        data = data.drop(columns = ['detector', 'month'])
+    data = data.sort_values('epoch', ignore_index = True)
+    
+    fragments = list(dataset.get_fragments(filter = (ds.field('detector') == detector) & ds.field('month').isin(months)))
+    if len(fragments) > 0:
+        metadata = fragments[0].physical_schema.metadata or {}
+        data.attrs['constants'] = json.loads(metadata.get(b'psp_constants', b'{}'))
+    return data
+
+def channel_columns(variable, channels):
+    '''
+    This function returns the names of the exported columns of energy channels of a variable, 
+    e.g. channel_columns('A_H_Flux', [3, 4, 5]) gives ['A_H_Flux_3', 'A_H_Flux_4', 'A_H_Flux_5'] (see read_parquet).
+    '''
+    return [variable+'_'+str(channel) for channel in channels]
+
+#look directions of each detector and the name used for it in the variable names
+DETECTOR_DIRECTIONS = {'let1': ('LET1', ['A', 'B']), 'let2': ('LET2', ['C']), 'het': ('HET', ['A', 'B'])}
+
+def event_series(cdf_name, detector):
+    '''
+    This function is primarily meant to be used in the scan_events function.
     
-        plt.savefig(path_to_folder+r"/"+date+".png" ,dpi=(300), bbox_inches = 'tight')
-   
-def loop_plot(path_to_folder, start_date, end_date, frequency):
+    It returns the proton fluxes and the electron fluxes (HET) or count rates (LET, which has no electron flux) 
+    of all the energy channels and directions of a cdf as one dataframe with an epoch column, 
+    the counts of each record of the same columns (count rate times the length of a record) as a second dataframe 
+    and a dictionary with the detector, direction, particle, variable, channel and energy label of each column.
+    '''
+    name, directions = DETECTOR_DIRECTIONS[detector]
+    epoch = epoch_index(cdf_name)
+    #length of a record in seconds (the records of a daily file are evenly spaced)
+    seconds = np.median(np.diff(epoch.values)).astype('timedelta64[ns]').astype(np.int64)/1e9 if len(epoch) > 1 else 86400.
+    columns = {'epoch': epoch}
+    counts = {'epoch': epoch}
+    info = {}
+    for direction in directions:
+        for particle, kind in [('H', 'Flux'), ('Electrons', 'Flux' if detector == 'het' else 'Rate')]:
+            variable = direction+'_'+particle+'_'+kind
+            values = cdf_name.varget(variable)
+            rates = cdf_name.varget(direction+'_'+particle+'_Rate')
+            labels = cdf_name.varget(particle+'_ENERGY_LABL')
+            for channel in range(values.shape[1]):
+                column = name+'_'+variable+'_'+str(channel)
+                columns[column] = values[:, channel]
+                counts[column] = np.where(rates[:, channel] >= 0, rates[:, channel]*seconds, np.nan)
+                info[column] = {'detector': name, 'direction': direction, 'particle': particle, 'variable': variable, 
+                                'channel': channel, 'energy': str(labels[channel]).strip()}
+    return pd.DataFrame(columns), pd.DataFrame(counts), info
+
+def detect_events(data, counts = None, background_window = '3d', jump = 2, alarm = 10, min_duration = 3, min_background = 0.1, state = None):
+    '''
+    This function finds the solar energetic particle events in all the columns (channels and directions) 
+    of a dataframe at once, with a Poisson CUSUM of the counts.
+    
+    For every column the background b is the median of the counts per record over the previous background_window 
+    (unaffected by events shorter than half the window). Each record with k counts adds the log-likelihood ratio 
+    of an increase of the counts by the factor jump, k*log(jump) - b*(jump-1), to the CUSUM S = max(0, S + increment), 
+    which raises the alarm when S > alarm, so a single noisy point does not start an event.
+    An event is the part of the CUSUM above 0 that raises the alarm: its onset is the first record of it 
+    (the record after the last time S was 0) and its end the highest point of S (after it the counts are back 
+    to the background). Missing records do not change the CUSUM.
     
+    Input variables:
+    1. data: dataframe with an epoch column and one column per time series (e.g. the fluxes of event_series)
+    2. counts: the counts of each record of the columns of data (e.g. from event_series), 
+    no input necessary if data are counts
+    3. background_window: length of the background window e.g. '3d', '12H'
+    4. jump: increase of the counts (factor) the CUSUM is tuned to find
+    5. alarm: value of the CUSUM (log-likelihood ratio) that confirms an event
+    6. min_duration: smallest number of records of an event
+    7. min_background: smallest background (counts per record), for the channels that count almost nothing
+    8. state: no input necessary. A dictionary to continue the CUSUM of a previous call, to scan a long time range 
+    in parts (see scan_events): the CUSUM starts from the state after the records of data already scanned 
+    (the earlier records are only used for the background) and the state at the end of data is written to it. 
+    Use an empty dictionary for the first part.
+    
+    Returns a dataframe with one row per event: column, onset, peak_time, peak_flux, background_flux, 
+    end, duration, significance (the highest S), start and stop (the rows of the event in data, 
+    start is 0 for an event that started before data) and open (True if the event is still going on at the end of data).
     '''
-    This function plots and saves in loop of n days the plots between the start and end date (+n days, if the data is available). 
-    The function uses directly the multipanel function's default inputs for data resolution.
+    epoch = pd.DatetimeIndex(data['epoch'])
+    values = data.drop(columns = ['epoch'])
+    values.index = epoch
+    if counts is None:
+        counts = values
+    else:
+        counts = counts[values.columns]
+        counts.index = epoch
+    
+    #rolling medians of all the columns at once, of the records before each record only
+    background = counts.rolling(background_window, closed = 'left', min_periods = 3).median().to_numpy()
+    background_flux = background if counts is values else values.rolling(background_window, closed = 'left', min_periods = 3).median().to_numpy()
+    with np.errstate(invalid = 'ignore'):
+        steps = counts.to_numpy()*np.log(jump) - np.maximum(background, min_background)*(jump-1)
+    #missing records (or without background) do not change the CUSUM
+    steps = np.nan_to_num(steps, nan = 0.)
+    
+    #the records already scanned in a previous part only give the background
+    first = 0
+    carried = {}
+    if state is not None:
+        carried = state.get('columns', {})
+        if 'epoch' in state:
+            first = int(epoch.searchsorted(state['epoch'], side = 'right'))
+    
+    #CUSUM: recursive in time, vectorised over the columns (first row: the carried state)
+    s = np.array([carried[column]['cusum'] if column in carried else 0. for column in values.columns])
+    cusum = np.zeros((len(epoch)-first+2, values.shape[1]))
+    cusum[0] = s
+    for t in range(first, len(epoch)):
+        s = np.maximum(0., s + steps[t])
+        cusum[t-first+1] = s
+    
+    #runs of positive CUSUM of all the columns, in the order of the columns (the last row of cusum stays 0)
+    positive = cusum > 0
+    edges = np.diff(np.vstack([np.zeros((1, positive.shape[1]), bool), positive]).astype(int), axis = 0)
+    start_c, start_t = np.nonzero(edges.T == 1)
+    stop_t = np.nonzero(edges.T == -1)[1]
+    #highest CUSUM of each run: from its start to the start of the next run there are only zeros after it
+    highest = np.maximum.reduceat(cusum.T.ravel(), start_c*len(cusum) + start_t) if len(start_t) > 0 else np.zeros(0)
+    
+    flux = values.to_numpy()
+    events = []
+    still_open = {}
+    for run_start, run_stop, c, significance in zip(start_t, stop_t, start_c, highest):
+        column = values.columns[c]
+        previous = carried.get(column) if run_start == 0 else None
+        is_open = run_stop == len(cusum)-1
+        #rows of data of the run
+        lo = first + max(run_start-1, 0)
+        hi = first + run_stop-1
+        length = hi - lo + (previous['length'] if previous is not None else 0)
+        if previous is not None:
+            significance = max(significance, previous['significance'])
+        if not is_open and (significance <= alarm or length < min_duration):
+            continue
+        
+        #the CUSUM grows until the counts go back to the background: its highest point is the end of the event
+        run_cusum = cusum[lo-first+1:hi-first+1, c]
+        run_flux = np.where(np.isnan(flux[lo:hi, c]), -np.inf, flux[lo:hi, c])
+        peak = lo + int(np.argmax(run_flux)) if hi > lo else None
+        event = {'column': column, 'peak_time': epoch[peak] if peak is not None else pd.NaT, 
+                 'peak_flux': float(flux[peak, c]) if peak is not None else -np.inf, 'significance': float(significance)}
+        if previous is None:
+            event.update({'onset': epoch[lo], 'background_flux': float(background_flux[lo, c]), 'end': epoch[lo + int(np.argmax(run_cusum))]})
+        else:
+            #the run started in a previous part
+            event.update({'onset': previous['onset'], 'background_flux': previous['background_flux'], 
+                          'end': epoch[lo + int(np.argmax(run_cusum))] if hi > lo and run_cusum.max() > previous['significance'] else previous['end']})
+            if peak is None or not previous['peak_flux'] < event['peak_flux']:
+                event['peak_time'], event['peak_flux'] = previous['peak_time'], previous['peak_flux']
+        
+        if is_open:
+            still_open[column] = dict(event, cusum = float(cusum[-2, c]), length = length)
+        if significance > alarm and length >= min_duration:
+            event.update({'duration': event['end'] - event['onset'], 'start': int(epoch.searchsorted(event['onset'])), 
+                          'stop': int(epoch.searchsorted(event['end'], side = 'right')), 'open': bool(is_open)})
+            events.append(event)
+    
+    if state is not None and len(epoch) > 0:
+        #the columns missing from data keep their state
+        state['columns'] = dict({column: value for column, value in carried.items() if column not in values.columns}, **still_open)
+        state['epoch'] = epoch[-1]
+    
+    events = pd.DataFrame(events, columns = ['column', 'onset', 'peak_time', 'peak_flux', 'background_flux', 'end', 'duration', 
+                                             'significance', 'start', 'stop', 'open'])
+    return events.sort_values(['column', 'onset'], ignore_index = True) if len(events) > 0 else events
+
+def scan_events(path_to_folder, start_date, end_date, data_resolution = 'rates3600', detectors = ['let1', 'let2', 'het'], 
+                catalog_file = '', **detection):
+    '''
+    This function scans a date range (up to the whole mission) for solar energetic particle events 
+    in the proton and electron channels of all the directions of LET and HET, and returns the event catalog.
     
-    Input parameters:
+    The data is read month by month (the next month is downloaded while the current one is scanned) and 
+    the CUSUM of detect_events goes on from one month to the next (its state is carried over), 
+    so an event over the end of a month is found once with its real onset. Only the end of the previous month 
+    needed for the background is kept, so the memory used does not grow with the length of the date range.
     
-    1. path_to_folder: Choose a folder in your computer where you want to save the data.
-    The data will be automatically saved in the chosen folder as a cdf file. 
-    The files will be named with the exact name they have in the database.
-    Path exemple: 'C:/Users/Desktop/folder'
-    Use r before the quotation marks if using the back slash in the path name. 
-    This cancels out any special python characters.
-    Or use  / as in the example instead.
+    Input variables:
     
-    2. start_date: date from which to plot in the form 'YYYYMMDD'
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
     
-    3. end_date: date untill which to plot in the form 'YYYYMMDD'
+    2. start_date: first date in the form 'YYYYMMDD'
     
-    4. frequency: number of days each plot should contain. The input should be an integer.
+    3. end_date: last date in the form 'YYYYMMDD'
+    
+    4. data_resolution: 'rates3600' by default, 'rates300' or 'rates60' for more precise onsets (slower)
+    
+    5. detectors: list of the detectors to scan, any of 'let1', 'let2' and 'het'
+    
+    6. catalog_file: no input necessary. Path of a csv file the catalog is written to.
+    
+    7. detection: no input necessary. The inputs of detect_events, e.g. alarm = 20, background_window = '5d'
     
+    Returns the catalog as a dataframe with one row per event and channel: detector, direction, particle, 
+    variable, channel, energy, onset, peak_time, peak_flux, background_flux, end, duration, significance.
     '''
+    background_window = pd.Timedelta(detection.get('background_window', '3d'))
+    dates = [str(d.strftime('%Y%m%d')) for d in pd.date_range(start_date, end_date, freq = 'd')]
+    months = OrderedDict()
+    for date in dates:
+        months.setdefault(date[0:6], []).append(date)
+    
+    def month_frame(frames):
+        #the columns of all the detectors on one epoch
+        parts = [pd.concat(frames[detector], ignore_index = True).set_index('epoch') for detector in detectors if len(frames[detector]) > 0]
+        data = pd.concat(parts, axis = 1).sort_index()
+        data.index.name = 'epoch'
+        return data.reset_index()
+    
+    pipeline = Pipeline(list(months), [lambda month: fetch_files(path_to_folder, months[month], data_resolution, products = detectors)], depth = 1)
+    try:
+        catalog = []
+        carry = None
+        state = {}
+        info = {}
+        for number, month in enumerate(months):
+            fluxes = {detector: [] for detector in detectors}
+            counts = {detector: [] for detector in detectors}
+            for path in pipeline.get(month):
+                detector = os.path.basename(path).split('-')[2]
+                frame, frame_counts, columns = event_series(cdflib.CDF(path), detector)
+                fluxes[detector].append(frame)
+                counts[detector].append(frame_counts)
+                info.update(columns)
+        
+            if all(len(frames) == 0 for frames in fluxes.values()):
+                print('No files for '+month)
+                continue
+            data = month_frame(fluxes)
+            data_counts = month_frame(counts)
+        
+            if carry is not None:
+                data = pd.concat([carry[0], data], ignore_index = True, sort = False)
+                data_counts = pd.concat([carry[1], data_counts], ignore_index = True, sort = False)
+        
+            events = detect_events(data, data_counts.drop(columns = ['epoch']), state = state, **detection)
+            last = number == len(months)-1
+            #the events still going on are found again (with the same onset) with the next month
+            catalog.append(events[last | ~events['open']])
+        
+            #keep the background window for the next month
+            keep_from = data.index[data['epoch'] >= data['epoch'].iloc[-1] - background_window][0]
+            carry = (data.iloc[keep_from:].reset_index(drop = True), data_counts.iloc[keep_from:].reset_index(drop = True))
+    finally:
+        pipeline.close()
+    
+    if len(catalog) == 0:
+        return pd.DataFrame()
+    catalog = pd.concat(catalog, ignore_index = True)
+    details = pd.DataFrame([info[column] for column in catalog['column']], 
+                           columns = ['detector', 'direction', 'particle', 'variable', 'channel', 'energy'])
+    catalog = pd.concat([details, catalog.drop(columns = ['column', 'start', 'stop', 'open'])], axis = 1)
+    catalog = catalog.sort_values(['onset', 'detector', 'direction', 'particle', 'channel'], ignore_index = True)
+    
+    if catalog_file != '':
+        catalog.to_csv(catalog_file, index = False)
+    return catalog
+
+def fluence(path_to_folder, events, particle = 'H', detector = 'het', data_resolution = 'rates60', scale_gaps = False):
+    '''
+    This function computes the fluences (fluxes integrated over time) of a list of events 
+    in every energy channel and direction of a detector, all the events at once (see LabelledArray.integrate).
+    The files of the days of the events are downloaded if needed and the data is read only once for all the events 
+    (and kept in memory, see open_cdf, so the fluences of other events of the same days are fast).
     
-    if frequency == 1:
-        f = 'd'
-    elif frequency>1:
-        f = str(frequency)+'d'
+    Input variables:
     
-    plot_days = pd.date_range(start_date,end_date,freq=f)
-    days = []
-    for i in plot_days:
-        days.append(str(i.strftime('%Y%m%d')))
-          
-    for date in days:
-        multipanel_v001( path_to_folder, date, frequency )
+    1. path_to_folder: folder of the cdf files (missing files are downloaded to it, see retrieve_data)
+    
+    2. events: the time intervals, either a list of (start, end) e.g. [('2019-04-04 06:30', '2019-04-05 12:00')] 
+    or a dataframe with onset (or start) and end columns e.g. the catalog of scan_events
+    
+    3. particle: 'H', 'He' (or 'Electrons')
+    
+    4. detector: 'het' (directions A and B) or 'let' (directions A, B and C)
+    
+    5. data_resolution: 'rates10', 'rates60' or 'rates3600'
+    
+    6. scale_gaps: if True the fluences are divided by the fraction of the event covered by data, 
+    i.e. the gaps are filled with the mean flux of the event. By default the gaps count for 0.
+    
+    Returns two dataframes with one row per event (start, end) and one column per direction and energy channel: 
+    the fluences (flux units times seconds e.g. 1/(cm^2 sr MeV)) and the fraction of the event covered by data.
+    '''
+    if isinstance(events, pd.DataFrame):
+        starts = events['onset' if 'onset' in events else 'start']
+        ends = events['end']
+    else:
+        starts = [event[0] for event in events]
+        ends = [event[1] for event in events]
+    starts = pd.to_datetime(pd.Series(starts)).values
+    ends = pd.to_datetime(pd.Series(ends)).values
+    
+    products = {'het': ['A', 'B']} if detector == 'het' else {'let1': ['A', 'B'], 'let2': ['C']}
+    dates = sorted(set(date for start, end in zip(starts, ends) for date in range_dates(start, end)))
+    pipeline = Pipeline(dates, [lambda date: fetch_files(path_to_folder, [date], data_resolution, products = list(products))])
+    try:
+        arrays = {product: [] for product in products}
+        for date in dates:
+            for path in pipeline.get(date):
+                product = os.path.basename(path).split('-')[2]
+                cdf_name = open_cdf(path)
+                labels = cdf_name.varget(particle+'_ENERGY_LABL')
+                directions = [channel_array(cdf_name, direction+'_'+particle+'_Flux', [direction+' '+str(label) for label in labels]) 
+                              for direction in products[product]]
+                array = directions[0]
+                for other in directions[1:]:
+                    array = array.join(other)
+                arrays[product].append(array)
+    finally:
+        pipeline.close()
+    
+    fluences = pd.DataFrame({'start': starts, 'end': ends})
+    coverages = fluences.copy()
+    for product in products:
+        if len(arrays[product]) == 0:
+            print('No '+product.upper()+' files for the events')
+            continue
+        array = LabelledArray.concat(arrays[product])
+        integral, coverage = array.integrate(starts, ends, RATE_CADENCES.get(data_resolution))
+        if scale_gaps:
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                integral = np.where(coverage > 0, integral/coverage, np.nan)
+        fluences = pd.concat([fluences, pd.DataFrame(integral, columns = list(array.labels))], axis = 1)
+        coverages = pd.concat([coverages, pd.DataFrame(coverage, columns = list(array.labels))], axis = 1)
+    return fluences, coverages
+
+def read_jobs(job_file):
+    '''
+    This function reads a job file (yaml, or json if the file name ends with .json) for the run_jobs function.
+    '''
+    with open(job_file) as f:
+        if job_file.endswith('.json'):
+            return json.load(f)
+        return yaml.safe_load(f)
+
+def job_dates(job):
+    '''
+    This function is primarily meant to be used in the run_jobs function.
+    It returns the list of dates ('YYYYMMDD') of a job, given either by date and days or by start_date and end_date.
+    '''
+    if 'start_date' in job:
+        return [str(d.strftime('%Y%m%d')) for d in pd.date_range(str(job['start_date']), str(job['end_date']), freq='d')]
+    
+    dates = []
+    dt = parse(str(job['date']))
+    for i in range(int(job.get('days', 1))):
+        dates.append(str(dt.strftime('%Y%m%d')))
+        dt += pd.Timedelta(days=1)
+    return dates
+
+def expand_jobs(spec):
+    '''
+    This function is primarily meant to be used in the run_jobs function.
+    
+    It turns the jobs of a job file into a list of tasks: one task for each multipanel plot 
+    (a loop job gives one task per window, like loop_plot) and one task for each download job.
+    '''
+    path_to_folder = spec['path_to_folder']
+    output_folder = spec.get('output_folder', path_to_folder)
+    profiles = spec.get('profiles', {'default': {'dpi': 300, 'format': 'png'}})
+    defaults = spec.get('defaults', {})
+    
+    tasks = []
+    for number, job in enumerate(spec.get('jobs', [])):
+        job = dict(defaults, **job)
+        name = str(job.get('name', 'job'+str(number)))
+        kind = job.get('type', 'multipanel')
+        
+        if kind == 'download':
+            tasks.append({'name': name, 'type': 'download', 'path_to_folder': path_to_folder,
+                          'instrument': job.get('instrument', 'epihi'), 'products': job.get('products', ['let1', 'let2', 'het']),
+                          'rate': job.get('rate', ''), 'dates': job_dates(job)})
+            continue
+        
+        if kind == 'loop':
+            frequency = int(job['frequency'])
+            f = 'd' if frequency == 1 else str(frequency)+'d'
+            windows = [(str(d.strftime('%Y%m%d')), frequency) for d in pd.date_range(str(job['start_date']), str(job['end_date']), freq=f)]
+        elif kind == 'multipanel':
+            windows = [(str(job['date']), int(job.get('days', 1)))]
+        else:
+            raise ValueError('Unknown job type '+str(kind)+' for job '+name)
+        
+        for date, days in windows:
+            output_file = []
+            dpi = []
+            for profile in job.get('profiles', list(profiles)):
+                fmt = profiles[profile].get('format', 'png')
+                output_file.append(os.path.join(output_folder, name+'_'+date+'_'+profile+'.'+fmt))
+                dpi.append(profiles[profile].get('dpi', 300))
+            
+            tasks.append({'name': name+'_'+date, 'type': 'multipanel', 'path_to_folder': path_to_folder,
+                          'date': date, 'days': days, 'data_resolution': job.get('data_resolution', 'auto'),
+                          'plot_resolution': job.get('plot_resolution', 'original'),
+                          'memory_budget': job.get('memory_budget', None), 'panels': job.get('panels', None),
+                          'output_file': output_file, 'dpi': dpi})
+    return tasks
+
+def plan_files(tasks):
+    '''
+    This function is primarily meant to be used in the run_jobs function.
+    
+    It returns the sorted list of the files (date, instrument, data, rate) all the tasks need, 
+    each file only once even if several tasks use it.
+    For multipanel tasks with automatic resolution the resolution multipanel_v001 chooses is planned 
+    (the fallback resolutions are only downloaded by multipanel_v001 if needed).
+    '''
+    files = set()
+    for task in tasks:
+        if task['type'] == 'download':
+            for date in task['dates']:
+                for product in task['products']:
+                    files.add((date, task['instrument'], product, task['rate']))
+        else:
+            rate = task['data_resolution']
+            if rate == 'auto':
+                dpi = task['dpi']
+                rate = auto_resolution(task['days'], max(dpi) if isinstance(dpi, list) else dpi)
+            for date in job_dates(task):
+                for product in panel_products(task.get('panels')):
+                    files.add((date, 'epihi', product, rate))
+    return sorted(files)
+
+def run_task(task):
+    '''
+    This function is primarily meant to be used in the run_jobs function.
+    It runs one task and returns its name, status ('ok' or 'failed'), run time and outputs or error.
+    '''
+    start = time.perf_counter()
+    result = {'name': task['name'], 'type': task['type'], 'status': 'ok', 'error': ''}
+    try:
+        if task['type'] == 'download':
+            for date in task['dates']:
+                for product in task['products']:
+                    retrieve_data(task['path_to_folder'], date, task['instrument'], data = product, rate = task['rate'])
+        else:
+            multipanel_v001(task['path_to_folder'], task['date'], task['days'], data_resolution = task['data_resolution'],
+                            plot_resolution = task['plot_resolution'], memory_budget = task['memory_budget'],
+                            output_file = task['output_file'], dpi = task['dpi'], panels = task.get('panels'))
+            result['outputs'] = task['output_file']
+            #multipanel_v001 prints the problem (e.g. missing files) and returns without saving
+            missing = [output for output in task['output_file'] if not os.path.exists(output)]
+            if len(missing) > 0:
+                raise RuntimeError('No plot saved to '+', '.join(missing))
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = repr(e)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        plt.close('all')
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_task_group(tasks):
+    '''
+    This function is primarily meant to be used in the run_jobs function.
+    It runs a list of tasks one after the other, so they reuse the files already opened and decoded (see open_cdf).
+    '''
+    return [run_task(task) for task in tasks]
+
+def run_jobs(job_file, parallelism = None, report_file = '', dry_run = False):
+    '''
+    This function runs all the jobs of a job file in one go.
+    
+    All the files the jobs need are planned first and downloaded once (in parallel), 
+    even if several jobs use them. Then the plots are made by parallel worker processes.
+    Tasks on neighbouring dates go to the same worker, which reuses the files it has already 
+    opened and decoded (see open_cdf).
+    The timing and the status of every job are printed (and written to report_file).
+    
+    It can also be used from the command line:
+    python -m psp_functions run jobs.yaml --parallelism 4 --report report.json
+    
+    Job file example (yaml):
+    
+    path_to_folder: C:/Users/Desktop/folder     # where the cdf files are saved
+    output_folder: C:/Users/Desktop/plots       # where the plots are saved (path_to_folder if not given)
+    parallelism: 4                              # number of parallel downloads and plotting processes
+    profiles:                                   # output profiles, every plot is saved once per profile
+      web: {dpi: 100, format: png}
+      print: {dpi: 300, format: pdf}
+    defaults:                                   # inputs used by all the jobs unless the job sets them
+      plot_resolution: 10min
+    jobs:
+      - name: april_event                       # multipanel_v001 plot
+        date: '20190404'
+        days: 3
+        data_resolution: rates60
+        profiles: [web]
+        panels: [2, 3, {type: pa, detector: het, direction: AB}]   # only some panels (see multipanel_v001)
+      - name: april                             # loop_plot like plots, one per window
+        type: loop
+        start_date: '20190401'
+        end_date: '20190430'
+        frequency: 3
+        memory_budget: 2GB
+      - name: second_rates                      # download only
+        type: download
+        date: '20190404'
+        days: 2
+        instrument: epihi
+        products: ['']
+        rate: rates
+    
+    Input variables:
+    1. job_file: path to the job file (yaml or json)
+    
+    2. parallelism: number of parallel downloads and plotting processes 
+    (no input necessary, it's taken from the job file or it's 1)
+    
+    3. report_file: no input necessary. Path of a json file the results of all the jobs are written to.
+    
+    4. dry_run: True to only print the planned files and plots without running them
+    
+    Returns the list of results (one for each plot or download job).
+    '''
+    spec = read_jobs(job_file)
+    if parallelism is None:
+        parallelism = int(spec.get('parallelism', 1))
+    
+    tasks = expand_jobs(spec)
+    files = plan_files(tasks)
+    print('Planned '+str(len(tasks))+' tasks using '+str(len(files))+' files.')
+    if dry_run:
+        for f in files:
+            print(' '.join(x for x in f if x != ''))
+        for task in tasks:
+            print(task['name'], task.get('output_file', ''))
+        return []
+    
+    if not os.path.exists(spec['path_to_folder']):
+        os.makedirs(spec['path_to_folder'])
+    output_folder = spec.get('output_folder', spec['path_to_folder'])
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = parallelism) as executor:
+        list(executor.map(lambda f: retrieve_data(spec['path_to_folder'], f[0], f[1], data = f[2], rate = f[3]), files))
+    download_seconds = time.perf_counter() - start
+    print('Downloaded the files in %.1f s' % download_seconds)
+    
+    #neighbouring dates in the same group, so a worker reuses its decoded files
+    tasks = sorted(tasks, key = lambda task: (task.get('data_resolution', ''), task.get('date', ''), task['name']))
+    groups = [tasks[i*len(tasks)//parallelism:(i+1)*len(tasks)//parallelism] for i in range(parallelism)]
+    groups = [group for group in groups if len(group) > 0]
+    
+    if parallelism > 1 and len(groups) > 1:
+        with ProcessPoolExecutor(max_workers = len(groups)) as executor:
+            results = [result for group in executor.map(run_task_group, groups) for result in group]
+    else:
+        results = run_task_group(tasks)
+    
+    print('%-40s %-8s %10s  %s' % ('job', 'status', 'seconds', 'error'))
+    for result in results:
+        print('%-40s %-8s %10.1f  %s' % (result['name'], result['status'], result['seconds'], result['error']))
+    failed = [result for result in results if result['status'] != 'ok']
+    print(str(len(results)-len(failed))+' tasks done, '+str(len(failed))+' failed, total %.1f s' % (time.perf_counter() - start))
+    
+    if report_file != '':
+        with open(report_file, 'w') as f:
+            json.dump({'download_seconds': download_seconds, 'files': len(files), 'results': results}, f, indent = 1)
+    return results
+
+#responses of the render service (see serve), by request key
+RESPONSE_CACHE = OrderedDict()
+RESPONSE_CACHE_SIZE = 64
+
+#the panels of the data requests of the render service: product and direction of pa_dataframe
+DATA_PANELS = {'let_A': ('let1', 'A'), 'let_B': ('let1', 'B'), 'let_C': ('let2', 'C'), 'het_A': ('het', 'A'), 'het_B': ('het', 'B')}
+
+def data_request(path_to_folder, date, days = 1, data_resolution = 'rates60', plot_resolution = 'original', panels = list(DATA_PANELS), particle = 'H'):
+    '''
+    This function is primarily meant to be used in the render service (see serve).
+    
+    It returns the pitch angles and fluxes of the chosen panels (see pa_dataframe) for consecutive days 
+    as a dictionary that can be written as json:
+    {panel: {'epoch': [iso dates], 'columns': {column: [values]}}}
+    The files are opened with open_cdf, so the data of recently used days is not read and decoded again.
+    
+    Input variables:
+    1. path_to_folder: folder of the cdf files (missing files are downloaded)
+    2. date: first date in the form 'YYYYMMDD'
+    3. days: number of consecutive days
+    4. data_resolution: 'rates10', 'rates60' or 'rates3600'
+    5. plot_resolution: 'original' or the resolution to average the data to e.g. '10min' (see multipanel_v001)
+    6. panels: list of panels, any of 'let_A', 'let_B', 'let_C', 'het_A', 'het_B'
+    7. particle: 'H' or 'He' ('Electrons' for the HET panels only)
+    '''
+    frames = {panel: [] for panel in panels}
+    for date in job_dates({'date': date, 'days': days}):
+        for panel in panels:
+            product, direction = DATA_PANELS[panel]
+            fullpath = retrieve_data(path_to_folder, date, 'epihi', data = product, rate = data_resolution)
+            if os.path.exists(fullpath):
+                frames[panel].append(pa_dataframe(open_cdf(fullpath), particle, direction = direction))
+    
+    result = {}
+    for panel in panels:
+        if len(frames[panel]) == 0:
+            continue
+        dataframe = pd.concat(frames[panel], sort = False)
+        if plot_resolution != 'original':
+            dataframe = resample_dataframe(dataframe, plot_resolution)
+        columns = {}
+        for column in dataframe.columns:
+            if column != 'epoch':
+                values = dataframe[column].astype(float)
+                columns[column] = [None if np.isnan(value) else value for value in values]
+        result[panel] = {'epoch': [t.isoformat() for t in dataframe['epoch']], 'columns': columns}
+    return result
+
+def plot_request(path_to_folder, date, days = 1, data_resolution = 'auto', plot_resolution = 'original', dpi = 100):
+    '''
+    This function is primarily meant to be used in the render service (see serve).
+    It returns the multipanel_v001 plot of consecutive days as png bytes (empty if there is no data).
+    '''
+    image = io.BytesIO()
+    try:
+        multipanel_v001(path_to_folder, date, days, data_resolution = data_resolution, plot_resolution = plot_resolution,
+                        output_file = image, dpi = dpi)
+    finally:
+        plt.close('all')
+    return image.getvalue()
+
+def render_request(path_to_folder, path, query):
+    '''
+    This function is primarily meant to be used in the render service (see serve).
+    
+    It answers one request of the service and returns (status, content type, body).
+    The status is 400 for wrong inputs, 404 for an unknown request or a date without data 
+    and 500 if the plot or the data could not be made.
+    The answers are kept in RESPONSE_CACHE by request key (path and inputs), 
+    so a request made again is answered without reading or plotting anything.
+    
+    Input variables:
+    1. path_to_folder: folder of the cdf files
+    2. path: '/plot.png', '/data.json' or '/status.json'
+    3. query: dictionary of the request inputs e.g. {'date': '20190404', 'days': '1'}
+    '''
+    if path == '/status.json':
+        status = {'responses': len(RESPONSE_CACHE), 'open_files': [f.path for f in CDF_CACHE.values()]}
+        return 200, 'application/json', json.dumps(status).encode()
+    
+    key = (path, tuple(sorted(query.items())))
+    if key in RESPONSE_CACHE:
+        RESPONSE_CACHE.move_to_end(key)
+        return RESPONSE_CACHE[key]
+    
+    if path not in ['/plot.png', '/data.json']:
+        return 404, 'application/json', json.dumps({'error': 'unknown request '+path}).encode()
+    
+    #wrong inputs are errors of the request (400), the other errors are errors of the service (500)
+    try:
+        if 'date' not in query:
+            raise ValueError('the date input is missing')
+        datetime.strptime(query['date'], '%Y%m%d')
+        days = int(query.get('days', 1))
+        dpi = int(query.get('dpi', 100))
+        plot_resolution = query.get('plot_resolution', 'original')
+        if plot_resolution != 'original':
+            pd.tseries.frequencies.to_offset(plot_resolution)
+        panels = query.get('panels', ','.join(DATA_PANELS)).split(',')
+        for panel in panels:
+            if path == '/data.json' and panel not in DATA_PANELS:
+                raise ValueError('unknown panel '+panel+', choose from '+', '.join(DATA_PANELS))
+    except ValueError as e:
+        return 400, 'application/json', json.dumps({'error': repr(e)}).encode()
+    
+    try:
+        if path == '/plot.png':
+            body = plot_request(path_to_folder, query['date'], days, query.get('data_resolution', 'auto'), plot_resolution, dpi)
+            content_type = 'image/png'
+        else:
+            data = data_request(path_to_folder, query['date'], days, query.get('data_resolution', 'rates60'), plot_resolution, 
+                                panels, query.get('particle', 'H'))
+            body = json.dumps(data).encode()
+            content_type = 'application/json'
+    except Exception as e:
+        return 500, 'application/json', json.dumps({'error': repr(e)}).encode()
+    
+    if len(body) == 0 or body == b'{}':
+        #nothing is cached, the data may be downloaded later
+        return 404, 'application/json', json.dumps({'error': 'no data for '+query['date']}).encode()
+    
+    RESPONSE_CACHE[key] = (200, content_type, body)
+    while len(RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+        RESPONSE_CACHE.popitem(last = False)
+    return RESPONSE_CACHE[key]
+
+def serve(path_to_folder, port = 8765, host = '127.0.0.1'):
+    '''
+    This function runs a local render service: a small http server that keeps recently used days 
+    decoded in memory (see open_cdf) and recent answers cached (see render_request), 
+    so plots and data of recently viewed days are returned without loading them again.
+    It runs until it is stopped (Ctrl+C).
+    
+    It can also be started from the command line:
+    python -m psp_functions serve C:/Users/Desktop/folder --port 8765
+    
+    Requests (all inputs as in multipanel_v001, only date is necessary):
+    http://127.0.0.1:8765/plot.png?date=20190404&days=1&data_resolution=rates60&plot_resolution=10min&dpi=100
+    http://127.0.0.1:8765/data.json?date=20190404&days=2&panels=let_A,het_A&particle=H&plot_resolution=H
+    http://127.0.0.1:8765/status.json (the cached answers and open files)
+    
+    Input variables:
+    1. path_to_folder: folder where the cdf files are (missing files are downloaded to it)
+    2. port: port of the service
+    3. host: address of the service, by default it is only reachable from this computer
+    '''
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import urlparse, parse_qsl
+    
+    class RenderHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, content_type, body = render_request(path_to_folder, url.path, dict(parse_qsl(url.query)))
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+    
+    #one request at a time, matplotlib figures cannot be made by several threads at once
+    server = HTTPServer((host, port), RenderHandler)
+    print('Serving plots of '+path_to_folder+' on http://'+host+':'+str(server.server_address[1])+'/')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv = None):
+    '''
+    Command line entry point: python -m psp_functions run jobs.yaml (see run_jobs), 
+    python -m psp_functions serve folder (see serve) or python -m psp_functions sync folder (see sync_mirror)
+    '''
+    parser = argparse.ArgumentParser(prog = 'python -m psp_functions', description = 'PSP ISOIS data analysis and plotting software.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    run = commands.add_parser('run', help = 'run the jobs of a job file (see the run_jobs function)')
+    run.add_argument('job_file')
+    run.add_argument('--parallelism', type = int, default = None)
+    run.add_argument('--report', default = '')
+    run.add_argument('--dry-run', action = 'store_true')
+    service = commands.add_parser('serve', help = 'run the local render service (see the serve function)')
+    service.add_argument('path_to_folder')
+    service.add_argument('--port', type = int, default = 8765)
+    service.add_argument('--host', default = '127.0.0.1')
+    sync = commands.add_parser('sync', help = 'download the new files of the database to a local mirror (see the sync_mirror function)')
+    sync.add_argument('path_to_mirror')
+    sync.add_argument('--instruments', nargs = '+', default = ['epihi'])
+    sync.add_argument('--start-date', default = '')
+    sync.add_argument('--end-date', default = '')
+    sync.add_argument('--products', nargs = '+', default = [])
+    sync.add_argument('--prune', action = 'store_true')
+    sync.add_argument('--check-sizes', action = 'store_true')
+    sync.add_argument('--parallelism', type = int, default = 4)
+    sync.add_argument('--retries', type = int, default = 2)
+    args = parser.parse_args(argv)
+    
+    if args.command == 'run':
+        #plots are only saved to files, no window is needed
+        matplotlib.use('Agg')
+        results = run_jobs(args.job_file, args.parallelism, args.report, args.dry_run)
+        if any(result['status'] != 'ok' for result in results):
+            return 1
+    
+    if args.command == 'serve':
+        matplotlib.use('Agg')
+        serve(args.path_to_folder, args.port, args.host)
+    
+    if args.command == 'sync':
+        summary = sync_mirror(args.path_to_mirror, args.instruments, args.start_date, args.end_date, args.products, 
+                              args.prune, args.check_sizes, args.parallelism, args.retries)
+        if summary is None or len(summary['failed']) > 0:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import os
+import sys
+import warnings
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import psp_functions as psp
+
+from benchmarks.http_standin import serve_folder
+from benchmarks.synthetic_cdf import generate_dataset
+
+
+@pytest.fixture(scope = 'session')
+def synthetic_database(tmp_path_factory):
+    '''
+    Two days (20190404-05) of synthetic 60s EPI-Hi files served on localhost in place of the PSP database.
+    Returns the folder of the served level2 files.
+    '''
+    warnings.filterwarnings('ignore')
+    root = str(tmp_path_factory.mktemp('synthetic'))
+    generate_dataset(root, '20190404', 2, rates = ['rates60'])
+    server, url = serve_folder(root)
+    original_url, original_store = psp.DATA_URL, psp.DATA_STORE
+    psp.DATA_URL = url
+    psp.DATA_STORE = ''
+    yield os.path.join(root, 'data_public', 'EPIHi', 'level2')
+    psp.DATA_URL, psp.DATA_STORE = original_url, original_store
+    server.shutdown()
+    server.server_close()
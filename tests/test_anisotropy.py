@@ -0,0 +1,58 @@
+import numpy as np
+
+import psp_functions as psp
+
+
+class FakeHET:
+    '''
+    The variables anisotropy_arrays reads from a HET file, for fluxes I = a + b*mu.
+    '''
+    def __init__(self, pa, flux, uncertainty):
+        records = len(flux['A'])
+        self.variables = {'Epoch': 6e17 + 6e10*np.arange(records), 'H_ENERGY_LABL': np.array(['ch0', 'ch1'])}
+        for direction in ['A', 'B']:
+            self.variables['HET_'+direction+'_PA'] = np.full(records, pa[direction], dtype = np.float32)
+            self.variables[direction+'_H_Flux'] = np.asarray(flux[direction], dtype = float)
+            self.variables[direction+'_H_Uncertainty'] = np.asarray(uncertainty[direction], dtype = float)
+
+    def varget(self, variable):
+        return self.variables[variable]
+
+    def cdf_info(self):
+        return {'zVariables': list(self.variables)}
+
+
+def fake_het(a, b, pa = {'A': 30., 'B': 120.}, sigma = {'A': 0.5, 'B': 0.8}, records = 3):
+    mu = {direction: np.cos(np.radians(pa[direction])) for direction in pa}
+    flux = {direction: np.full((records, 2), a + b*mu[direction]) for direction in pa}
+    uncertainty = {direction: np.full((records, 2), sigma[direction]) for direction in pa}
+    return FakeHET(pa, flux, uncertainty)
+
+
+def test_isotropic_anisotropy_is_zero():
+    values, errors = psp.anisotropy(het = fake_het(10., 0.))
+    assert np.allclose(values[['ch0', 'ch1']].values, 0)
+
+
+def test_beamed_anisotropy_and_uncertainty():
+    a, b = 10., 4.
+    values, errors = psp.anisotropy(het = fake_het(a, b))
+    #A1 = 3*integral(mu*I)/integral(I) = b/a for I = a + b*mu
+    assert np.allclose(values[['ch0', 'ch1']].values, 0.4)
+
+    #two directions: the line goes through both points, propagate the uncertainties of the two fluxes
+    mu = np.cos(np.radians([30., 120.]))
+    intensity = a + b*mu
+    def a1(i):
+        slope = (i[1] - i[0])/(mu[1] - mu[0])
+        return slope/(i[0] - slope*mu[0])
+    step = 1e-6
+    gradient = [(a1(intensity + step*np.eye(2)[k]) - a1(intensity - step*np.eye(2)[k]))/(2*step) for k in range(2)]
+    expected = np.sqrt((gradient[0]*0.5)**2 + (gradient[1]*0.8)**2)
+    assert np.allclose(errors[['ch0', 'ch1']].values, expected, rtol = 1e-5)
+
+
+def test_full_beam_along_the_field():
+    #all the particles along the field (I = a*(1 + mu)) is the largest first order anisotropy
+    values, errors = psp.anisotropy(het = fake_het(5., 5.))
+    assert np.allclose(values[['ch0', 'ch1']].values, 1)
@@ -0,0 +1,69 @@
+import os
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import file_name
+
+
+def het_file(synthetic_database):
+    return psp.open_cdf(os.path.join(synthetic_database, file_name('20190404', 'het', 'rates60')))
+
+
+def window_means(values, window):
+    '''
+    The averages of the windows computed one window at a time (the last record of each window is not used).
+    '''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return np.array([np.nanmean(values[j:j+window-1], axis = 0) for j in range(0, len(values), window)])
+
+
+def test_pa_dataframe_epoch_is_the_datetimes(synthetic_database):
+    cdf = het_file(synthetic_database)
+    data = psp.pa_dataframe(cdf, 'H', 'A')
+    expected = pd.DataFrame(psp.epoch_datetimes(cdf), columns = ['epoch'])
+    assert isinstance(data['epoch'][0], datetime)
+    assert data['epoch'].equals(expected['epoch'])
+    assert data['HET_A_PA'].dtype == cdf.varget('HET_A_PA').dtype
+
+    compact = psp.pa_dataframe(cdf, 'H', 'A', compact = True)
+    assert compact['epoch'].equals(expected['epoch'])
+    assert all(dtype == np.float32 for dtype in compact.dtypes.drop('epoch'))
+
+
+def test_average_data(synthetic_database):
+    cdf = het_file(synthetic_database)
+    data = psp.average_data(cdf, 'A_H_Flux', 600, 60, particle = 'H')
+    flux = cdf.varget('A_H_Flux')
+    assert data.shape == (144, flux.shape[1]+1)
+    assert np.array_equal(data.drop(columns = 'epoch').values, window_means(flux, 10), equal_nan = True)
+    assert np.array_equal(data['epoch'].values, psp.epoch_index(cdf).values[5::10])
+
+    compact = psp.average_data(cdf, 'A_H_Flux', 600, 60, particle = 'H', compact = True)
+    assert all(dtype == np.float32 for dtype in compact.dtypes.drop('epoch'))
+    assert np.allclose(compact.drop(columns = 'epoch').values, data.drop(columns = 'epoch').values, equal_nan = True)
+
+
+def test_average_data_dataframe(synthetic_database):
+    cdf = het_file(synthetic_database)
+    data = psp.pa_dataframe(cdf, 'H', 'A')
+    #7 minute windows: the last window is shorter and is labelled with its first record
+    averaged = psp.average_data_dataframe(data, 420, 60)
+    starts = np.arange(0, len(data), 7)
+    middles = np.where(starts + 7 > len(data), starts, starts + 3)
+    middles[0] = 3
+    assert np.array_equal(averaged['epoch'].values, data['epoch'].values[middles])
+    for column in data.columns[1:]:
+        assert np.array_equal(averaged[column].values, window_means(data[column].values, 7), equal_nan = True)
+
+    compact = psp.average_data_dataframe(data, 420, 60, compact = True)
+    assert all(dtype == np.float32 for dtype in compact.dtypes.drop('epoch'))
+
+
+def test_average_list():
+    assert psp.average_list(list(range(20)), 600, 60) == [5, 15]
+    assert psp.average_list(list(range(20)), 30, 60) == []
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import psp_functions as psp
+
+
+@pytest.fixture
+def store(synthetic_database, tmp_path, monkeypatch):
+    #use_data_store sets the module globals, monkeypatch puts them back after the test
+    monkeypatch.setattr(psp, 'DATA_STORE', psp.DATA_STORE)
+    monkeypatch.setattr(psp, 'DATA_STORE_QUOTA', psp.DATA_STORE_QUOTA)
+    psp.use_data_store(str(tmp_path/'store'))
+    return str(tmp_path/'store')
+
+
+def name(date, data):
+    return 'psp_isois-epihi_l2-'+data+'-rates60_'+date+'_v07.cdf'
+
+
+def write_file(path, size, used):
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, 'wb') as f:
+        f.write(b'\0'*size)
+    os.utime(path, ns = (used, used))
+    return path
+
+
+def test_files_are_kept_in_the_store(store, tmp_path):
+    folder = str(tmp_path/'user')
+    psp.retrieve_data(folder, '20190404', 'epihi', data = 'het', rate = 'rates60')
+    path = os.path.join(store, 'EPIHi', 'level2', name('20190404', 'het'))
+    assert os.path.exists(path)
+    assert not os.path.exists(folder) or os.listdir(folder) == []
+    assert psp.fetch_files(folder, ['20190404'], 'rates60', products = ['het']) == [path]
+    assert psp.local_version(psp.DATA_URL+'EPIHi/level2/') == 'v07'
+
+    psp.use_data_store('')
+    psp.retrieve_data(folder, '20190404', 'epihi', data = 'het', rate = 'rates60')
+    assert name('20190404', 'het') in os.listdir(folder)
+
+
+def test_evict_least_recently_used(store):
+    folder = os.path.join(store, 'EPIHi', 'level2')
+    now = time.time_ns()
+    #the files by date of last use: c, a, d, b
+    a = write_file(os.path.join(folder, 'a.cdf'), 1000, now - 3*10**9)
+    b = write_file(os.path.join(folder, 'b.cdf'), 1000, now)
+    c = write_file(os.path.join(folder, 'c.cdf'), 1000, now - 4*10**9)
+    d = write_file(os.path.join(store, 'ISOIS', 'level2', 'd.cdf'), 1000, now - 2*10**9)
+    #quarantined files and other files are not part of the store
+    write_file(os.path.join(folder, psp.QUARANTINE_FOLDER, 'e.cdf'), 10**6, 0)
+    write_file(os.path.join(folder, 'notes.txt'), 10**6, 0)
+
+    assert psp.evict_files(quota = 4000) == []
+    assert psp.evict_files(quota = 2500) == [c, a]
+    assert psp.evict_files(quota = 1000, keep = d) == [b]
+    assert sorted(file for file in os.listdir(folder) if file != '.locks') == ['notes.txt', psp.QUARANTINE_FOLDER]
+    assert os.path.exists(d)
+
+
+def test_evict_skips_locked_files(store):
+    folder = os.path.join(store, 'EPIHi', 'level2')
+    now = time.time_ns()
+    a = write_file(os.path.join(folder, 'a.cdf'), 1000, now - 2*10**9)
+    b = write_file(os.path.join(folder, 'b.cdf'), 1000, now - 10**9)
+    c = write_file(os.path.join(folder, 'c.cdf'), 1000, now)
+    with psp.FileLock(a):
+        assert psp.evict_files(quota = '2kB') == [b]
+    assert os.path.exists(a) and os.path.exists(c)
+
+
+def test_quota_keeps_recently_used_files(store, tmp_path):
+    folder = str(tmp_path/'user')
+    psp.retrieve_data(folder, '20190404', 'epihi', data = 'het', rate = 'rates60')
+    psp.retrieve_data(folder, '20190404', 'epihi', data = 'let1', rate = 'rates60')
+    level2 = os.path.join(store, 'EPIHi', 'level2')
+    size = max(os.path.getsize(os.path.join(level2, file)) for file in os.listdir(level2) if file.endswith('.cdf'))
+    psp.use_data_store(store, quota = 2*size+1)
+
+    #het of the 4th is used again, so let1 of the 4th is the one used the longest time ago
+    psp.retrieve_data(folder, '20190404', 'epihi', data = 'het', rate = 'rates60')
+    psp.retrieve_data(folder, '20190405', 'epihi', data = 'het', rate = 'rates60')
+    assert sorted(file for file in os.listdir(level2) if file.endswith('.cdf')) == [name('20190404', 'het'), name('20190405', 'het')]
+
+
+def test_file_lock(tmp_path):
+    path = str(tmp_path/'file.cdf')
+    lock = psp.FileLock(path)
+    assert lock.acquire()
+    assert os.path.dirname(lock.path) == str(tmp_path/'.locks')
+    assert not psp.FileLock(path, blocking = False).acquire()
+
+    events = []
+    def wait():
+        with psp.FileLock(path):
+            events.append('acquired')
+    thread = threading.Thread(target = wait)
+    thread.start()
+    thread.join(0.3)
+    events.append('released')
+    lock.release()
+    thread.join(5)
+    assert events == ['released', 'acquired']
+
+    other = psp.FileLock(path, blocking = False)
+    assert other.acquire()
+    other.release()
+
+
+def test_file_downloaded_once(store, tmp_path, monkeypatch):
+    downloads = []
+    urlretrieve = urllib.request.urlretrieve
+    def slow_urlretrieve(url, path):
+        downloads.append(url)
+        time.sleep(0.2)
+        return urlretrieve(url, path)
+    monkeypatch.setattr(urllib.request, 'urlretrieve', slow_urlretrieve)
+
+    folders = [str(tmp_path/('user'+str(i))) for i in range(4)]
+    with ThreadPoolExecutor(max_workers = 4) as executor:
+        list(executor.map(lambda folder: psp.retrieve_data(folder, '20190405', 'epihi', data = 'let2', rate = 'rates60'), folders))
+    assert len(downloads) == 1
+    level2 = os.path.join(store, 'EPIHi', 'level2')
+    assert [file for file in os.listdir(level2) if not file.startswith('.')] == [name('20190405', 'let2')]
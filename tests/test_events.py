@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import write_epihi_file
+
+
+def step_data(seed = 1):
+    '''
+    20 days of hourly Poisson counts (5 per record) with a step to 20 counts per record 
+    in column x from 2019-03-31 07:30 to 2019-04-01 22:30, and a column y without event.
+    '''
+    rng = np.random.default_rng(seed)
+    epoch = pd.date_range('2019-03-20 00:30', periods = 480, freq = 'H')
+    expected = np.full(480, 5.)
+    expected[271:310] = 20.
+    counts = pd.DataFrame({'x': rng.poisson(expected), 'y': rng.poisson(np.full(480, 5.))}).astype(float)
+    #fluxes: 0.01 flux unit per count
+    data = pd.DataFrame({'epoch': epoch, 'x': counts['x']*0.01, 'y': counts['y']*0.01})
+    return data, counts
+
+
+def test_detect_events_finds_injected_step():
+    data, counts = step_data()
+    events = psp.detect_events(data, counts)
+    assert list(events['column']) == ['x']
+    event = events.iloc[0]
+    step = data['epoch'][271]
+    assert step - pd.Timedelta('6H') <= event['onset'] <= step
+    assert event['end'] == data['epoch'][309]
+    assert step <= event['peak_time'] <= event['end']
+    assert 0.04 <= event['background_flux'] <= 0.06
+    assert not event['open']
+
+
+def test_detect_events_carries_the_cusum_state():
+    data, counts = step_data()
+    whole = psp.detect_events(data, counts).drop(columns = ['start', 'stop'])
+    #cuts before the onset, at the step, during the event and after it, the second part starts with 3 days of background
+    for cut in [266, 272, 290, 312]:
+        state = {}
+        first = psp.detect_events(data.iloc[:cut], counts.iloc[:cut], state = state)
+        second = psp.detect_events(data.iloc[cut-72:].reset_index(drop = True), counts.iloc[cut-72:].reset_index(drop = True), state = state)
+        found = pd.concat([first[~first['open']], second], ignore_index = True).drop(columns = ['start', 'stop'])
+        pd.testing.assert_frame_equal(found, whole)
+
+
+def test_scan_events_over_the_end_of_a_month(synthetic_database, tmp_path):
+    #the synthetic events start every 5 days at 06:00, one of them on 2018-10-31 and lasts into November
+    dates = [str(d.strftime('%Y%m%d')) for d in pd.date_range('20181027', '20181103')]
+    for date in dates:
+        write_epihi_file(synthetic_database, date, 'het', 'rates3600')
+    catalog = psp.scan_events(str(tmp_path), dates[0], dates[-1], detectors = ['het'])
+
+    protons = catalog[catalog['particle'] == 'H']
+    assert not protons.duplicated(['direction', 'channel', 'onset']).any()
+    event = protons[(protons['onset'] > '2018-10-30 12:00') & (protons['onset'] < '2018-10-31 12:00')]
+    assert len(event) == 2*len(psp.open_cdf(synthetic_database+'/'+'psp_isois-epihi_l2-het-rates3600_20181031_v07.cdf').varget('H_ENERGY_LABL'))
+    assert (event['end'] > '2018-11-01').all()
@@ -0,0 +1,16 @@
+import os
+
+import psp_functions as psp
+
+
+def test_fetch_files_fallback_rates(synthetic_database, tmp_path):
+    #the synthetic database only has 60s files
+    paths = psp.fetch_files(str(tmp_path), ['20190404', '20190405'], 'rates10', products = ['het', 'let2'], fallback_rates = ['rates60', 'rates3600'])
+    assert [os.path.basename(path) for path in paths] == [
+        'psp_isois-epihi_l2-het-rates60_20190404_v07.cdf', 'psp_isois-epihi_l2-let2-rates60_20190404_v07.cdf',
+        'psp_isois-epihi_l2-het-rates60_20190405_v07.cdf', 'psp_isois-epihi_l2-let2-rates60_20190405_v07.cdf']
+    assert not any('rates10' in name or 'rates3600' in name for name in os.listdir(str(tmp_path)))
+
+
+def test_fetch_files_without_fallback(synthetic_database, tmp_path):
+    assert psp.fetch_files(str(tmp_path), ['20190404'], 'rates10', products = ['het']) == []
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+PACKAGE_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#the heavy dependencies are only imported when they are first used (see LazyModule)
+HEAVY_MODULES = ['pandas', 'matplotlib', 'cdflib', 'astropy']
+
+#seconds, generous so that a busy machine does not fail the test (about 0.25s, mostly numpy, when it was written)
+IMPORT_TIME_LIMIT = 2.
+
+
+def test_import_does_not_load_the_heavy_dependencies():
+    program = ('import sys, time\n'
+               'sys.path.insert(0, %r)\n'
+               'start = time.perf_counter()\n'
+               'import psp_functions\n'
+               'print(time.perf_counter() - start)\n'
+               'print(" ".join(name for name in %r if name in sys.modules))\n') % (PACKAGE_FOLDER, HEAVY_MODULES)
+    #a fresh interpreter: the other tests have imported everything in this one
+    output = subprocess.run([sys.executable, '-c', program], capture_output = True, text = True, check = True).stdout
+    seconds, loaded = (output.splitlines() + [''])[:2]
+    assert loaded.split() == []
+    assert float(seconds) < IMPORT_TIME_LIMIT
@@ -0,0 +1,70 @@
+import os
+
+import cdflib
+import numpy as np
+from cdflib import cdfwrite
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import write_epihi_file
+
+
+def assert_same_reads(path, ranges = [{}, {'startrec': 0, 'endrec': 0}, {'startrec': 3, 'endrec': 17}]):
+    '''
+    Every variable of the file read by MappedCDF and by cdflib.CDF.varget, whole and by record ranges.
+    '''
+    mapped = psp.MappedCDF(path)
+    reference = cdflib.CDF(path)
+    for variable in reference.cdf_info()['zVariables']:
+        last_record = reference.varinq(variable)['Last_Rec']
+        for records in ranges:
+            if records.get('endrec', 0) > last_record:
+                continue
+            expected = reference.varget(variable, **records)
+            value = mapped.varget(variable, **records)
+            assert np.shape(value) == np.shape(expected), variable
+            assert np.array_equal(np.asarray(value), np.asarray(expected)), variable
+    return mapped
+
+
+def test_uncompressed_file_is_mapped(tmp_path):
+    path = write_epihi_file(str(tmp_path), '20190404', 'het', 'rates60')
+    mapped = assert_same_reads(path)
+    assert mapped.mappable
+    assert mapped.layout('Epoch') is not None
+    assert mapped.layout('A_H_Rate') is not None
+
+
+def test_compressed_variables_are_read_by_cdflib(tmp_path):
+    path = write_epihi_file(str(tmp_path), '20190404', 'het', 'rates60', compress = 6)
+    mapped = assert_same_reads(path)
+    assert mapped.layout('Epoch') is None
+    assert mapped.layout('A_H_Rate') is None
+
+
+def test_column_major_file_is_read_by_cdflib(tmp_path):
+    path = write_epihi_file(str(tmp_path), '20190404', 'het', 'rates60')
+    #cdfwrite always writes row major files: clear the row majority flag of the CDR (bytes 40-44 of the file)
+    with open(path, 'r+b') as f:
+        f.seek(40)
+        flags = int.from_bytes(f.read(4), 'big')
+        f.seek(40)
+        f.write((flags & ~1).to_bytes(4, 'big'))
+    assert cdflib.CDF(path).cdf_info()['Majority'] == 'Column_major'
+
+    mapped = assert_same_reads(path)
+    assert not mapped.mappable
+    assert mapped.layout('A_H_Rate') is None
+
+
+def test_sparse_records_are_read_by_cdflib(tmp_path):
+    path = os.path.join(str(tmp_path), 'sparse.cdf')
+    f = cdfwrite.CDF(path, cdf_spec = {'Compressed': False})
+    records = [0, 1, 2, 5, 6, 7, 8, 12, 13, 19]
+    f.write_var({'Variable': 'Flux', 'Data_Type': cdfwrite.CDF.CDF_DOUBLE, 'Num_Elements': 1,
+                 'Rec_Vary': True, 'Dim_Sizes': [], 'Sparse': 'pad_sparse'},
+                var_data = [records, np.arange(len(records), dtype = np.float64)])
+    f.close()
+
+    mapped = assert_same_reads(path, ranges = [{}, {'startrec': 2, 'endrec': 9}])
+    assert mapped.vdrs['Flux'][7] != 0
+    assert mapped.layout('Flux') is None
@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import file_name
+
+
+def test_export_read_parquet_round_trip(synthetic_database, tmp_path):
+    downloads = str(tmp_path/'cdf')
+    output = str(tmp_path/'parquet')
+    os.makedirs(downloads)
+    written = psp.export_parquet(downloads, '20190404', '20190405', output, 'rates60', detectors = ['het', 'let2'])
+    assert len(written) == 2
+
+    data = psp.read_parquet(output, 'het', '20190404', '20190406', data_resolution = 'rates60')
+    het = [psp.open_cdf(os.path.join(synthetic_database, file_name(date, 'het', 'rates60'))) for date in ['20190404', '20190405']]
+    assert len(data) == sum(len(cdf.varget('Epoch')) for cdf in het)
+    assert np.array_equal(data['epoch'].values, np.concatenate([psp.epoch_index(cdf).values for cdf in het]))
+    flux = np.concatenate([cdf.varget('A_H_Flux') for cdf in het])
+    assert np.array_equal(data['A_H_Flux_3'].values, flux[:, 3])
+    assert np.array_equal(data['HET_A_PA'].values, np.concatenate([cdf.varget('HET_A_PA') for cdf in het]))
+    assert 'H_ENERGY' in data.attrs['constants']
+
+    #only the columns and the time range asked for
+    part = psp.read_parquet(output, 'het', '2019-04-05 06:00', '2019-04-05 07:00', psp.channel_columns('A_H_Flux', [3, 4]))
+    assert list(part.columns) == ['epoch', 'A_H_Flux_3', 'A_H_Flux_4']
+    assert len(part) == 60
+    assert part['epoch'].min() >= pd.Timestamp('2019-04-05 06:00') and part['epoch'].max() < pd.Timestamp('2019-04-05 07:00')
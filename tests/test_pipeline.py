@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+import psp_functions as psp
+
+
+def test_pipeline_results():
+    pipeline = psp.Pipeline(range(10), [lambda item: item*2, lambda value: value+1], depth = 2)
+    try:
+        assert [pipeline.get(item) for item in range(10)] == [item*2+1 for item in range(10)]
+    finally:
+        pipeline.close()
+    #the results are not kept once they were used
+    assert all(len(results) == 0 for results in pipeline.results)
+    assert all(len(done) == 0 for done in pipeline.done)
+
+
+def test_pipeline_raises_the_error_of_a_stage():
+    seen = []
+
+    def download(date):
+        if date == '20190405':
+            raise IOError('no file for '+date)
+        return [date+'.cdf']
+
+    def decode(paths):
+        seen.append(paths)
+        return paths
+
+    pipeline = psp.Pipeline(['20190404', '20190405', '20190406'], [download, decode])
+    try:
+        assert pipeline.get('20190404') == ['20190404.cdf']
+        with pytest.raises(IOError, match = 'no file for 20190405'):
+            pipeline.get('20190405')
+        assert pipeline.get('20190406') == ['20190406.cdf']
+    finally:
+        pipeline.close()
+    #the stage after the failed one skipped the item
+    assert seen == [['20190404.cdf'], ['20190406.cdf']]
+
+
+def test_pipeline_close_after_a_failure_of_the_caller():
+    pipeline = psp.Pipeline(range(20), [lambda item: item], depth = 2)
+    with pytest.raises(ZeroDivisionError):
+        try:
+            for item in range(20):
+                pipeline.get(item)
+                if item == 3:
+                    1/0
+        finally:
+            pipeline.close()
+    assert not any(thread.is_alive() for thread in pipeline.threads)
+
+
+def test_pipeline_get_ahead_of_the_depth():
+    pipeline = psp.Pipeline(range(10), [lambda item: item*2], depth = 2)
+    try:
+        #the items before 7 are skipped instead of waiting for them to be used
+        assert pipeline.get(7) == 14
+        assert pipeline.get(9) == 18
+        with pytest.raises(ValueError, match = 'already used or skipped'):
+            pipeline.get(3)
+        with pytest.raises(ValueError, match = 'already used or skipped'):
+            pipeline.get(9)
+    finally:
+        pipeline.close()
+    assert not any(thread.is_alive() for thread in pipeline.threads)
+    assert all(len(results) == 0 for results in pipeline.results)
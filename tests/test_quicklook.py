@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pytest
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import generate_dataset
+
+
+@pytest.fixture(scope = 'module')
+def summary_database(synthetic_database):
+    #5 minute summary files next to the EPI-Hi files of the served database
+    root = os.path.dirname(os.path.dirname(os.path.dirname(synthetic_database)))
+    generate_dataset(root, '20190404', 2, rates = ['summary'])
+    psp.VERSION_CACHE.pop(psp.DATA_URL+'ISOIS/level2/', None)
+    return root
+
+
+def test_summary_dataframes(summary_database, tmp_path):
+    data = psp.summary_dataframes(str(tmp_path), ['20190404', '20190405'])
+    assert list(data) == ['EPIHi_H_Flux', 'EPIHi_Electrons_Flux', 'EPILo_H_Flux', 'EPIHi_Integral_Rate']
+
+    flux = data['EPIHi_H_Flux']
+    assert len(flux) == 2*288
+    assert flux['epoch'].is_monotonic_increasing
+    #the channels are labelled with the LABL_PTR_1 labels
+    assert flux.columns[0] == 'epoch' and all(column.strip() != '' and not column.isdigit() for column in flux.columns[1:])
+    assert list(data['EPIHi_Integral_Rate'].columns) == ['epoch', 'EPIHi_Integral_Rate']
+
+    only = psp.summary_dataframes(str(tmp_path), ['20190404'], variables = ['EPIHi_Integral_Rate'])
+    assert list(only) == ['EPIHi_Integral_Rate']
+    np.testing.assert_array_equal(only['EPIHi_Integral_Rate'].values[:, 1],
+                                  data['EPIHi_Integral_Rate'].values[:288, 1].astype(float))
+
+
+def test_quicklook_uses_summary_files_only(summary_database, tmp_path):
+    output = str(tmp_path/'quicklook.png')
+    psp.quicklook(str(tmp_path), '20190404', 2, plot_resolution = '1h', output_file = output, dpi = 10)
+    assert os.path.getsize(output) > 0
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.endswith('.cdf')) == [
+        'psp_isois_l2-summary_20190404_v07.cdf', 'psp_isois_l2-summary_20190405_v07.cdf']
+
+
+def test_quicklook_falls_back_to_multipanel(summary_database, tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(psp, 'multipanel_v001', lambda *args, **kwargs: calls.append((args, kwargs)))
+    #the 5 minute summary cadence is too coarse for 2 days at the default 1000 points or for 1 minute averages
+    psp.quicklook(str(tmp_path), '20190404', 2, dpi = 10)
+    psp.quicklook(str(tmp_path), '20190404', 10, plot_resolution = '1min', dpi = 10)
+    assert [args[1:] for args, kwargs in calls] == [('20190404', 2), ('20190404', 10)]
+    assert calls[0][1]['output_file'] == str(tmp_path)+'/20190404_quicklook.png'
+    assert calls[1][1]['plot_resolution'] == '1min'
+
+
+def test_multipanel_summary_resolution(summary_database, tmp_path):
+    output = str(tmp_path/'summary.png')
+    psp.multipanel_v001(str(tmp_path), '20190404', 2, data_resolution = 'summary', plot_resolution = '6H',
+                        output_file = output, dpi = 10)
+    assert os.path.getsize(output) > 0
+    assert not any('epihi' in name for name in os.listdir(str(tmp_path)))
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+import psp_functions as psp
+
+
+def one_second_chunks(records, chunk_size, channels = 2, seed = 0):
+    rng = np.random.default_rng(seed)
+    epoch = pd.date_range('2019-04-04', periods = records, freq = 's')
+    values = rng.random((records, channels))
+    values[100:200, 0] = -1e31
+    chunks = [(epoch[i:i+chunk_size], values[i:i+chunk_size]) for i in range(0, records, chunk_size)]
+    return epoch, values, chunks
+
+
+def test_reduce_chunks_matches_one_chunk():
+    epoch, values, chunks = one_second_chunks(3*3600, 1000)
+    whole = psp.reduce_chunks([(epoch, values)], 600)
+    chunked = psp.reduce_chunks(chunks, 600)
+    for stat in ['mean', 'min', 'max', 'count']:
+        pd.testing.assert_frame_equal(chunked[stat], whole[stat])
+
+
+def test_reduce_chunks_smaller_than_bins():
+    #three chunks of one hour in bins of two hours: the second chunk is all in the first bin
+    epoch, values, chunks = one_second_chunks(3*3600, 3600)
+    result = psp.reduce_chunks(chunks, 7200)
+    assert len(result['mean']) == 2
+    assert list(result['count'][0]) == [7200 - 100, 3600]
+    assert list(result['count'][1]) == [7200, 3600]
+    valid = np.where(values <= psp.FILL_VALUE_LIMIT, np.nan, values)
+    assert np.allclose(result['mean'][0], [np.nanmean(valid[:7200, 0]), np.nanmean(valid[7200:, 0])])
+    assert np.allclose(result['max'][1], [np.max(values[:7200, 1]), np.max(values[7200:, 1])])
+    whole = psp.reduce_chunks([(epoch, values)], 7200)
+    for stat in ['mean', 'min', 'max', 'count']:
+        pd.testing.assert_frame_equal(result[stat], whole[stat])
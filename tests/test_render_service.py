@@ -0,0 +1,99 @@
+import http.server
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import psp_functions as psp
+
+
+@pytest.fixture
+def folder(synthetic_database, tmp_path):
+    psp.RESPONSE_CACHE.clear()
+    yield str(tmp_path)
+    psp.RESPONSE_CACHE.clear()
+
+
+def test_data_request_is_cached(folder):
+    query = {'date': '20190404', 'panels': 'het_A,let_A', 'plot_resolution': '10min'}
+    status, content_type, body = psp.render_request(folder, '/data.json', query)
+    assert (status, content_type) == (200, 'application/json')
+    data = json.loads(body)
+    assert sorted(data) == ['het_A', 'let_A']
+    assert len(data['het_A']['epoch']) == 144
+
+    #the same inputs in another order are answered from the cache
+    again = psp.render_request(folder, '/data.json', dict(reversed(list(query.items()))))
+    assert again[2] is body
+    assert json.loads(psp.render_request(folder, '/status.json', {})[2])['responses'] == 1
+
+
+def test_plot_request(folder):
+    status, content_type, body = psp.render_request(folder, '/plot.png', {'date': '20190404', 'dpi': '20'})
+    assert (status, content_type) == (200, 'image/png')
+    assert body[:8] == b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/data.json', {}),
+    ('/data.json', {'date': '2019-04-04'}),
+    ('/data.json', {'date': '20190404', 'days': 'two'}),
+    ('/data.json', {'date': '20190404', 'panels': 'het_C'}),
+    ('/data.json', {'date': '20190404', 'plot_resolution': 'ten minutes'}),
+    ('/plot.png', {'date': '20190404', 'dpi': 'high'})])
+def test_wrong_inputs(folder, path, query):
+    status, content_type, body = psp.render_request(folder, path, query)
+    assert status == 400
+    assert 'error' in json.loads(body)
+    assert len(psp.RESPONSE_CACHE) == 0
+
+
+def test_unknown_request_and_missing_data(folder):
+    assert psp.render_request(folder, '/index.html', {'date': '20190404'})[0] == 404
+    status, _, body = psp.render_request(folder, '/data.json', {'date': '20190410', 'panels': 'het_A'})
+    assert status == 404
+    assert json.loads(body)['error'] == 'no data for 20190410'
+    assert len(psp.RESPONSE_CACHE) == 0
+
+
+def test_service_errors(folder, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('the cdf file could not be read')
+    monkeypatch.setattr(psp, 'data_request', broken)
+    monkeypatch.setattr(psp, 'plot_request', broken)
+    for path in ['/data.json', '/plot.png']:
+        status, _, body = psp.render_request(folder, path, {'date': '20190404'})
+        assert status == 500
+        assert 'the cdf file could not be read' in json.loads(body)['error']
+    assert len(psp.RESPONSE_CACHE) == 0
+
+
+def test_serve(folder, monkeypatch):
+    #the server made by serve is kept to stop it at the end of the test
+    servers = []
+    serve_forever = http.server.HTTPServer.serve_forever
+    def keep_server(server, *args, **kwargs):
+        servers.append(server)
+        serve_forever(server, *args, **kwargs)
+    monkeypatch.setattr(http.server.HTTPServer, 'serve_forever', keep_server)
+
+    thread = threading.Thread(target = psp.serve, args = (folder, 0), daemon = True)
+    thread.start()
+    for _ in range(100):
+        if servers:
+            break
+        thread.join(0.05)
+    url = 'http://127.0.0.1:'+str(servers[0].server_address[1])
+    try:
+        with urllib.request.urlopen(url+'/data.json?date=20190404&panels=het_B&plot_resolution=1h') as response:
+            assert response.headers['Content-Type'] == 'application/json'
+            assert len(json.loads(response.read())['het_B']['epoch']) == 24
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url+'/data.json?date=20190404&panels=het_C')
+        assert error.value.code == 400
+    finally:
+        servers[0].shutdown()
+        thread.join(5)
+    assert not thread.is_alive()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import psp_functions as psp
+
+
+def days_of_data(days = 3, cadence = 60):
+    rng = np.random.default_rng(0)
+    epoch = pd.date_range('2019-04-04', periods = days*86400//cadence, freq = str(cadence)+'S') + pd.Timedelta(seconds = cadence/2)
+    values = rng.gamma(2., 1., (len(epoch), 3)).astype(np.float32)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    whole = psp.LabelledArray(epoch, values, ['a', 'b', 'c'])
+    day = np.asarray(epoch.floor('d'))
+    return whole, [whole[day == d] for d in np.unique(day)]
+
+
+@pytest.mark.parametrize('plot_resolution', ['10min', '7H', '1000S', 'd', '2d'])
+def test_resample_day_gives_the_bins_of_the_whole_range(plot_resolution):
+    whole, days = days_of_data()
+    averaged = []
+    pending = origin = None
+    for day in days:
+        bins, pending, origin = psp.resample_day(day, plot_resolution, pending, origin)
+        averaged.append(bins)
+    averaged.append(pending.resample(plot_resolution, origin))
+    averaged = psp.LabelledArray.concat(averaged)
+
+    expected = whole.resample(plot_resolution)
+    assert np.array_equal(averaged.epoch, expected.epoch)
+    assert np.array_equal(averaged.values, expected.values, equal_nan = True)
+    #no bin is averaged in two parts
+    assert len(np.unique(averaged.epoch)) == len(averaged)
+
+
+def test_resample_origin():
+    whole, days = days_of_data(days = 1)
+    shifted = whole.resample('H', origin = np.datetime64('2019-04-04T00:30'))
+    assert shifted.epoch[0] == np.datetime64('2019-04-03T23:30')
+    assert np.array_equal(shifted.epoch[1:] - shifted.epoch[:-1], np.full(len(shifted)-1, np.timedelta64(3600, 's')))
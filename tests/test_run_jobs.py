@@ -0,0 +1,57 @@
+import json
+import os
+
+import psp_functions as psp
+
+
+def write_jobs(tmp_path, jobs, **spec):
+    spec = dict({'path_to_folder': str(tmp_path/'data'), 'output_folder': str(tmp_path/'plots'),
+                 'profiles': {'web': {'dpi': 20, 'format': 'png'}}, 'jobs': jobs}, **spec)
+    job_file = str(tmp_path/'jobs.json')
+    with open(job_file, 'w') as f:
+        json.dump(spec, f)
+    return job_file
+
+
+def test_expand_and_plan_jobs(tmp_path):
+    spec = psp.read_jobs(write_jobs(tmp_path, [
+        {'name': 'event', 'date': '20190404', 'days': 2, 'data_resolution': 'rates60', 'panels': [1]},
+        {'name': 'april', 'type': 'loop', 'start_date': '20190404', 'end_date': '20190407', 'frequency': 2, 
+         'data_resolution': 'rates60', 'panels': [1]},
+        {'name': 'seconds', 'type': 'download', 'date': '20190404', 'products': [''], 'rate': 'rates'}]))
+    tasks = psp.expand_jobs(spec)
+    assert [task['name'] for task in tasks] == ['event_20190404', 'april_20190404', 'april_20190406', 'seconds']
+    assert tasks[0]['output_file'] == [str(tmp_path/'plots'/'event_20190404_web.png')]
+
+    #the files shared by several tasks are planned once, only the products of the panels
+    files = psp.plan_files(tasks)
+    assert files == sorted([(date, 'epihi', 'het', 'rates60') for date in ['20190404', '20190405', '20190406', '20190407']] 
+                           + [('20190404', 'epihi', '', 'rates')])
+
+
+def test_run_jobs(synthetic_database, tmp_path):
+    job_file = write_jobs(tmp_path, [
+        {'name': 'event', 'date': '20190404', 'days': 2, 'data_resolution': 'rates60', 'panels': [1, 3]},
+        {'name': 'gap', 'date': '20190410', 'days': 1, 'data_resolution': 'rates60', 'panels': [1]},
+        {'name': 'files', 'type': 'download', 'date': '20190405', 'products': ['let2'], 'rate': 'rates60'}])
+    report = str(tmp_path/'report.json')
+    results = {result['name']: result for result in psp.run_jobs(job_file, parallelism = 1, report_file = report)}
+
+    assert results['event_20190404']['status'] == 'ok'
+    assert os.path.exists(str(tmp_path/'plots'/'event_20190404_web.png'))
+    #no data for the date: the task fails, the other tasks still run
+    assert results['gap_20190410']['status'] == 'failed'
+    assert 'No plot saved' in results['gap_20190410']['error']
+    assert results['files']['status'] == 'ok'
+    assert os.path.exists(str(tmp_path/'data'/'psp_isois-epihi_l2-let2-rates60_20190405_v07.cdf'))
+
+    with open(report) as f:
+        written = json.load(f)
+    assert sorted(result['name'] for result in written['results']) == sorted(results)
+
+
+def test_run_jobs_dry_run(tmp_path, capsys):
+    job_file = write_jobs(tmp_path, [{'name': 'event', 'date': '20190404', 'days': 1, 'data_resolution': 'rates60', 'panels': [1]}])
+    assert psp.run_jobs(job_file, dry_run = True) == []
+    assert 'Planned 1 tasks using 1 files.' in capsys.readouterr().out
+    assert not os.path.exists(str(tmp_path/'data'))
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from cdflib import cdfwrite
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import epoch_tt2000
+
+
+EDGES = np.geomspace(1., 100., 9)
+ENERGY = np.sqrt(EDGES[:-1]*EDGES[1:])
+FILL = -1e31
+
+
+def broken_law(x, x_break, a, index_low, index_high):
+    return 10**(a + index_low*np.minimum(x - x_break, 0) + index_high*np.maximum(x - x_break, 0))
+
+
+def spectra():
+    '''
+    One record per case: a power law, a broken power law with the break at a channel edge,
+    only two channels with data, one channel without counts and a noisy power law.
+    '''
+    flux = np.array([
+        3.*ENERGY**-2.5,
+        broken_law(np.log10(ENERGY), np.log10(EDGES[4]), 1., -1., -4.),
+        np.where(np.arange(8) < 2, 3.*ENERGY**-2.5, FILL),
+        np.where(np.arange(8) == 5, 0., 0.5*(ENERGY/10)**-3.),
+        2.*ENERGY**-2*np.random.default_rng(4).lognormal(0, 0.1, 8)])
+    return flux, 0.1*np.abs(flux)
+
+
+def write_file(path, uncertainties = True):
+    flux, sigma = spectra()
+    f = cdfwrite.CDF(path, cdf_spec = {'Compressed': False})
+    def write(variable, values, data_type, rec_vary = True):
+        values = np.asarray(values)
+        spec = {'Variable': variable, 'Data_Type': data_type, 'Num_Elements': 1, 'Rec_Vary': rec_vary,
+                'Dim_Sizes': list(values.shape[1:]) if rec_vary else list(values.shape)}
+        f.write_var(spec, var_data = values)
+    write('Epoch', epoch_tt2000('20190404', 60, len(flux)), cdfwrite.CDF.CDF_TIME_TT2000)
+    #the energy of the files is the middle of the channel, the fit uses the geometric mean of the edges
+    centre = (EDGES[:-1] + EDGES[1:])/2
+    write('H_ENERGY', centre, cdfwrite.CDF.CDF_DOUBLE, False)
+    write('H_ENERGY_DELTAMINUS', centre - EDGES[:-1], cdfwrite.CDF.CDF_DOUBLE, False)
+    write('H_ENERGY_DELTAPLUS', EDGES[1:] - centre, cdfwrite.CDF.CDF_DOUBLE, False)
+    write('A_H_Flux', flux, cdfwrite.CDF.CDF_DOUBLE)
+    if uncertainties:
+        write('A_H_Uncertainty', sigma, cdfwrite.CDF.CDF_DOUBLE)
+    f.close()
+    return psp.open_cdf(path)
+
+
+@pytest.fixture
+def het(tmp_path):
+    return write_file(str(tmp_path/'spectra.cdf'))
+
+
+def test_power_law(het):
+    fit = psp.spectral_fit(het)
+    assert len(fit) == 5
+    assert list(fit['channels']) == [8, 8, 2, 7, 8]
+
+    np.testing.assert_allclose(fit['index'][[0, 3]], [-2.5, -3.], rtol = 1e-9)
+    np.testing.assert_allclose(fit['normalization'][[0, 3]], [3., 0.5*10**3], rtol = 1e-9)
+    np.testing.assert_allclose(fit['chi2'][[0, 3]], 0, atol = 1e-12)
+    #less than 3 channels with data
+    assert fit.loc[2, ['index', 'index_uncertainty', 'normalization', 'chi2']].isna().all()
+
+    #the reference energy only moves the normalization
+    at_ten = psp.spectral_fit(het, reference_energy = 10)
+    np.testing.assert_allclose(at_ten['index'], fit['index'], rtol = 1e-9, equal_nan = True)
+    np.testing.assert_allclose(at_ten['normalization'][0], 3.*10**-2.5, rtol = 1e-9)
+
+
+def test_weighted_fit_matches_polyfit(het):
+    flux, sigma = spectra()
+    x = np.log10(ENERGY)
+    y = np.log10(flux[4])
+    coefficients, covariance = np.polyfit(x, y, 1, w = flux[4]*np.log(10)/sigma[4], cov = 'unscaled')
+    fit = psp.spectral_fit(het).loc[4]
+    assert fit['index'] == pytest.approx(coefficients[0], rel = 1e-9)
+    assert fit['normalization'] == pytest.approx(10**coefficients[1], rel = 1e-9)
+    assert fit['index_uncertainty'] == pytest.approx(np.sqrt(covariance[0, 0]), rel = 1e-9)
+    residual = (y - np.polyval(coefficients, x))*flux[4]*np.log(10)/sigma[4]
+    assert fit['chi2'] == pytest.approx((residual**2).sum(), rel = 1e-6)
+
+    #a subset of the channels is the same fit as the data of those channels only
+    channels = [1, 2, 4, 6]
+    coefficients = np.polyfit(x[channels], y[channels], 1, w = (flux[4]*np.log(10)/sigma[4])[channels])
+    assert psp.spectral_fit(het, channels = channels).loc[4, 'index'] == pytest.approx(coefficients[0], rel = 1e-9)
+
+
+def test_broken_power_law(het):
+    fit = psp.spectral_fit(het, broken = True).loc[1]
+    assert fit['break_energy'] == pytest.approx(EDGES[4], rel = 1e-9)
+    assert fit['index_low'] == pytest.approx(-1., rel = 1e-9)
+    assert fit['index_high'] == pytest.approx(-4., rel = 1e-9)
+    assert fit['normalization'] == pytest.approx(10., rel = 1e-9)
+    assert fit['chi2'] == pytest.approx(0, abs = 1e-12)
+    #two channels cannot be split in two power laws
+    assert np.isnan(psp.spectral_fit(het, broken = True).loc[2, 'index_low'])
+
+
+def test_without_uncertainties(tmp_path):
+    fit = psp.spectral_fit(write_file(str(tmp_path/'spectra.cdf'), uncertainties = False))
+    np.testing.assert_allclose(fit['index'][[0, 3]], [-2.5, -3.], rtol = 1e-9)
+    assert fit['index_uncertainty'].isna().all() and fit['normalization_uncertainty'].isna().all()
+    x = np.log10(ENERGY)
+    assert fit.loc[4, 'index'] == pytest.approx(np.polyfit(x, np.log10(spectra()[0][4]), 1)[0], rel = 1e-9)
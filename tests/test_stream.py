@@ -0,0 +1,27 @@
+import os
+import types
+
+import cdflib
+import numpy as np
+
+import psp_functions as psp
+from benchmarks.synthetic_cdf import file_name
+
+
+def test_stream_data(synthetic_database):
+    het = psp.stream_data('20190404', 'epihi', 'het', 'rates60')
+    expected = cdflib.CDF(os.path.join(synthetic_database, file_name('20190404', 'het', 'rates60')))
+    assert np.array_equal(het.varget('A_H_Flux'), expected.varget('A_H_Flux'))
+
+
+def test_stream_data_without_the_cdflib_buffer_handler(synthetic_database, monkeypatch):
+    #a cdflib without the private method: the file is opened from a temporary folder
+    monkeypatch.setattr(psp, 'cdflib', types.SimpleNamespace(CDF = lambda path: cdflib.CDF(path)))
+    het = psp.stream_data('20190404', 'epihi', 'het', 'rates60')
+    expected = cdflib.CDF(os.path.join(synthetic_database, file_name('20190404', 'het', 'rates60')))
+    assert np.array_equal(het.varget('A_H_Flux'), expected.varget('A_H_Flux'))
+
+    folder = os.path.dirname(het.cdf.file)
+    assert os.path.exists(folder)
+    del het
+    assert not os.path.exists(folder)
@@ -0,0 +1,110 @@
+import functools
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import psp_functions as psp
+from benchmarks.http_standin import QuietHandler, serve_folder
+from benchmarks.synthetic_cdf import generate_dataset, write_epihi_file
+
+
+class FlakyHandler(QuietHandler):
+    '''
+    Serves the files, but the first failures requests of each cdf file get an error 503.
+    '''
+    failures = 1
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.endswith('.cdf'):
+            with self.lock:
+                self.requests[self.path] = self.requests.get(self.path, 0) + 1
+                failed = self.requests[self.path] <= self.failures
+            if failed:
+                self.send_error(503)
+                return
+        super().do_GET()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    root = str(tmp_path/'database')
+    generate_dataset(root, '20190404', 2, rates = ['rates3600'])
+    server, url = serve_folder(root)
+    monkeypatch.setattr(psp, 'DATA_URL', url)
+    monkeypatch.setattr(psp, 'DATA_STORE', '')
+    yield os.path.join(root, 'data_public', 'EPIHi', 'level2')
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def flaky_database(tmp_path, monkeypatch):
+    root = str(tmp_path/'database')
+    generate_dataset(root, '20190404', 1, rates = ['rates3600'])
+    handler = type('Handler', (FlakyHandler,), {'requests': {}})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(handler, directory = root))
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    monkeypatch.setattr(psp, 'DATA_URL', 'http://127.0.0.1:'+str(server.server_address[1])+'/data_public/')
+    monkeypatch.setattr(psp, 'DATA_STORE', '')
+    monkeypatch.setattr(psp, 'SYNC_RETRY_WAIT', 0)
+    yield handler, os.path.join(root, 'data_public', 'EPIHi', 'level2')
+    server.shutdown()
+    server.server_close()
+
+
+def mirror_files(mirror):
+    return sorted(os.listdir(os.path.join(mirror, 'EPIHi', 'level2')))
+
+
+def test_sync_mirror_skips_the_files_already_there(database, tmp_path):
+    mirror = str(tmp_path/'mirror')
+    remote = sorted(name for name in os.listdir(database) if name.endswith('.cdf'))
+
+    summary = psp.sync_mirror(mirror)
+    assert len(summary['downloaded']) == len(remote) and summary['up_to_date'] == 0
+    assert [name for name in mirror_files(mirror) if name.endswith('.cdf')] == remote
+
+    #nothing new: nothing is downloaded
+    summary = psp.sync_mirror(mirror)
+    assert summary['downloaded'] == [] and summary['up_to_date'] == len(remote)
+
+    #a new day and a new version of a file: only those are downloaded, the old version is pruned
+    new_day = write_epihi_file(database, '20190406', 'het', 'rates3600')
+    new_version = write_epihi_file(database, '20190404', 'het', 'rates3600', version = 'v08')
+    summary = psp.sync_mirror(mirror, prune = True)
+    assert sorted(os.path.basename(path) for path in summary['downloaded']) == sorted(os.path.basename(path) for path in [new_day, new_version])
+    assert [os.path.basename(path) for path in summary['pruned']] == ['psp_isois-epihi_l2-het-rates3600_20190404_v07.cdf']
+    assert summary['up_to_date'] == len(remote) - 1
+
+
+def test_sync_mirror_products_and_dates(database, tmp_path):
+    mirror = str(tmp_path/'mirror')
+    summary = psp.sync_mirror(mirror, start_date = '20190405', products = ['het-rates3600'])
+    assert [os.path.basename(path) for path in summary['downloaded']] == ['psp_isois-epihi_l2-het-rates3600_20190405_v07.cdf']
+
+
+def test_sync_mirror_retries_failed_downloads(flaky_database, tmp_path):
+    handler, database = flaky_database
+    remote = sorted(name for name in os.listdir(database) if name.endswith('.cdf'))
+    #each file fails once, the second try downloads it
+    summary = psp.sync_mirror(str(tmp_path/'mirror'), retries = 1)
+    assert len(summary['downloaded']) == len(remote) and summary['failed'] == []
+    assert all(count == 2 for count in handler.requests.values())
+
+
+def test_sync_mirror_downloads_the_failed_files_with_the_next_sync(flaky_database, tmp_path):
+    handler, database = flaky_database
+    handler.failures = 2
+    mirror = str(tmp_path/'mirror')
+    remote = sorted(name for name in os.listdir(database) if name.endswith('.cdf'))
+
+    summary = psp.sync_mirror(mirror, retries = 0)
+    assert summary['downloaded'] == [] and len(summary['failed']) == len(remote)
+    #no partial file is left
+    assert [name for name in mirror_files(mirror) if name.endswith('.cdf') or name.endswith('.part')] == []
+
+    summary = psp.sync_mirror(mirror, retries = 1)
+    assert len(summary['downloaded']) == len(remote) and summary['failed'] == []
@@ -0,0 +1,94 @@
+import hashlib
+import os
+
+import psp_functions as psp
+
+
+HET = 'psp_isois-epihi_l2-het-rates60_20190404_v07.cdf'
+LET1 = 'psp_isois-epihi_l2-let1-rates60_20190404_v07.cdf'
+
+
+def download(folder):
+    for data in ['het', 'let1']:
+        psp.retrieve_data(folder, '20190404', 'epihi', data = data, rate = 'rates60')
+    return os.path.join(folder, HET), os.path.join(folder, LET1)
+
+
+def quarantined(folder):
+    quarantine = os.path.join(folder, psp.QUARANTINE_FOLDER)
+    return sorted(os.listdir(quarantine)) if os.path.exists(quarantine) else []
+
+
+def test_file_request():
+    assert psp.file_request('/data/'+HET) == ('20190404', 'epihi', 'het', 'rates60')
+    assert psp.file_request('psp_isois-epihi_l2-second-rates_20190404_v07.cdf') == ('20190404', 'epihi', '', 'rates')
+    assert psp.file_request('psp_isois-epilo_l2-ic_20190404_v07.cdf') == ('20190404', 'epilo', 'ic', '')
+    assert psp.file_request('psp_isois_l2-summary_20190404_v07.cdf') == ('20190404', 'isois', '', '')
+
+
+def test_check_cdf(synthetic_database, tmp_path):
+    het, let1 = download(str(tmp_path))
+    with open(het, 'rb') as f:
+        content = f.read()
+    problem, checksum = psp.check_cdf(het, size = len(content))
+    assert problem == '' and checksum == hashlib.sha256(content).hexdigest()
+    assert psp.check_cdf(het, size = len(content)+1)[0] == 'size '+str(len(content))+' instead of '+str(len(content)+1)
+    assert psp.check_cdf(het, checksum = '0'*64)[0] == 'checksum'
+
+    bad = str(tmp_path/'bad.cdf')
+    for data, expected in [(content[:len(content)//2], 'truncated file'), (content[:100], 'truncated file'),
+                           (b'', 'empty file'), (b'<html>not found</html>', 'not a cdf file')]:
+        with open(bad, 'wb') as f:
+            f.write(data)
+        assert psp.check_cdf(bad)[0] == expected
+
+
+def test_truncated_file_is_quarantined_and_downloaded_again(synthetic_database, tmp_path):
+    folder = str(tmp_path)
+    het, let1 = download(folder)
+    with open(het, 'rb') as f:
+        content = f.read()
+    with open(het, 'wb') as f:
+        f.write(content[:len(content)//3])
+
+    result = psp.verify_files(folder, parallelism = 2)
+    assert result['bad'] == {}
+    assert sorted(result['good']) == sorted([het, let1]) and result['skipped'] == []
+    #the truncated download is kept aside and the file of the database is downloaded again
+    assert [name.rsplit('.', 1)[0] for name in quarantined(folder)] == [HET]
+    with open(het, 'rb') as f:
+        assert f.read() == content
+
+    #the files did not change since they were checked
+    again = psp.verify_files(folder)
+    assert sorted(again['skipped']) == sorted([het, let1]) and again['bad'] == {}
+
+    #a file changed since it was checked is checked again, with the size of the database
+    size = os.path.getsize(let1)
+    with open(let1, 'ab') as f:
+        f.write(b'\0')
+    assert psp.verify_files(folder, check_remote = True, download = False)['bad'] == {let1: 'size '+str(size+1)+' instead of '+str(size)}
+    assert len(quarantined(folder)) == 2 and not os.path.exists(let1)
+
+
+def test_quarantine_without_download(synthetic_database, tmp_path):
+    folder = str(tmp_path)
+    het, let1 = download(folder)
+    with open(het, 'wb') as f:
+        f.write(b'')
+    result = psp.verify_files(folder, paths = [het, let1], download = False)
+    assert result['bad'] == {het: 'empty file'} and result['good'] == [let1]
+    assert not os.path.exists(het)
+    assert [name.rsplit('.', 1)[0] for name in quarantined(folder)] == [HET]
+
+
+def test_manifest(synthetic_database, tmp_path):
+    folder = str(tmp_path)
+    het, let1 = download(folder)
+    with open(let1, 'rb') as f:
+        checksum = hashlib.sha256(f.read()).hexdigest()
+    manifest = {LET1: {'sha256': checksum, 'size': os.path.getsize(let1)}, HET: {'sha256': '0'*64}}
+    result = psp.verify_files(folder, manifest = manifest)
+    #the file of the database does not match the manifest either: it is downloaded once and quarantined again
+    assert result['good'] == [let1] and result['bad'] == {het: 'checksum'}
+    assert len(quarantined(folder)) == 2 and not os.path.exists(het)